@@ -0,0 +1,96 @@
+import threading
+from typing import Dict, Iterator, List, MutableMapping, Optional, Tuple
+
+from .locks import FairLock
+
+# Balances are kept in integer minor units (cents) so debits never drift
+MINOR_UNITS = 100
+MINOR_UNIT_DECIMALS = 2
+
+
+def to_minor(amount: float) -> int:
+    return round(amount * MINOR_UNITS)
+
+
+def from_minor(units: int) -> float:
+    return units / MINOR_UNITS
+
+
+class Account(FairLock):
+    """
+    One customer's in-memory state: balance in minor units plus the FIFO
+    lock that serializes their reservations, in a single slotted record.
+    """
+    __slots__ = ("balance",)
+
+    def __init__(self, balance: int, mutex: threading.Lock):
+        super().__init__(mutex)
+        self.balance = balance
+
+
+class AccountTable:
+    """
+    Accounts keyed by customer id. Account locks share a fixed set of
+    striped mutexes instead of owning one each.
+    """
+
+    def __init__(self, stripes: int = 64):
+        self.accounts: Dict[str, Account] = {}
+        self._mutexes: List[threading.Lock] = [threading.Lock() for _ in range(stripes)]
+        self._guard = threading.Lock()
+
+    def get(self, customer_id: str) -> Optional[Account]:
+        """The account, or None if it does not exist yet"""
+        return self.accounts.get(customer_id)
+
+    def get_or_create(self, customer_id: str, balance: int) -> Tuple[Account, bool]:
+        """The account plus whether this call created it"""
+        account = self.accounts.get(customer_id)
+        if account is not None:
+            return account, False
+        with self._guard:
+            account = self.accounts.get(customer_id)
+            if account is not None:
+                return account, False
+            mutex = self._mutexes[hash(customer_id) % len(self._mutexes)]
+            account = self.accounts[customer_id] = Account(balance, mutex)
+            return account, True
+
+    def remove(self, customer_id: str):
+        with self._guard:
+            del self.accounts[customer_id]
+
+    def balances(self) -> Dict[str, int]:
+        """Consistent copy of every balance (minor units), safe while accounts are being created"""
+        with self._guard:
+            return {customer_id: account.balance for customer_id, account in self.accounts.items()}
+
+    def __len__(self) -> int:
+        return len(self.accounts)
+
+
+class AccountBalances(MutableMapping):
+    """Float view of an AccountTable's balances, for code that works in currency units"""
+
+    def __init__(self, table: AccountTable):
+        self.table = table
+
+    def __getitem__(self, customer_id: str) -> float:
+        return from_minor(self.table.accounts[customer_id].balance)
+
+    def __setitem__(self, customer_id: str, balance: float):
+        account, created = self.table.get_or_create(customer_id, to_minor(balance))
+        if not created:
+            account.balance = to_minor(balance)
+
+    def __delitem__(self, customer_id: str):
+        self.table.remove(customer_id)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.table.accounts)
+
+    def __len__(self) -> int:
+        return len(self.table.accounts)
+
+    def __contains__(self, customer_id: object) -> bool:
+        return customer_id in self.table.accounts
@@ -1,116 +1,153 @@
-import uuid
 import time
+import asyncio
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
 from .store import store
+from .risk_signals import risk_signals
+from .agent_pool import AgentPool, LLM_FACTORIES
+from .resilience import CircuitBreaker, RetryPolicy
+from .decision_cache import DecisionCache
+from .models import DECISION_REASONS, AgentVerdict
+from .utils import stage_timer, timed_stage, structured_log
+import config as settings
 
 from langchain_core.tools import Tool
 from langchain.agents import initialize_agent, AgentType
 from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
-from langchain_google_genai import ChatGoogleGenerativeAI
 
 import os 
+import re
 import json
-from typing import Any, Callable, Optional, Tuple
+from typing import Any, Callable, List, Optional, Tuple
 
+from pydantic import ValidationError
+
+#Store, risk signals, AI breaker and decision-cache switch the agent decides
+#with. The evaluation runner binds its own per case (see isolated_state);
+#everything else uses the shared ones
+_isolated: ContextVar[Optional[Tuple[Any, Any, Any, bool]]] = ContextVar("agent_isolated_state", default=None)
+
+def _store():
+    state = _isolated.get()
+    return store if state is None else state[0]
+
+def _risk_signals():
+    state = _isolated.get()
+    return risk_signals if state is None else state[1]
+
+def _breaker():
+    state = _isolated.get()
+    return ai_breaker if state is None or state[2] is None else state[2]
+
+def _decision_cache_enabled() -> bool:
+    state = _isolated.get()
+    return settings.AI_DECISION_CACHE_ENABLED and (state is None or state[3])
+
+@contextmanager
+def isolated_state(case_store, case_signals, breaker=None, decision_cache: bool = True):
+    """
+    Decide against case_store and case_signals in this context (asyncio.to_thread
+    carries it), with breaker in place of the shared AI breaker if given and
+    the decision cache only if decision_cache is set
+    """
+    token = _isolated.set((case_store, case_signals, breaker, decision_cache))
+    try:
+        yield
+    finally:
+        _isolated.reset(token)
+
+@timed_stage("get_balance")
 def get_balance(customer_id: str):
-    from .store import store
-    return store.get_balance(customer_id)
+    return _store().get_balance(customer_id)
+
+async def get_balance_async(customer_id: str):
+    """get_balance for the event loop; engines that block do it in the thread pool"""
+    with stage_timer("get_balance"):
+        return await _store().get_balance_async(customer_id)
+
+@timed_stage("get_risk_signals")
+def get_risk_profile(customer_id: str):
+    return _risk_signals().get(customer_id)
 
 def get_risk_signals(customer_id: str):
-    from .store import store
-    from datetime import datetime, timedelta
-    
-    # For demo purposes, we'll simulate different risk scenarios based on customer_id
-    # In a real system, these would come from actual database queries and risk engines
-    
-    # Simulate current timestamp
-    current_time = datetime.now()
-    
-    # Initialize risk signals dictionary
-    risk_signals = {
-        "recent_disputes": 0,           # Number of payment disputes in last 30 days
-        "device_change": False,         # New device detection
-        "velocity_check": {             # Payment velocity/frequency checks
-            "last_24h_count": 0,        # Number of transactions in last 24 hours
-            "last_24h_amount": 0.0,     # Total amount in last 24 hours
-        },
-        "location_risk": {             # Location-based risks
-            "unusual_country": False,   # Payment from unusual country
-            "location_mismatch": False, # IP location != card country
-        },
-        "account_risk": {              # Account-related risks
-            "account_age_days": 365,    # Age of the account
-            "previous_failures": 0,     # Recent failed transactions
-            "suspicious_activity": False # Any flagged suspicious activity
-        },
-        "transaction_pattern": {        # Transaction pattern analysis
-            "unusual_time": False,      # Outside normal transaction hours
-            "unusual_amount": False,    # Significantly different from usual amounts
-            "high_risk_merchant": False # Known high-risk merchant category
-        }
-    }
-    #TODO: we are simulating risk signals, in a real system these would be fetched from a database or risk engine
-    # Simulate different risk profiles based on customer_id patterns
-    if customer_id == "c_123":  # High risk customer
-        risk_signals.update({
-            "recent_disputes": 2,
-            "device_change": True,
-            "velocity_check": {
-                "last_24h_count": 15,
-                "last_24h_amount": 2000.0
-            },
-            "account_risk": {
-                "previous_failures": 3,
-                "suspicious_activity": True
-            }
-        })
-    elif customer_id.startswith("new_"):  # New customer
-        risk_signals.update({
-            "account_risk": {
-                "account_age_days": 5,
-                "previous_failures": 0
-            },
-            "transaction_pattern": {
-                "unusual_amount": True
-            }
-        })
-    elif customer_id.startswith("intl_"):  # International customer
-        risk_signals.update({
-            "location_risk": {
-                "unusual_country": True,
-                "location_mismatch": True
-            }
-        })
-    
-    return risk_signals
+    """Risk signals as a nested dict (the LLM tool's output)"""
+    return get_risk_profile(customer_id).as_dict()
 
+@timed_stage("create_case")
 def create_case(customer_id_reason_json: str):
     import json
     input_json = json.loads(customer_id_reason_json)
     customer_id = input_json.get("customer_id", "")
     reason = input_json.get("reason", "")
     
-    return f"case_{uuid.uuid4().hex[:6]}"
+    return _store().create_case(customer_id, reason)
+
+async def create_case_async(customer_id: str, reason: str):
+    with stage_timer("create_case"):
+        return await _store().create_case_async(customer_id, reason)
+
+
+TRACE_LEVELS = ("none", "summary", "full")
 
+def trace_level(payment) -> str:
+    """The payment's requested trace verbosity, else TRACE_LEVEL from config"""
+    return getattr(payment, "traceLevel", None) or settings.TRACE_LEVEL
+
+def visible_trace(payment, trace):
+    """The trace as it goes into the response; "none" sends an empty agentTrace"""
+    return [] if trace_level(payment) == "none" else trace
+
+def _risk_detail(risk, level):
+    """Full mode keeps the whole signal dict; otherwise a few key=value fields"""
+    if level == "full":
+        return str(risk.as_dict())
+    flags = ",".join(_risk_flags(risk)) or "none"
+    return (f"disputes={risk.recent_disputes} velocity_24h={risk.last_24h_count} "
+            f"account_age_days={risk.account_age_days} flags={flags}")
+
+def _summarize(text, level):
+    """Long free text (LLM output) is cut to TRACE_SUMMARY_MAX_CHARS below full"""
+    if not text.strip():
+        # AgentStep.detail may not be empty
+        return "(empty)"
+    limit = settings.TRACE_SUMMARY_MAX_CHARS
+    if level == "full" or len(text) <= limit:
+        return text
+    return text[:limit] + "..."
 
 #non AI agent decision function
-def agent_decide(payment):
-    trace = []
-    reasons = []
+def _gather_signals(payment):
+    return _signals_trace(payment, get_balance(payment.customerId))
 
-    trace.append({"step": "plan", "detail": "Check balance, risk, and limits"})
+async def _gather_signals_async(payment):
+    return _signals_trace(payment, await get_balance_async(payment.customerId))
 
-    balance = get_balance(payment.customerId)
+def _signals_trace(payment, balance):
+    level = trace_level(payment)
+    trace = []
+    trace.append({"step": "plan", "detail": "Check balance, risk, and limits"})
     trace.append({"step": "tool:getBalance", "detail": f"balance={balance:.2f}"})
 
-    risk = get_risk_signals(payment.customerId)
-    trace.append({"step": "tool:getRiskSignals", "detail": str(risk)})
+    risk = get_risk_profile(payment.customerId)
+    trace.append({"step": "tool:getRiskSignals", "detail": _risk_detail(risk, level)})
+    structured_log("debug", "risk_signals_fetched", {
+        "customer_id": payment.customerId,
+        "risk": lambda: str(risk.as_dict())  # only rendered if debug logging is on
+    })
 
+    return balance, risk, trace
+
+def _apply_rules(payment, balance, risk):
+    reasons = []
     decision = "allow"
 
-    if payment.amount > 100.0:
+    if payment.amount > settings.REVIEW_THRESHOLD:
         decision = "review"
         reasons.append("amount_above_daily_threshold")
-    if risk["recent_disputes"] > 0:
+    if risk.recent_disputes > 0:
         decision = "review"
         reasons.append("recent_disputes")
         
@@ -118,14 +155,20 @@ def agent_decide(payment):
         decision = "block"
         reasons.append("insufficient_balance")
 
-    if decision == "allow":
-        ok = store.reserve(payment.customerId, payment.amount)
-        if ok:
-            reasons.append("transaction_allowed")
-        if not ok:
-            decision = "block"
-            reasons = ["insufficient_balance"]
+    return decision, reasons
 
+def _apply_reservation(ok, reasons):
+    if ok:
+        return "allow", reasons + ["transaction_allowed"]
+    return "block", ["insufficient_balance"]
+
+def _record_outcome(payment, decision):
+    """Feed the decision into the customer's rolling velocity/failure counters"""
+    if decision != "review":
+        _risk_signals().record(payment.customerId, payment.amount, approved=decision == "allow")
+
+def _finish_trace(payment, decision, reasons, trace):
+    _record_outcome(payment, decision)
     if decision in ["review", "block"]:
         json_input = json.dumps({
             "customer_id": payment.customerId,
@@ -136,6 +179,147 @@ def agent_decide(payment):
 
     trace.append({"step": "tool:recommend", "detail": decision})
 
+async def _finish_trace_async(payment, decision, reasons, trace):
+    _record_outcome(payment, decision)
+    if decision in ["review", "block"]:
+        case_id = await create_case_async(payment.customerId, ", ".join(reasons))
+        trace.append({"step": "tool:createCase", "detail": f"case_id={case_id}"})
+
+    trace.append({"step": "tool:recommend", "detail": decision})
+
+#Per-tier decision counters, reported in /metrics
+tier_counts = {"rules": 0, "ai": 0}
+_tier_lock = threading.Lock()
+
+def _record_tier(trace, tier):
+    with _tier_lock:
+        tier_counts[tier] = tier_counts.get(tier, 0) + 1
+    trace.append({"step": "tier", "detail": tier})
+
+def tier_stats():
+    with _tier_lock:
+        return dict(tier_counts)
+
+def agent_decide(payment):
+    balance, risk, trace = _gather_signals(payment)
+    decision, reasons = _apply_rules(payment, balance, risk)
+
+    if decision == "allow":
+        ok = _store().reserve(payment.customerId, payment.amount)
+        decision, reasons = _apply_reservation(ok, reasons)
+
+    _finish_trace(payment, decision, reasons, trace)
+    _record_tier(trace, "rules")
+    return decision, reasons, trace
+
+async def agent_decide_async(payment):
+    """
+    Same rules as agent_decide, on the event loop; the store's async API
+    moves balance reads, reserves and cases off it for engines that block
+    """
+    balance, risk, trace = await _gather_signals_async(payment)
+    decision, reasons = _apply_rules(payment, balance, risk)
+
+    if decision == "allow":
+        ok = await _store().reserve_async(payment.customerId, payment.amount)
+        decision, reasons = _apply_reservation(ok, reasons)
+
+    await _finish_trace_async(payment, decision, reasons, trace)
+    _record_tier(trace, "rules")
+    return decision, reasons, trace
+
+HIGH_VELOCITY_24H_COUNT = 10
+
+def _risk_flags(risk):
+    """Names of the risk signals that are raised; empty for a clean account"""
+    checks = {
+        "recent_disputes": risk.recent_disputes > 0,
+        "device_change": risk.device_change,
+        "high_velocity": risk.last_24h_count > HIGH_VELOCITY_24H_COUNT,
+        "unusual_country": risk.unusual_country,
+        "location_mismatch": risk.location_mismatch,
+        "new_account": risk.account_age_days < 30,
+        "previous_failures": risk.previous_failures > 0,
+        "suspicious_activity": risk.suspicious_activity,
+        "unusual_time": risk.unusual_time,
+        "unusual_amount": risk.unusual_amount,
+        "high_risk_merchant": risk.high_risk_merchant,
+    }
+    return [name for name, raised in checks.items() if raised]
+
+async def agent_decide_tiered(payment):
+    """
+    Tiered decision pipeline. Clear-cut payments (insufficient balance, or no
+    risk signals at all) are decided by the rules on the event loop; only
+    payments with risk signals escalate to the AI agent.
+    """
+    balance, risk, trace = await _gather_signals_async(payment)
+    flags = _risk_flags(risk)
+
+    if balance < payment.amount or not flags:
+        decision, reasons = _apply_rules(payment, balance, risk)
+        if decision == "allow":
+            ok = await _store().reserve_async(payment.customerId, payment.amount)
+            decision, reasons = _apply_reservation(ok, reasons)
+        await _finish_trace_async(payment, decision, reasons, trace)
+        _record_tier(trace, "rules")
+        return decision, reasons, trace
+
+    trace.append({"step": "escalate", "detail": f"risk signals: {', '.join(flags)}"})
+    decision, reasons, ai_trace = await agent_decide_ai_async(payment)
+    return decision, reasons, trace + ai_trace
+
+def agent_decide_batch(payments):
+    """
+    Decide many payments in one call (blocking; run it in a worker thread).
+    Payments are grouped by customer and each customer's lock is taken once
+    for all of their rule-tier decisions, in input order. With the AI agent
+    enabled, escalations run after the lock is released.
+
+    Returns one (decision, reasons, trace) tuple or exception per payment, in
+    input order.
+    """
+    results = [None] * len(payments)
+    groups = {}
+    for i, payment in enumerate(payments):
+        groups.setdefault(payment.customerId, []).append(i)
+
+    for customer_id, indexes in groups.items():
+        escalated = []
+        try:
+            with _store().customer_batch(customer_id) as reserve:
+                for i in indexes:
+                    try:
+                        results[i] = _decide_in_batch(payments[i], reserve, escalated, i)
+                    except Exception as e:
+                        results[i] = e
+        except Exception as e:
+            # Lock timeout: everything not decided yet fails the same way
+            for i in indexes:
+                if results[i] is None:
+                    results[i] = e
+        for i, trace in escalated:
+            try:
+                decision, reasons, ai_trace = agent_decide_ai(payments[i])
+                results[i] = (decision, reasons, trace + ai_trace)
+            except Exception as e:
+                results[i] = e
+    return results
+
+def _decide_in_batch(payment, reserve, escalated, index):
+    balance, risk, trace = _gather_signals(payment)
+    if settings.USE_AI_AGENT and balance >= payment.amount:
+        flags = _risk_flags(risk)
+        if flags:
+            trace.append({"step": "escalate", "detail": f"risk signals: {', '.join(flags)}"})
+            escalated.append((index, trace))
+            return None
+
+    decision, reasons = _apply_rules(payment, balance, risk)
+    if decision == "allow":
+        decision, reasons = _apply_reservation(reserve(payment.amount), reasons)
+    _finish_trace(payment, decision, reasons, trace)
+    _record_tier(trace, "rules")
     return decision, reasons, trace
 
 
@@ -176,62 +360,196 @@ tools = [
 
 
 
-def retry_with_fallback(func, *args, max_retries=2, fallback=None):
-    """Helper function to retry operations with fallback"""
-    last_error = None
-    for attempt in range(max_retries):
-        try:
-            return func(*args)
-        except Exception as e:
-            last_error = e
-            if attempt < max_retries - 1:  # Don't sleep on last attempt
-                time.sleep(1 * (attempt + 1))  # Exponential backoff
-    
-    # If all retries failed and we have a fallback
-    if fallback:
-        try:
-            return fallback(*args)
-        except Exception as fallback_error:
-            raise Exception(f"Both main function and fallback failed. Main error: {last_error}, Fallback error: {fallback_error}")
-    
-    raise last_error
+#LLM calls retry with jittered backoff inside the request's time budget, and
+#the breaker sends payments straight to the rules after repeated failures
+ai_retry_policy = RetryPolicy(
+    max_attempts=settings.AI_RETRY_MAX_ATTEMPTS,
+    base_delay=settings.AI_RETRY_BASE_DELAY,
+    max_delay=settings.AI_RETRY_MAX_DELAY
+)
+ai_breaker = CircuitBreaker(
+    failure_threshold=settings.AI_BREAKER_FAILURE_THRESHOLD,
+    reset_timeout=settings.AI_BREAKER_RESET_SECONDS
+)
+
+#Threads for LLM attempts. Unlike the loop's default executor, asyncio.run()
+#does not join this one, so an attempt abandoned at the deadline cannot hold
+#up agent_decide_ai's caller
+_ai_attempts = ThreadPoolExecutor(
+    max_workers=settings.AGENT_POOL_SIZE * settings.AI_RETRY_MAX_ATTEMPTS,
+    thread_name_prefix="ai-attempt"
+)
+
+_BREAKER_OPEN_STEP = {"step": "fallback", "detail": "AI agent circuit open, used rule-based agent"}
 
-def agent_decide_ai(payment):
-    from .store import store
-    import time
+def short_circuited(trace) -> bool:
+    """Whether the breaker sent this decision to the rules without asking the LLM"""
+    return _BREAKER_OPEN_STEP in trace
+
+def ai_resilience_stats() -> dict:
+    return {"breaker": ai_breaker.stats(), "retries": ai_retry_policy.stats()}
+
+#LLM verdicts reused across payments that present the same risk features
+ai_decision_cache = DecisionCache(
+    max_entries=settings.AI_DECISION_CACHE_MAX_ENTRIES,
+    ttl=settings.AI_DECISION_CACHE_TTL_SECONDS,
+    amount_edges=settings.AI_DECISION_CACHE_AMOUNT_EDGES + [settings.REVIEW_THRESHOLD]
+)
 
+def _decision_cache_key(payment, balance, risk):
+    """The features the agent's verdict depends on; payments with equal keys get the same verdict"""
+    velocity = risk.last_24h_count
+    velocity_band = 0 if not velocity else 1 if velocity <= HIGH_VELOCITY_24H_COUNT else 2
+    return (
+        payment.currency,
+        ai_decision_cache.amount_bucket(payment.amount),
+        balance >= payment.amount,
+        risk.recent_disputes,
+        velocity_band,
+        tuple(_risk_flags(risk)),
+    )
+
+def decision_cache_stats() -> dict:
+    return ai_decision_cache.stats()
+
+#Long-lived pool of LLM clients + agent executors, built once at startup
+_agent_pool: Optional[AgentPool] = None
+_agent_pool_lock = threading.Lock()
+_agent_pool_init_lock = threading.Lock()
+
+def _build_executor(llm_factory: Callable[[], Any]):
+    # Pool builds happen off the request path; their retries are not in the request metrics
+    llm = RetryPolicy(max_attempts=2, base_delay=settings.AI_RETRY_BASE_DELAY).call_sync(llm_factory)
+    return initialize_agent(
+        tools,
+        llm,
+        agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION,
+        verbose=settings.LOG_LEVEL == "DEBUG"
+    )
+
+def init_agent_pool(llm_factory: Optional[Callable[[], Any]] = None, size: Optional[int] = None) -> AgentPool:
+    """Create (or replace) the shared agent pool and build its workers"""
+    global _agent_pool
+    factory = llm_factory or LLM_FACTORIES[settings.LLM_PROVIDER]
+    pool = AgentPool(
+        size or settings.AGENT_POOL_SIZE,
+        lambda: _build_executor(factory),
+        max_failures=settings.AGENT_POOL_MAX_FAILURES
+    )
+    pool.start()
+    with _agent_pool_lock:
+        previous, _agent_pool = _agent_pool, pool
+    if previous:
+        previous.shutdown()
+    return pool
+
+def get_agent_pool() -> AgentPool:
+    """The shared pool, built on first use if startup did not build it (blocking)"""
+    if _agent_pool is None:
+        with _agent_pool_init_lock:
+            if _agent_pool is None:
+                init_agent_pool()
+    return _agent_pool
+
+def agent_pool_stats() -> Optional[dict]:
+    return _agent_pool.stats() if _agent_pool is not None else None
+
+def shutdown_agent_pool():
+    if _agent_pool is not None:
+        _agent_pool.shutdown()
+
+#How the agent is asked to phrase its final answer (AI_OUTPUT_FORMAT)
+_ANSWER_FORMATS = {
+    "json": (
+        "Your final answer must be a single JSON object and nothing else:\n"
+        '    {"decision": "allow" | "review" | "block", "reasons": [...]}\n'
+        f"    with reasons taken from: {', '.join(DECISION_REASONS)}"
+    ),
+    "text": (
+        "Return your analysis in this format:\n"
+        "    DECISION: [allow/review/block]\n"
+        "    REASONS: [comma-separated list of reasons]"
+    ),
+}
+
+#Matched against the lowercased answer
+_TEXT_DECISION = re.compile(r"decision:\s*\**\s*(allow|review|block)\b")
+#Reason names as they appear in free text, mapped to response reasons
+_TEXT_REASONS = {reason: reason for reason in DECISION_REASONS}
+_TEXT_REASONS["high_velocity"] = "high_transaction_velocity"
+_DEFAULT_REASONS = {"allow": "transaction_allowed", "review": "flagged_suspicious",
+                    "block": "transaction_blocked"}
+
+def parse_verdict(analysis: str) -> Optional[Tuple[str, List[str]]]:
+    """
+    (decision, reasons) from the agent's final answer, or None if it has no
+    valid decision. JSON output is validated against AgentVerdict in one
+    pass; the text format is lowercased once and searched for the decision
+    line and the known reason names. Reasons outside DecisionReason (e.g.
+    raw risk flags like unusual_country) are dropped, and an empty reason
+    list gets the decision's default reason.
+    """
+    if settings.AI_OUTPUT_FORMAT == "json":
+        start, end = analysis.find("{"), analysis.rfind("}")
+        if start < 0 or end < start:
+            return None
+        try:
+            verdict = AgentVerdict.model_validate_json(analysis[start:end + 1])
+        except ValidationError:
+            return None
+        decision = verdict.decision
+        known = (_TEXT_REASONS.get(reason.strip().lower()) for reason in verdict.reasons)
+        reasons = list(dict.fromkeys(reason for reason in known if reason))
+    else:
+        text = analysis.lower()
+        match = _TEXT_DECISION.search(text)
+        if match is None:
+            return None
+        decision = match.group(1)
+        found = sorted((text.find(name), reason) for name, reason in _TEXT_REASONS.items() if name in text)
+        reasons = list(dict.fromkeys(reason for _, reason in found))
+    return decision, reasons or [_DEFAULT_REASONS[decision]]
+
+def agent_decide_ai(payment, deadline: Optional[float] = None):
+    """Blocking wrapper around agent_decide_ai_async, for worker threads (batch, eval)"""
+    return asyncio.run(agent_decide_ai_async(payment, deadline))
+
+async def agent_decide_ai_async(payment, deadline: Optional[float] = None):
+    """
+    Decide with the LLM agent. The whole call, retries and backoff included,
+    stays within deadline (time.monotonic(); REQUEST_TIMEOUT from now by
+    default); when the budget, the retries or the breaker give out, the
+    rule-based agent decides instead.
+    """
     trace = []
     reasons = []
-    
-    # Initialize LLM with retry logic
-    def init_llm():
-        return ChatGoogleGenerativeAI(
-            model="gemini-1.5-flash",
-            temperature=0.0
-        )
-    
-    try:
-        llm = retry_with_fallback(init_llm, max_retries=2)
-    except Exception as e:
-        trace.append({"step": "error", "detail": f"LLM initialization failed: {str(e)}"})
-        # Fallback to non-AI agent if LLM fails
-        return agent_decide(payment)
-
-    # Initialize agent with retry
-    def init_agent():
-        return initialize_agent(
-            tools,
-            llm,
-            agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION,
-            verbose=True
-        )
-    
-    try:
-        agent = retry_with_fallback(init_agent, max_retries=2)
-    except Exception as e:
-        trace.append({"step": "error", "detail": f"Agent initialization failed: {str(e)}"})
-        # Fallback to non-AI agent if initialization fails
-        return agent_decide(payment)
+    if deadline is None:
+        deadline = time.monotonic() + settings.REQUEST_TIMEOUT
+
+    cache_key = None
+    if _decision_cache_enabled():
+        cache_key = _decision_cache_key(payment, await get_balance_async(payment.customerId),
+                                        get_risk_profile(payment.customerId))
+        verdict = ai_decision_cache.get(cache_key)
+        if verdict is not None:
+            trace.append({"step": "decision_cache", "detail": "reused AI verdict for matching risk features"})
+            return await _complete_ai_decision(payment, verdict[0], list(verdict[1]), None, trace)
+
+    breaker = _breaker()
+    if not breaker.allow():
+        trace.append(dict(_BREAKER_OPEN_STEP))
+        return await _rules_fallback(payment, trace)
+
+    pool = _agent_pool
+    if pool is None:
+        # Not built at startup (see server lifespan): building runs the LLM factory, so not on the loop
+        pool = await asyncio.to_thread(get_agent_pool)
+    acquire_timeout = max(0.0, min(settings.AGENT_POOL_ACQUIRE_TIMEOUT, deadline - time.monotonic()))
+    worker = await asyncio.to_thread(pool.acquire, acquire_timeout)
+    if worker is None:
+        # Pool exhausted or unhealthy: decide with the rule-based agent
+        trace.append({"step": "fallback", "detail": "AI agent pool unavailable, used rule-based agent"})
+        return await _rules_fallback(payment, trace)
 
     # Custom prompt that enforces tool usage and clear decision making
     custom_prompt = f"""You are a payment transaction agent. Use the provided tools to evaluate this payment:
@@ -242,7 +560,7 @@ def agent_decide_ai(payment):
     2. Use get_risk_signal tool to check for risk factors
     3. Make a decision based on these rules:
        - If balance < payment amount: BLOCK (insufficient_balance)
-       - If payment > 100.0: REVIEW (amount_above_daily_threshold)
+       - If payment > {settings.REVIEW_THRESHOLD}: REVIEW (amount_above_daily_threshold)
        - If recent disputes > 0: REVIEW (recent_disputes)
        - If suspicious activity or high velocity: REVIEW
        - Otherwise: ALLOW
@@ -257,67 +575,56 @@ def agent_decide_ai(payment):
 
     Example create_case usage:
 
-    Return your analysis in this format:
-    DECISION: [allow/review/block]
-    REASONS: [comma-separated list of reasons]
+    {_ANSWER_FORMATS[settings.AI_OUTPUT_FORMAT]}
     """
 
     trace.append({"step": "plan", "detail": "Initiating payment evaluation process"})
 
-    # Execute agent with retry and fallback
-    def execute_agent():
-        return agent.run(custom_prompt)
+    # Each attempt runs the executor in an _ai_attempts thread; an attempt cut
+    # off at the deadline keeps its thread, so the worker goes back only when
+    # it ends (the callback then runs in that thread, not on the loop)
+    runs = []
+    def attempt():
+        context = contextvars.copy_context()
+        runs.append(_ai_attempts.submit(context.run, worker.executor.run, custom_prompt))
+        return asyncio.shield(asyncio.wrap_future(runs[-1]))
 
     try:
-        analysis = retry_with_fallback(
-            execute_agent,
-            max_retries=2,
-            fallback=lambda: agent_decide(payment)[0]  # Use non-AI agent as fallback
-        )
+        analysis = await ai_retry_policy.call(attempt, deadline, breaker=breaker)
     except Exception as e:
         trace.append({"step": "error", "detail": f"Agent execution failed: {str(e)}"})
-        return agent_decide(payment)  # Final fallback to non-AI agent
+        return await _rules_fallback(payment, trace)  # Fall back to the rule-based agent
+    finally:
+        if runs and not runs[-1].done():
+            runs[-1].add_done_callback(lambda run: pool.release(worker, ok=False))
+        else:
+            pool.release(worker, ok=bool(runs) and not runs[-1].cancelled() and runs[-1].exception() is None)
     
-    # Extract decision and reasons from AI analysis with validation
-    decision = "review"  # Default to review
-    try:
-        if "DECISION: allow" in analysis.lower():
-            decision = "allow"
-        elif "DECISION: block" in analysis.lower():
-            decision = "block"
-    except Exception as e:
-        trace.append({"step": "error", "detail": f"Decision parsing failed: {str(e)}"})
-        # Fallback to analyzing the response in a more forgiving way
-        if "allow" in analysis.lower():
-            decision = "allow"
-        elif "block" in analysis.lower():
-            decision = "block"
-    
-    # Parse reasons from the AI's response
-    reasons = []
-    if "insufficient_balance" in analysis.lower():
-        reasons.append("insufficient_balance")
-    if "amount_above_daily_threshold" in analysis.lower():
-        reasons.append("amount_above_daily_threshold")
-    if "recent_disputes" in analysis.lower():
-        reasons.append("recent_disputes")
-    if "suspicious_activity" in analysis.lower():
-        reasons.append("suspicious_activity")
-    if "high_velocity" in analysis.lower():
-        reasons.append("high_transaction_velocity")
-    
-    # Always ensure we have at least one reason
-    if not reasons:
-        if decision == "allow":
-            reasons.append("transaction_allowed")
-        elif decision == "review":
-            reasons.append("flagged_suspicious")
-        else:  # block
-            reasons.append("transaction_blocked")
-
+    verdict = parse_verdict(analysis)
+    if verdict is None:
+        # Unusable answer: the rules decide, which costs far less than a wrong review
+        trace.append({"step": "AI analysis", "detail": _summarize(analysis, trace_level(payment))})
+        trace.append({"step": "fallback", "detail": "AI agent output malformed, used rule-based agent"})
+        return await _rules_fallback(payment, trace)
+    decision, reasons = verdict
+
+    if cache_key is not None:
+        ai_decision_cache.set(cache_key, decision, reasons)
+    return await _complete_ai_decision(payment, decision, reasons, analysis, trace)
+
+#Steps agent_decide_async records while gathering signals; the caller's trace already has them
+_SIGNAL_STEPS = {"plan", "tool:getBalance", "tool:getRiskSignals"}
+
+async def _rules_fallback(payment, trace):
+    """The rule-based agent decides; only its decision steps are added to trace"""
+    decision, reasons, fallback_trace = await agent_decide_async(payment)
+    return decision, reasons, trace + [step for step in fallback_trace if step["step"] not in _SIGNAL_STEPS]
+
+async def _complete_ai_decision(payment, decision, reasons, analysis, trace):
+    """Per-payment side effects of an AI verdict, fresh or cached: reservation, case, counters"""
     # For ALLOW decisions, verify balance can be reserved
     if decision == "allow":
-        ok = store.reserve(payment.customerId, payment.amount)
+        ok = await _store().reserve_async(payment.customerId, payment.amount)
         if not ok:
             decision = "block"
             reasons = ["insufficient_balance"]
@@ -325,14 +632,13 @@ def agent_decide_ai(payment):
 
     # Create case for review/block decisions
     if decision in ["review", "block"]:
-        json_input = json.dumps({
-            "customer_id": payment.customerId,
-            "reason": ", ".join(reasons)
-        })
-        case_id = create_case(json_input)
+        case_id = await create_case_async(payment.customerId, ", ".join(reasons))
         trace.append({"step": "tool:createCase", "detail": f"case_id={case_id}"})
 
-    trace.append({"step": "AI analysis", "detail": analysis})
+    if analysis is not None:
+        trace.append({"step": "AI analysis", "detail": _summarize(analysis, trace_level(payment))})
     trace.append({"step": "final_decision", "detail": f"Decision: {decision}, Reasons: {reasons}"})
+    _record_outcome(payment, decision)
+    _record_tier(trace, "ai")
 
     return decision, reasons, trace
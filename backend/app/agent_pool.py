@@ -0,0 +1,160 @@
+import queue
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+from .utils import structured_log
+
+# Final answer returned by the offline stub model, in the format agent_decide_ai expects
+STUB_RESPONSE = (
+    "Thought: I have checked the balance and risk signals.\n"
+    'Final Answer: {"decision": "review", "reasons": ["flagged_suspicious"]}'
+)
+
+
+def build_stub_llm(responses: Optional[List[str]] = None):
+    """Offline chat model that stands in for Gemini in tests and benchmarks"""
+    return FakeListChatModel(responses=responses or [STUB_RESPONSE])
+
+
+def build_gemini_llm():
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    return ChatGoogleGenerativeAI(
+        model="gemini-1.5-flash",
+        temperature=0.0
+    )
+
+
+LLM_FACTORIES: Dict[str, Callable[[], Any]] = {
+    "gemini": build_gemini_llm,
+    "stub": build_stub_llm,
+}
+
+
+class AgentWorker:
+    """A pre-built LLM client and agent executor, reused across requests"""
+    __slots__ = ("worker_id", "executor", "failures", "uses")
+
+    def __init__(self, worker_id: int, executor: Any):
+        self.worker_id = worker_id
+        self.executor = executor
+        self.failures = 0
+        self.uses = 0
+
+
+class AgentPool:
+    """
+    Fixed-size pool of agent executors. Concurrency is bounded by the number of
+    workers; callers that cannot lease one within the timeout should fall back
+    to the rule-based agent.
+    """
+
+    def __init__(self, size: int, build_executor: Callable[[], Any],
+                 max_failures: int = 3, health_check_interval: float = 30.0):
+        self.size = size
+        self.build_executor = build_executor
+        self.max_failures = max_failures
+        self.health_check_interval = health_check_interval
+        self._idle: "queue.Queue[AgentWorker]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._next_id = 0
+        self._live = 0
+        self._rebuilding = 0
+        self._stopped = threading.Event()
+        self.stats_counters = {"leased": 0, "exhausted": 0, "rebuilt": 0, "buildFailures": 0}
+
+    def start(self):
+        """Build all workers up front and start the health check thread"""
+        self.health_check()
+        thread = threading.Thread(target=self._health_loop, daemon=True)
+        thread.start()
+
+    def shutdown(self):
+        self._stopped.set()
+
+    def _health_loop(self):
+        while not self._stopped.wait(self.health_check_interval):
+            self.health_check()
+
+    def _build_worker(self) -> Optional[AgentWorker]:
+        try:
+            executor = self.build_executor()
+        except Exception as e:
+            with self._lock:
+                self.stats_counters["buildFailures"] += 1
+            structured_log("warning", "agent_pool_build_failed", {"error": str(e)})
+            return None
+        with self._lock:
+            self._next_id += 1
+            self._live += 1
+            return AgentWorker(self._next_id, executor)
+
+    def health_check(self):
+        """Replace workers that were retired after repeated failures"""
+        with self._lock:
+            missing = self.size - self._live - self._rebuilding
+        for _ in range(missing):
+            worker = self._build_worker()
+            if worker is None:
+                break
+            self._idle.put(worker)
+
+    @property
+    def healthy(self) -> bool:
+        return self._live + self._rebuilding > 0
+
+    def acquire(self, timeout: float) -> Optional[AgentWorker]:
+        """Lease an idle worker, or None if the pool is exhausted or unhealthy"""
+        if not self.healthy:
+            return None
+        try:
+            worker = self._idle.get(timeout=timeout)
+        except queue.Empty:
+            with self._lock:
+                self.stats_counters["exhausted"] += 1
+            return None
+        with self._lock:
+            self.stats_counters["leased"] += 1
+        worker.uses += 1
+        return worker
+
+    def release(self, worker: AgentWorker, ok: bool = True):
+        """
+        Return a worker; retire it after max_failures consecutive failures.
+        The replacement is built in a background thread, since release() may
+        be called on the event loop and building an LLM client blocks.
+        """
+        worker.failures = 0 if ok else worker.failures + 1
+        if worker.failures < self.max_failures:
+            self._idle.put(worker)
+            return
+
+        structured_log("warning", "agent_worker_retired", {
+            "worker_id": worker.worker_id,
+            "failures": worker.failures
+        })
+        with self._lock:
+            self._live -= 1
+            self._rebuilding += 1
+        threading.Thread(target=self._replace_worker, name="agent-rebuild", daemon=True).start()
+
+    def _replace_worker(self):
+        try:
+            replacement = self._build_worker()
+        finally:
+            with self._lock:
+                self._rebuilding -= 1
+        if replacement is not None:
+            with self._lock:
+                self.stats_counters["rebuilt"] += 1
+            self._idle.put(replacement)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "size": self.size,
+                "live": self._live,
+                "idle": self._idle.qsize(),
+                **self.stats_counters,
+            }
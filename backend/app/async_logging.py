@@ -0,0 +1,120 @@
+import logging
+import queue
+import threading
+import time
+from typing import List, Optional
+
+# Overflow policies when the queue is full
+DROP = "drop"      # discard the record and count it
+BLOCK = "block"    # make the caller wait for space (backpressure)
+
+_STOP = object()
+
+
+class BatchingQueueHandler(logging.Handler):
+    """
+    Logging handler that moves formatting and I/O off the request path.
+
+    Records are put on a bounded queue. A background writer thread formats
+    them with the target handler's formatter and writes them in one batch,
+    flushing when batch_size records are pending or flush_interval elapses.
+    """
+
+    def __init__(self, target: logging.StreamHandler, queue_size: int = 10000,
+                 batch_size: int = 256, flush_interval: float = 0.05,
+                 overflow_policy: str = DROP, block_timeout: float = 1.0):
+        super().__init__()
+        if overflow_policy not in (DROP, BLOCK):
+            raise ValueError(f"Unknown overflow policy: {overflow_policy}")
+        self.target = target
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow_policy = overflow_policy
+        self.block_timeout = block_timeout
+        self.queue: "queue.Queue" = queue.Queue(maxsize=queue_size)
+        self.dropped = 0
+        self.written = 0
+        self._flushed = threading.Condition()
+        self._pending = 0
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+
+    def emit(self, record: logging.LogRecord):
+        if self._closed:
+            self.target.handle(record)
+            return
+        with self._flushed:
+            self._pending += 1
+        try:
+            if self.overflow_policy == BLOCK:
+                self.queue.put(record, timeout=self.block_timeout)
+            else:
+                self.queue.put_nowait(record)
+        except queue.Full:
+            self._done(1)
+            self.dropped += 1
+
+    def _done(self, count: int):
+        with self._flushed:
+            self._pending -= count
+            if self._pending <= 0:
+                self._flushed.notify_all()
+
+    def _collect(self) -> Optional[List]:
+        """Wait for the first record, then drain up to batch_size until the interval ends"""
+        first = self.queue.get()
+        if first is _STOP:
+            return None
+        batch = [first]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                self.queue.put(_STOP)  # handled on the next loop, after this batch is written
+                break
+            batch.append(item)
+        return batch
+
+    def _write(self, batch: List[logging.LogRecord]):
+        lines = []
+        for record in batch:
+            try:
+                lines.append(self.target.format(record))
+            except Exception:
+                self.target.handleError(record)
+        if lines:
+            stream = self.target.stream
+            try:
+                stream.write("\n".join(lines) + "\n")
+                stream.flush()
+            except Exception:
+                self.target.handleError(batch[-1])
+        self.written += len(lines)
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+            try:
+                self._write(batch)
+            finally:
+                self._done(len(batch))
+
+    def flush(self, timeout: float = 5.0):
+        """Block until every queued record has been written"""
+        with self._flushed:
+            self._flushed.wait_for(lambda: self._pending <= 0, timeout=timeout)
+
+    def close(self):
+        if not self._closed:
+            self.flush()
+            self._closed = True
+            self.queue.put(_STOP)
+            self._thread.join(timeout=5.0)
+        super().close()
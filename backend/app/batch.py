@@ -0,0 +1,194 @@
+import json
+from typing import Any, Callable, Hashable, List, Optional, Tuple, Union
+
+from pydantic import ValidationError
+
+import config as settings
+from .agent import agent_decide_batch, visible_trace
+from .models import PaymentRequest
+from .serialization import encode_payment_response
+from .singleflight import IdempotencyConflictError, InFlightTable
+from .store import LockTimeoutError, StorageBackend, TransactionError
+from .utils import generate_request_id, structured_log
+
+NDJSON_CONTENT_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+
+
+class BatchFormatError(Exception):
+    """Raised when a batch body is neither a JSON array nor NDJSON"""
+    pass
+
+
+class ItemError:
+    """A failed batch item: HTTP-style status plus detail"""
+    __slots__ = ("status", "detail", "exc")
+
+    def __init__(self, status: int, detail: Any, exc: BaseException = None):
+        self.status = status
+        self.detail = detail
+        self.exc = exc
+
+
+# A batch item is pending (PaymentRequest), decided (serialized response) or failed
+BatchItem = Union[PaymentRequest, bytes, ItemError]
+
+
+def parse_batch(body: bytes, content_type: str) -> List[BatchItem]:
+    """Decode a JSON array or NDJSON body and validate each item on its own"""
+    if content_type.split(";")[0].strip() in NDJSON_CONTENT_TYPES:
+        return [parse_line(line) for line in body.splitlines() if line.strip()]
+    try:
+        raw = json.loads(body)
+    except ValueError as e:
+        raise BatchFormatError(f"Invalid JSON: {e}")
+    if not isinstance(raw, list):
+        raise BatchFormatError("Expected a JSON array of payments or an NDJSON body")
+    return [_validate(item) for item in raw]
+
+
+def parse_line(line: bytes) -> BatchItem:
+    """Decode and validate one NDJSON line"""
+    try:
+        return _validate(json.loads(line))
+    except ValueError as e:
+        return ItemError(400, f"Invalid JSON: {e}")
+
+
+def _validate(item: Any) -> BatchItem:
+    try:
+        return PaymentRequest.model_validate(item)
+    except ValidationError as e:
+        return ItemError(422, json.loads(e.json(include_url=False)))
+
+
+def apply_rate_limits(items: List[BatchItem], limiter) -> None:
+    """Each payment spends a rate-limit token, as on the single endpoint"""
+    for i, item in enumerate(items):
+        if isinstance(item, PaymentRequest) and not limiter.allow(item.customerId):
+            structured_log("warning", "rate_limit_exceeded", {"customer_id": item.customerId})
+            items[i] = ItemError(429, "Rate limit exceeded")
+
+
+def item_error(e: BaseException) -> ItemError:
+    """Map a decision failure to the status the single endpoint would return"""
+    if isinstance(e, LockTimeoutError):
+        return ItemError(503, str(e), e)
+    if isinstance(e, IdempotencyConflictError):
+        return ItemError(409, str(e), e)
+    if isinstance(e, TransactionError):
+        return ItemError(400, str(e), e)
+    return ItemError(500, "An error occurred processing the payment", e)
+
+
+def decide_batch(items: List[BatchItem], store: StorageBackend, inflight: InFlightTable,
+                 fingerprint: Callable[[PaymentRequest], Hashable]
+                 ) -> Tuple[List[BatchItem], List[str], List[Optional[str]], List[str]]:
+    """
+    Decide every pending item (blocking; run it in a worker thread). Returns
+    the items with each pending payment replaced by its serialized response
+    or an ItemError, plus for metrics: the decisions this batch made, each
+    item's latency label as the single endpoint would give it ("cached" for
+    replays, None if it failed) and the exception type of each failure.
+
+    Idempotency applies per item: cached keys are replayed, keys repeated
+    within the batch share one decision, and keys in flight in another
+    request wait for it, exactly as on the single endpoint.
+    """
+    results = list(items)
+    decisions: List[str] = []
+    labels: List[Optional[str]] = [None] * len(items)
+    errors: List[str] = []
+    leaders = {}      # key -> (index, future) for keys this batch decides
+    followers = []    # (index, future) for keys another request is deciding
+    duplicates = []   # (index, leader index) for keys repeated within the batch
+    pending = []
+    for i, item in enumerate(items):
+        if not isinstance(item, PaymentRequest):
+            continue
+        key = item.idempotencyKey
+        if key in leaders:
+            first = leaders[key][0]
+            if fingerprint(items[first]) != fingerprint(item):
+                results[i] = ItemError(409, f"Idempotency key {key} is already in use with a different request")
+            else:
+                duplicates.append((i, first))
+            continue
+        cached = store.get_idempotency(key)
+        if cached:
+            results[i], labels[i] = cached, "cached"
+            continue
+        try:
+            leader, future = inflight.claim(key, fingerprint(item))
+        except IdempotencyConflictError as e:
+            results[i] = item_error(e)
+            continue
+        if not leader:
+            followers.append((i, future))
+            continue
+        leaders[key] = (i, future)
+        # Another request may have finished between the lookup and the claim
+        cached = store.get_idempotency(key)
+        if cached:
+            results[i], labels[i] = cached, "cached"
+            continue
+        pending.append(i)
+
+    try:
+        outcomes = agent_decide_batch([items[i] for i in pending])
+        for i, outcome in zip(pending, outcomes):
+            if isinstance(outcome, BaseException):
+                results[i] = item_error(outcome)
+                errors.append(type(outcome).__name__)
+                continue
+            decision, reasons, trace = outcome
+            payment = items[i]
+            request_id = generate_request_id()
+            payload = encode_payment_response(decision, reasons, visible_trace(payment, trace), request_id)
+            store.save_idempotency(payment.idempotencyKey, payload)
+            results[i], labels[i] = payload, decision
+            decisions.append(decision)
+            structured_log("info", "payment.decided", {
+                "request_id": request_id,
+                "decision": decision,
+                "reasons": reasons,
+                "customer_id": payment.customerId
+            })
+    except Exception as e:
+        for i in pending:
+            if isinstance(results[i], PaymentRequest):
+                results[i] = item_error(e)
+        raise
+    finally:
+        for key, (i, future) in leaders.items():
+            result = results[i]
+            if isinstance(result, bytes):
+                inflight.finish(key, future, result)
+            else:
+                exc = result.exc if isinstance(result, ItemError) and result.exc else None
+                inflight.finish(key, future, error=exc or RuntimeError("Batch item was not decided"))
+
+    for i, future in followers:
+        try:
+            result = future.result(timeout=settings.REQUEST_TIMEOUT)
+            if isinstance(result, bytes):
+                results[i], labels[i] = result, "cached"
+            else:
+                results[i], labels[i] = result.body, result.decision
+        except Exception as e:
+            results[i] = item_error(e)
+    for i, first in duplicates:
+        results[i], labels[i] = results[first], labels[first]
+    return results, decisions, labels, errors
+
+
+def encode_result(index: int, result: Union[bytes, ItemError]) -> bytes:
+    """One item's result; a serialized response is spliced in as-is"""
+    if isinstance(result, bytes):
+        return b'{"index":%d,"status":200,"response":%s}' % (index, result)
+    return json.dumps({"index": index, "status": result.status, "detail": result.detail},
+                      separators=(",", ":"), default=str).encode()
+
+
+def encode_results(results: List[BatchItem]) -> bytes:
+    """Serialize per-item results in input order"""
+    return b'{"results":[' + b",".join(encode_result(i, r) for i, r in enumerate(results)) + b"]}"
@@ -0,0 +1,80 @@
+import bisect
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional, Sequence, Tuple
+
+Verdict = Tuple[str, Tuple[str, ...]]
+
+
+class _Entry:
+    __slots__ = ("verdict", "expires_at")
+
+    def __init__(self, verdict: Verdict, expires_at: float):
+        self.verdict = verdict
+        self.expires_at = expires_at
+
+
+class DecisionCache:
+    """
+    LLM verdicts (decision, reasons) keyed by a payment's normalized risk
+    features, so payments that look the same to the agent reuse one answer.
+
+    Entries live for ttl seconds; past max_entries the least recently used
+    are evicted. Only the verdict is cached: reservation and case creation
+    still run for every payment.
+    """
+
+    def __init__(self, max_entries: int, ttl: float, amount_edges: Sequence[float]):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.amount_edges = sorted(set(amount_edges))
+        self._entries: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def amount_bucket(self, amount: float) -> int:
+        """Index of the (lower, upper] band the amount falls in"""
+        return bisect.bisect_left(self.amount_edges, amount)
+
+    def get(self, key: Hashable) -> Optional[Verdict]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.expires_at <= now:
+                if entry is not None:
+                    del self._entries[key]
+                    self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry.verdict
+
+    def set(self, key: Hashable, decision: str, reasons: Sequence[str]):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = _Entry((decision, tuple(reasons)), time.monotonic() + self.ttl)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hitRate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "llmCallsSaved": self.hits,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
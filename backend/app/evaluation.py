@@ -0,0 +1,200 @@
+import hashlib
+import json
+import os
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from .agent import isolated_state, short_circuited
+from .models import PaymentRequest
+from .resilience import CircuitBreaker
+from .risk_signals import RiskSignalService
+from .store import InMemoryStore
+import config as settings
+
+
+class CassetteMiss(Exception):
+    """Raised in replay mode when a prompt was never recorded"""
+    pass
+
+
+class Cassette:
+    """
+    LLM responses recorded to a JSON file, keyed by a hash of the prompt
+    messages and stop words. In replay mode nothing is sent to the model.
+    """
+
+    def __init__(self, path: str, record: bool = False):
+        self.path = path
+        self.record = record
+        self.responses: Dict[str, str] = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.responses = json.load(f)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.recorded = 0
+
+    @staticmethod
+    def key(messages, stop: Optional[List[str]]) -> str:
+        prompt = [[message.type, message.content] for message in messages]
+        data = json.dumps([prompt, stop or []], sort_keys=True).encode()
+        return hashlib.sha256(data).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            text = self.responses.get(key)
+            if text is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return text
+
+    def put(self, key: str, text: str):
+        with self._lock:
+            self.responses[key] = text
+            self.recorded += 1
+
+    def save(self):
+        """Write the cassette atomically; a no-op in replay mode"""
+        if not self.record:
+            return
+        with self._lock:
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "w") as f:
+                json.dump(self.responses, f, indent=1, sort_keys=True)
+            os.replace(tmp, self.path)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self.responses), "hits": self.hits,
+                    "misses": self.misses, "recorded": self.recorded}
+
+
+class CassetteChatModel(BaseChatModel):
+    """
+    Chat model that answers from a Cassette. With an inner model, prompts
+    missing from the cassette are sent to it and the answer is recorded;
+    without one they raise CassetteMiss.
+    """
+    cassette: Any
+    inner: Any = None
+
+    @property
+    def _llm_type(self) -> str:
+        return "cassette"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        key = self.cassette.key(messages, stop)
+        text = self.cassette.get(key)
+        if text is None:
+            if self.inner is None:
+                raise CassetteMiss(f"no recorded response for prompt {key[:12]}")
+            text = self.inner.invoke(messages, stop=stop).content
+            self.cassette.put(key, text)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+
+class EvalStore(InMemoryStore):
+    """In-memory store for a single case; case ids are numbered so prompts replay identically"""
+
+    def __init__(self):
+        super().__init__()
+        self._case_count = 0
+
+    def _new_case_id(self) -> str:
+        self._case_count += 1
+        return f"case_{self._case_count:06d}"
+
+
+def run_case(index: int, case: Dict[str, Any], decide: Callable,
+             breaker: Optional[CircuitBreaker] = None) -> Dict[str, Any]:
+    """
+    Decide one case against its own store and risk signals, with the run's
+    breaker and no decision cache. A case the breaker sent to the rules
+    fails: its answer is not the agent's.
+    """
+    payment = PaymentRequest(**case["input"])
+    signals = RiskSignalService(
+        window_seconds=settings.RISK_VELOCITY_WINDOW_SECONDS,
+        buckets=settings.RISK_VELOCITY_BUCKETS,
+        profile_ttl=settings.RISK_PROFILE_TTL_SECONDS,
+        max_customers=settings.RISK_MAX_CUSTOMERS
+    )
+    error = None
+    with isolated_state(EvalStore(), signals, breaker=breaker, decision_cache=False):
+        start = time.perf_counter()
+        try:
+            decision, reasons, trace = decide(payment)
+        except Exception as e:
+            decision, reasons, trace, error = "error", [], [], str(e)
+        latency_ms = (time.perf_counter() - start) * 1000
+    if short_circuited(trace):
+        error = "AI agent circuit open"
+
+    return {
+        "case": index,
+        "customerId": payment.customerId,
+        "amount": payment.amount,
+        "expected": case["expected"],
+        "got": decision,
+        "reasons": reasons,
+        "passed": error is None and decision == case["expected"],
+        "latencyMs": round(latency_ms, 3),
+        "description": case.get("description", ""),
+        "error": error,
+    }
+
+
+def _percentile(sorted_values: List[float], pct: float) -> float:
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def run_evaluation(cases: List[Dict[str, Any]], decide: Callable, workers: int = 8) -> Dict[str, Any]:
+    """
+    Run every case through decide on a pool of `workers` threads, each case
+    isolated from the others. Returns per-case results plus accuracy and
+    latency percentiles.
+
+    Every case asks the model itself rather than reusing another case's
+    verdict, and the run has its own circuit breaker, so neither leaks into
+    or out of the server's shared state.
+    """
+    breaker = CircuitBreaker(
+        failure_threshold=settings.AI_BREAKER_FAILURE_THRESHOLD,
+        reset_timeout=settings.AI_BREAKER_RESET_SECONDS
+    )
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(lambda item: run_case(item[0], item[1], decide, breaker),
+                                enumerate(cases, 1)))
+    elapsed = time.perf_counter() - start
+
+    passed = sum(1 for result in results if result["passed"])
+    latencies = sorted(result["latencyMs"] for result in results)
+    summary = {
+        "total": len(results),
+        "passed": passed,
+        "failed": len(results) - passed,
+        "errors": sum(1 for result in results if result["error"]),
+        "accuracy": passed / len(results) if results else 0.0,
+        "shortCircuited": breaker.stats()["shortCircuited"],
+        "workers": workers,
+        "wallSeconds": round(elapsed, 3),
+    }
+    if latencies:
+        summary["latencyMs"] = {
+            "p50": _percentile(latencies, 50),
+            "p95": _percentile(latencies, 95),
+            "p99": _percentile(latencies, 99),
+            "mean": round(statistics.fmean(latencies), 3),
+        }
+    return {"summary": summary, "cases": results}
@@ -0,0 +1,121 @@
+import heapq
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+# Rough per-entry bookkeeping cost (dict slot, heap tuple, entry object)
+ENTRY_OVERHEAD_BYTES = 200
+
+
+class _Entry:
+    __slots__ = ("payload", "expires_at", "size")
+
+    def __init__(self, payload: bytes, expires_at: float, size: int):
+        self.payload = payload
+        self.expires_at = expires_at
+        self.size = size
+
+
+class IdempotencyCache:
+    """
+    Bounded cache of pre-serialized responses keyed by idempotency key.
+
+    Expiry is tracked in a min-heap and drained a few entries at a time on
+    each access, so there is no periodic full scan. When the entry count or
+    byte budget is exceeded, the least recently used entries are evicted.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int, default_ttl: float,
+                 expire_batch: int = 32):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.expire_batch = expire_batch
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._expiry: List[Tuple[float, str]] = []
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _remove(self, key: str) -> Optional[_Entry]:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.size
+        return entry
+
+    def _expire(self, now: float, limit: Optional[int]):
+        """Drop expired entries from the front of the heap (up to limit per call)"""
+        expiry = self._expiry
+        removed = 0
+        while expiry and expiry[0][0] <= now and (limit is None or removed < limit):
+            expires_at, key = heapq.heappop(expiry)
+            entry = self._entries.get(key)
+            # Skip heap records left behind by overwritten or evicted keys
+            if entry is not None and entry.expires_at == expires_at:
+                self._remove(key)
+                self.expirations += 1
+            removed += 1
+        # Rebuild if stale heap records pile up (keys overwritten or LRU-evicted)
+        if len(expiry) > 2 * len(self._entries) + 1024:
+            self._expiry = [(e.expires_at, k) for k, e in self._entries.items()]
+            heapq.heapify(self._expiry)
+
+    def set(self, key: str, payload: bytes, ttl: Optional[float] = None):
+        now = time.monotonic()
+        expires_at = now + (self.default_ttl if ttl is None else ttl)
+        size = len(payload) + len(key) + ENTRY_OVERHEAD_BYTES
+        with self._lock:
+            self._expire(now, self.expire_batch)
+            self._remove(key)
+            self._entries[key] = _Entry(payload, expires_at, size)
+            self._bytes += size
+            heapq.heappush(self._expiry, (expires_at, key))
+            while self._entries and (len(self._entries) > self.max_entries
+                                     or self._bytes > self.max_bytes):
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.size
+                self.evictions += 1
+
+    def get(self, key: str) -> Optional[bytes]:
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now, self.expire_batch)
+            entry = self._entries.get(key)
+            if entry is None or entry.expires_at <= now:
+                if entry is not None:
+                    self._remove(key)
+                    self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry.payload
+
+    def items(self) -> List[Tuple[str, bytes, float]]:
+        """Live entries as (key, payload, seconds until expiry), oldest first"""
+        now = time.monotonic()
+        with self._lock:
+            return [(k, e.payload, e.expires_at - now)
+                    for k, e in self._entries.items() if e.expires_at > now]
+
+    def purge_expired(self):
+        with self._lock:
+            self._expire(time.monotonic(), None)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
@@ -0,0 +1,155 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Deque, Dict, Iterator, Optional
+
+from .metrics import Histogram
+
+
+class FairLock:
+    """
+    FIFO lock: waiters block on their own handoff lock and are granted
+    ownership in arrival order when the holder releases.
+
+    Many FairLocks can share one mutex (it only guards the short state
+    changes), and the waiter queue is only allocated once the lock is
+    contended, so an idle lock costs three slots.
+    """
+    __slots__ = ("_mutex", "_locked", "_waiters")
+
+    def __init__(self, mutex: Optional[threading.Lock] = None):
+        self._mutex = mutex or threading.Lock()
+        self._locked = False
+        self._waiters: Optional[Deque[threading.Lock]] = None
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        with self._mutex:
+            if not self._locked and not self._waiters:
+                self._locked = True
+                return True
+            waiter = threading.Lock()
+            waiter.acquire()
+            if self._waiters is None:
+                self._waiters = deque()
+            self._waiters.append(waiter)
+
+        if waiter.acquire(timeout=-1 if timeout is None else max(timeout, 0)):
+            return True
+
+        with self._mutex:
+            if self._waiters is None or waiter not in self._waiters:
+                # Ownership was handed to us between the timeout and here
+                return True
+            self._waiters.remove(waiter)
+            if not self._waiters:
+                self._waiters = None
+        return False
+
+    def release(self):
+        with self._mutex:
+            if self._waiters:
+                # Hand off directly; the lock stays held by the next waiter
+                self._waiters.popleft().release()
+                if not self._waiters:
+                    self._waiters = None
+            else:
+                self._locked = False
+
+    def locked(self) -> bool:
+        return self._locked
+
+
+class SharedExclusiveLock:
+    """
+    Many shared holders or one exclusive holder. A waiting exclusive
+    acquirer blocks new shared holders, so it cannot be starved.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._shared = 0
+        self._exclusive = False
+        self._exclusive_waiting = 0
+
+    @contextmanager
+    def shared(self) -> Iterator[None]:
+        with self._cond:
+            while self._exclusive or self._exclusive_waiting:
+                self._cond.wait()
+            self._shared += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._shared -= 1
+                if not self._shared:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def exclusive(self) -> Iterator[None]:
+        with self._cond:
+            self._exclusive_waiting += 1
+            while self._exclusive or self._shared:
+                self._cond.wait()
+            self._exclusive_waiting -= 1
+            self._exclusive = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._exclusive = False
+                self._cond.notify_all()
+
+
+class CustomerLockManager:
+    """Per-customer FIFO locks with blocking timeouts and wait-time tracking"""
+
+    def __init__(self, timeout: float, lock_for: Optional[Callable[[str], FairLock]] = None,
+                 count: Optional[Callable[[], int]] = None):
+        """
+        lock_for (with count, for stats) lets the caller keep each lock
+        inside its own per-customer record instead of a dict here
+        """
+        self.timeout = timeout
+        self._locks: Dict[str, FairLock] = {}
+        self._guard = threading.Lock()
+        self._lock_for = lock_for or self._own_lock
+        self._count = count or self._locks.__len__
+        self.wait_histogram = Histogram()
+        self.timeouts = 0
+
+    def _own_lock(self, customer_id: str) -> FairLock:
+        lock = self._locks.get(customer_id)
+        if lock is None:
+            with self._guard:
+                lock = self._locks.setdefault(customer_id, FairLock())
+        return lock
+
+    def acquire(self, customer_id: str, timeout: Optional[float] = None, record: bool = True) -> bool:
+        """
+        Block until the customer's lock is acquired or the timeout expires.
+        With record=False a failed attempt is left out of the wait and
+        timeout stats (for try-locks that have a slower path to fall back on).
+        """
+        start = time.perf_counter()
+        acquired = self._lock_for(customer_id).acquire(
+            self.timeout if timeout is None else timeout
+        )
+        if not acquired and not record:
+            return False
+        self.wait_histogram.observe((time.perf_counter() - start) * 1000)
+        if not acquired:
+            with self._guard:
+                self.timeouts += 1
+        return acquired
+
+    def release(self, customer_id: str):
+        self._lock_for(customer_id).release()
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "customers": self._count(),
+            "timeouts": self.timeouts,
+            "waitMs": self.wait_histogram.snapshot(),
+        }
@@ -0,0 +1,347 @@
+import math
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# Default bucket upper bounds in milliseconds
+DEFAULT_BUCKETS_MS = (0.1, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+# Same bounds in seconds, for Prometheus histograms
+DEFAULT_BUCKETS_SECONDS = tuple(b / 1000 for b in DEFAULT_BUCKETS_MS)
+
+
+class Histogram:
+    """Fixed-bucket histogram with thread-safe observations"""
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS_MS):
+        self.buckets = tuple(sorted(buckets))
+        self._counts: List[int] = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self._count = 0
+        self._sum = 0.0
+        self._max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        idx = bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[idx] += 1
+            self._count += 1
+            self._sum += value
+            if value > self._max:
+                self._max = value
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Estimate the q-th percentile (0-100) as the upper bound of its bucket"""
+        with self._lock:
+            counts = list(self._counts)
+            total = self._count
+            max_value = self._max
+        if not total:
+            return None
+        rank = q / 100.0 * total
+        seen = 0
+        for idx, count in enumerate(counts):
+            seen += count
+            if seen >= rank and count:
+                if idx == len(self.buckets):
+                    return max_value
+                return min(self.buckets[idx], max_value)
+        return max_value
+
+    def state(self) -> Tuple[List[int], int, float, float]:
+        """Consistent copy of (bucket counts, count, sum, max)"""
+        with self._lock:
+            return list(self._counts), self._count, self._sum, self._max
+
+    def snapshot(self) -> Dict[str, object]:
+        counts, total, total_sum, max_value = self.state()
+        cumulative = 0
+        buckets = {}
+        for bound, count in zip(list(self.buckets) + ["+Inf"], counts):
+            cumulative += count
+            buckets[str(bound)] = cumulative
+        return {
+            "count": total,
+            "sum": round(total_sum, 3),
+            "max": round(max_value, 3),
+            "p50": self.percentile(50),
+            "p99": self.percentile(99),
+            "buckets": buckets,
+        }
+
+
+class RollingHistogram:
+    """
+    Fixed-memory, log-bucketed latency histogram over a ring of time slots.
+    Observations are O(1); percentiles for a window merge at most
+    window/slot_seconds slots, so a snapshot is O(buckets).
+    """
+
+    def __init__(self, slot_seconds: int = 10, slots: int = 30,
+                 min_ms: float = 0.01, max_ms: float = 60000.0, buckets_per_decade: int = 20):
+        self.slot_seconds = slot_seconds
+        self.slots = slots
+        self.min_ms = min_ms
+        self.buckets_per_decade = buckets_per_decade
+        self.num_buckets = int(math.ceil(math.log10(max_ms / min_ms) * buckets_per_decade)) + 1
+        self._counts = [[0] * self.num_buckets for _ in range(slots)]
+        self._totals = [0] * slots
+        self._maxes = [0.0] * slots
+        self._epochs = [-1] * slots
+        self._lock = threading.Lock()
+
+    def _bucket(self, value: float) -> int:
+        if value <= self.min_ms:
+            return 0
+        idx = int(math.log10(value / self.min_ms) * self.buckets_per_decade) + 1
+        return min(idx, self.num_buckets - 1)
+
+    def _upper_bound(self, idx: int) -> float:
+        return self.min_ms * 10 ** (idx / self.buckets_per_decade)
+
+    def observe(self, value_ms: float, now: Optional[float] = None):
+        epoch = int((time.time() if now is None else now) // self.slot_seconds)
+        slot = epoch % self.slots
+        idx = self._bucket(value_ms)
+        with self._lock:
+            if self._epochs[slot] != epoch:
+                # Slot is being reused for a new interval
+                counts = self._counts[slot]
+                for i in range(self.num_buckets):
+                    counts[i] = 0
+                self._totals[slot] = 0
+                self._maxes[slot] = 0.0
+                self._epochs[slot] = epoch
+            self._counts[slot][idx] += 1
+            self._totals[slot] += 1
+            if value_ms > self._maxes[slot]:
+                self._maxes[slot] = value_ms
+
+    def snapshot(self, window_seconds: int, now: Optional[float] = None) -> Dict[str, Optional[float]]:
+        """Count and p50/p95/p99/max over the trailing window"""
+        current = int((time.time() if now is None else now) // self.slot_seconds)
+        oldest = current - max(1, min(self.slots, window_seconds // self.slot_seconds)) + 1
+        merged = [0] * self.num_buckets
+        total = 0
+        max_value = 0.0
+        with self._lock:
+            for slot in range(self.slots):
+                if oldest <= self._epochs[slot] <= current and self._totals[slot]:
+                    counts = self._counts[slot]
+                    for i in range(self.num_buckets):
+                        merged[i] += counts[i]
+                    total += self._totals[slot]
+                    max_value = max(max_value, self._maxes[slot])
+
+        result: Dict[str, Optional[float]] = {"count": total, "p50": None, "p95": None, "p99": None,
+                                              "max": round(max_value, 3) if total else None}
+        if not total:
+            return result
+        targets = [("p50", 0.50), ("p95", 0.95), ("p99", 0.99)]
+        seen = 0
+        t = 0
+        for idx, count in enumerate(merged):
+            if not count:
+                continue
+            seen += count
+            while t < len(targets) and seen >= targets[t][1] * total:
+                result[targets[t][0]] = round(min(self._upper_bound(idx), max_value), 3)
+                t += 1
+            if t == len(targets):
+                break
+        return result
+
+
+class RequestMetrics:
+    """Thread-safe request counters plus rolling latency histograms"""
+
+    def __init__(self, windows: Dict[str, int] = None):
+        self.windows = windows or {"1m": 60, "5m": 300}
+        self._lock = threading.Lock()
+        self.total_requests = 0
+        self.decision_counts: Dict[str, int] = {}
+        self.errors: Dict[str, int] = {}
+        self.latency = RollingHistogram()
+        self.by_decision: Dict[str, RollingHistogram] = {}
+        self.by_agent: Dict[str, RollingHistogram] = {}
+
+    def _labelled(self, table: Dict[str, RollingHistogram], label: str) -> RollingHistogram:
+        histogram = table.get(label)
+        if histogram is None:
+            with self._lock:
+                histogram = table.setdefault(label, RollingHistogram())
+        return histogram
+
+    def record_decision(self, decision: str):
+        with self._lock:
+            self.total_requests += 1
+            self.decision_counts[decision] = self.decision_counts.get(decision, 0) + 1
+
+    def record_error(self, error_type: str):
+        with self._lock:
+            self.errors[error_type] = self.errors.get(error_type, 0) + 1
+
+    def observe_latency(self, latency_ms: float, decision: Optional[str] = None,
+                        agent_type: Optional[str] = None):
+        self.latency.observe(latency_ms)
+        if decision:
+            self._labelled(self.by_decision, decision).observe(latency_ms)
+        if agent_type:
+            self._labelled(self.by_agent, agent_type).observe(latency_ms)
+
+    def _windows(self, histogram: RollingHistogram) -> Dict[str, Dict[str, Optional[float]]]:
+        return {name: histogram.snapshot(seconds) for name, seconds in self.windows.items()}
+
+    def snapshot(self) -> Dict[str, object]:
+        with self._lock:
+            by_decision = dict(self.by_decision)
+            by_agent = dict(self.by_agent)
+            counts = {
+                "totalRequests": self.total_requests,
+                "decisionCounts": dict(self.decision_counts),
+                "errors": dict(self.errors),
+            }
+        return {
+            **counts,
+            "latencyMs": {
+                "all": self._windows(self.latency),
+                "byDecision": {k: self._windows(v) for k, v in by_decision.items()},
+                "byAgent": {k: self._windows(v) for k, v in by_agent.items()},
+            },
+        }
+
+
+class Counter:
+    """Monotonic counter child; either incremented or read from a running-total callback"""
+    __slots__ = ("value", "callback", "_lock")
+
+    def __init__(self, callback: Optional[Callable[[], float]] = None):
+        self.value = 0.0
+        self.callback = callback
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+    def get(self) -> float:
+        return self.callback() if self.callback else self.value
+
+
+class Gauge:
+    """Gauge child; either set directly or read from a callback at scrape time"""
+    __slots__ = ("value", "callback")
+
+    def __init__(self, callback: Optional[Callable[[], float]] = None):
+        self.value = 0.0
+        self.callback = callback
+
+    def set(self, value: float):
+        self.value = value
+
+    def get(self) -> float:
+        return self.callback() if self.callback else self.value
+
+
+class MetricFamily:
+    """A named metric with label names; children are created once per label set"""
+
+    def __init__(self, kind: str, name: str, help_text: str, labelnames: Sequence[str],
+                 factory: Callable[[], object]):
+        self.kind = kind
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._factory = factory
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values: str):
+        """Return the child for these label values; callers may cache it"""
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._factory())
+        return child
+
+    def children(self) -> List[Tuple[Tuple[str, ...], object]]:
+        with self._lock:
+            return list(self._children.items())
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class MetricsRegistry:
+    """Counters, gauges and histograms rendered in Prometheus text format"""
+
+    def __init__(self):
+        self._families: Dict[str, MetricFamily] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, family: MetricFamily) -> MetricFamily:
+        with self._lock:
+            return self._families.setdefault(family.name, family)
+
+    def counter(self, name: str, help_text: str, labelnames: Sequence[str] = (),
+                callback: Optional[Callable[[], float]] = None) -> MetricFamily:
+        family = self._register(MetricFamily("counter", name, help_text, labelnames, Counter))
+        if callback is not None:
+            family.labels().callback = callback
+        return family
+
+    def gauge(self, name: str, help_text: str, labelnames: Sequence[str] = (),
+              callback: Optional[Callable[[], float]] = None) -> MetricFamily:
+        family = self._register(MetricFamily("gauge", name, help_text, labelnames, Gauge))
+        if callback is not None:
+            family.labels().callback = callback
+        return family
+
+    def histogram(self, name: str, help_text: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS_SECONDS) -> MetricFamily:
+        return self._register(MetricFamily("histogram", name, help_text, labelnames,
+                                           lambda: Histogram(buckets)))
+
+    def render(self) -> str:
+        with self._lock:
+            families = list(self._families.values())
+        lines = []
+        for family in families:
+            lines.append(f"# HELP {family.name} {family.help_text}")
+            lines.append(f"# TYPE {family.name} {family.kind}")
+            for values, child in family.children():
+                if family.kind == "histogram":
+                    counts, total, total_sum, _ = child.state()
+                    cumulative = 0
+                    for bound, count in zip(list(child.buckets) + ["+Inf"], counts):
+                        cumulative += count
+                        le = _format_labels(family.labelnames, values, f'le="{bound}"')
+                        lines.append(f"{family.name}_bucket{le} {cumulative}")
+                    labels = _format_labels(family.labelnames, values)
+                    lines.append(f"{family.name}_sum{labels} {total_sum}")
+                    lines.append(f"{family.name}_count{labels} {total}")
+                else:
+                    lines.append(f"{family.name}{_format_labels(family.labelnames, values)} {child.get()}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+# Stages are mostly sub-millisecond, so start the buckets at 10 microseconds
+STAGE_BUCKETS_SECONDS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025,
+                         0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+STAGE_SECONDS = registry.histogram(
+    "paynow_stage_duration_seconds",
+    "Time spent in each stage of the decide pipeline",
+    ("stage",),
+    buckets=STAGE_BUCKETS_SECONDS
+)
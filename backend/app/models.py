@@ -1,14 +1,34 @@
 from pydantic import BaseModel, Field, validator
-from typing import List, Dict, Literal
+from typing import List, Dict, Literal, Optional, get_args
 import re
 from datetime import datetime
 
+from .accounts import MINOR_UNIT_DECIMALS
+
+Decision = Literal['allow', 'review', 'block']
+DecisionReason = Literal[
+    'transaction_allowed', 'insufficient_balance', 'amount_above_daily_threshold',
+    'recent_disputes', 'suspicious_activity', 'high_transaction_velocity',
+    'flagged_suspicious', 'transaction_blocked'
+]
+DECISIONS = get_args(Decision)
+DECISION_REASONS = get_args(DecisionReason)
+
 class PaymentRequest(BaseModel):
     customerId: str = Field(..., pattern="^[a-zA-Z0-9_-]+$", min_length=3)
     amount: float = Field(..., gt=0, le=1000000)
     currency: str = Field(..., min_length=3, max_length=3)
     payeeId: str = Field(..., pattern="^[a-zA-Z0-9_-]+$", min_length=3)
     idempotencyKey: str = Field(..., min_length=3)
+    # Overrides the X-Trace-Level header and TRACE_LEVEL from config
+    traceLevel: Optional[Literal['none', 'summary', 'full']] = None
+
+    @validator('amount')
+    def validate_amount_precision(cls, v):
+        # Balances are kept in minor units; a finer amount would round away
+        if round(v, MINOR_UNIT_DECIMALS) != v:
+            raise ValueError(f'Amount must have at most {MINOR_UNIT_DECIMALS} decimal places')
+        return v
 
     @validator('currency')
     def validate_currency(cls, v):
@@ -27,8 +47,13 @@ class AgentStep(BaseModel):
     detail: str = Field(..., min_length=1)
     timestamp: datetime = Field(default_factory=datetime.now)
 
+class AgentVerdict(BaseModel):
+    """The JSON verdict the AI agent returns in structured output mode (reasons are mapped by the caller)"""
+    decision: Decision
+    reasons: List[str] = []
+
 class PaymentResponse(BaseModel):
-    decision: Literal['allow', 'review', 'block']
+    decision: Decision
     reasons: List[str] = Field(..., min_items=1)
     agentTrace: List[AgentStep]
     requestId: str = Field(..., pattern=r'^req_[a-f0-9]+$')
@@ -1,23 +1,115 @@
+import os
+import threading
 import time
-from collections import defaultdict, deque
+from collections import OrderedDict
+import config as settings
+from .shared_state import SharedTable
 
 class TokenBucketRateLimiter:
-    def __init__(self, rate: int, per: float):
+    """
+    Per-key token bucket: up to `rate` tokens, refilled continuously at
+    rate/per tokens per second. Each key stores two numbers (tokens, last
+    refill time), and allow() is O(1).
+
+    A bucket that has been idle for `per` seconds is full again and therefore
+    indistinguishable from a new one, so it is evicted. Keys are kept in
+    last-used order and a few idle ones are dropped from the front whenever
+    a new key is inserted.
+    """
+
+    def __init__(self, rate: int, per: float, evict_batch: int = 8):
         self.rate = rate
         self.per = per
-        self.buckets = defaultdict(lambda: deque())
+        self.fill_rate = rate / per
+        self.evict_batch = evict_batch
+        self.buckets: "OrderedDict[str, list]" = OrderedDict()
+        self._lock = threading.Lock()
 
     def allow(self, key: str) -> bool:
-        now = time.time()
-        q = self.buckets[key]
+        now = time.monotonic()
+        with self._lock:
+            buckets = self.buckets
+            bucket = buckets.get(key)
+            if bucket is None:
+                # Only new keys grow the table, so only they pay for eviction
+                self._evict_idle(now)
+                buckets[key] = [self.rate - 1, now]
+                return True
+            buckets.move_to_end(key)
+            tokens = bucket[0] + (now - bucket[1]) * self.fill_rate
+            if tokens > self.rate:
+                tokens = self.rate
+            bucket[1] = now
+            if tokens >= 1:
+                bucket[0] = tokens - 1
+                return True
+            bucket[0] = tokens
+            return False
+
+    def _evict_idle(self, now: float):
+        buckets = self.buckets
+        per = self.per
+        for _ in range(self.evict_batch):
+            if not buckets:
+                return
+            key = next(iter(buckets))
+            if now - buckets[key][1] < per:
+                return
+            del buckets[key]
+
+    def __len__(self) -> int:
+        return len(self.buckets)
+
+
+class SharedTokenBucketRateLimiter:
+    """
+    The same token bucket kept in a SharedTable, so every worker process on
+    the box draws from one bucket per key. Slots idle for `per` seconds are
+    reclaimed in place by new keys.
+
+    Timestamps come from time.monotonic(), which is system-wide (not per
+    process) on Linux and macOS.
+    """
+
+    def __init__(self, rate: int, per: float, path: str, slots: int, stripes: int = 64):
+        self.rate = rate
+        self.per = per
+        self.fill_rate = rate / per
+        self.table = SharedTable(path, slots, stripes)
+
+    def allow(self, key: str) -> bool:
+        now = time.monotonic()
+        rate = self.rate
+        fill_rate = self.fill_rate
+        per = self.per
+
+        def take(tokens, last, created):
+            tokens = min(rate, tokens + (now - last) * fill_rate)
+            if tokens >= 1:
+                return (tokens - 1, now), True
+            return (tokens, now), False
+
+        return self.table.update(key, take, (rate, now),
+                                 reclaim=lambda tokens, last: now - last >= per)
+
+    def __len__(self) -> int:
+        return len(self.table)
 
-        while q and now - q[0] > self.per:
-            q.popleft()
 
-        if len(q) < self.rate:
-            q.append(now)
-            return True
-        return False
+def create_rate_limiter():
+    """Build the limiter selected by RATE_LIMIT_BACKEND"""
+    if settings.RATE_LIMIT_BACKEND == "shared_memory":
+        return SharedTokenBucketRateLimiter(
+            rate=settings.RATE_LIMIT_PER_SECOND,
+            per=settings.RATE_LIMIT_WINDOW,
+            path=os.path.join(settings.SHARED_STATE_DIR, "paynow-ratelimit.tbl"),
+            slots=settings.SHARED_RATE_LIMIT_SLOTS,
+            stripes=settings.SHARED_STATE_STRIPES
+        )
+    return TokenBucketRateLimiter(
+        rate=settings.RATE_LIMIT_PER_SECOND,
+        per=settings.RATE_LIMIT_WINDOW
+    )
 
 
-rate_limiter = TokenBucketRateLimiter(rate=5, per=1.0)
+rate_limiter = create_rate_limiter()
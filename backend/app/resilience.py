@@ -0,0 +1,174 @@
+import asyncio
+import random
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+
+class DeadlineExceeded(Exception):
+    """Raised when the time budget runs out before a call succeeds"""
+    pass
+
+
+class CircuitBreaker:
+    """
+    Stops calls to a dependency after failure_threshold consecutive failures.
+    While open, allow() is False; after reset_timeout one probe call is let
+    through (half-open), and its outcome closes or re-opens the breaker. A
+    probe that never reports back is replaced after another reset_timeout.
+    """
+    CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._probe_started = 0.0
+        self._lock = threading.Lock()
+        self.stats_counters = {"opened": 0, "shortCircuited": 0}
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+    def allow(self) -> bool:
+        """Whether a new call may go through; counts it as short-circuited if not"""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            now = time.monotonic()
+            if self._state == self.OPEN:
+                if now - self._opened_at < self.reset_timeout:
+                    self.stats_counters["shortCircuited"] += 1
+                    return False
+                self._state = self.HALF_OPEN
+                self._probing = False
+            # Half-open: one probe at a time
+            if self._probing and now - self._probe_started < self.reset_timeout:
+                self.stats_counters["shortCircuited"] += 1
+                return False
+            self._probing = True
+            self._probe_started = now
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    self.stats_counters["opened"] += 1
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "state": self._state,
+                "consecutiveFailures": self._failures,
+                **self.stats_counters,
+            }
+
+
+class RetryPolicy:
+    """
+    Exponential backoff with full jitter under a deadline. Each attempt is
+    cut off at the deadline, and a retry only happens if its sleep ends
+    before the deadline, so a call never outlives its budget.
+    """
+
+    def __init__(self, max_attempts: int = 3, base_delay: float = 0.25, max_delay: float = 2.0,
+                 rng: Optional[random.Random] = None):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._rng = rng or random.Random()
+        self._lock = threading.Lock()
+        self.stats_counters = {"calls": 0, "attempts": 0, "retries": 0, "failures": 0,
+                               "timeouts": 0, "budgetExhausted": 0}
+
+    def _count(self, name: str):
+        with self._lock:
+            self.stats_counters[name] += 1
+
+    def delay(self, retry: int) -> float:
+        """Sleep before retry number `retry` (0-based): uniform in [0, base * 2**retry], capped"""
+        return self._rng.uniform(0, min(self.max_delay, self.base_delay * 2 ** retry))
+
+    async def call(self, func: Callable[[], Awaitable[Any]], deadline: float,
+                   breaker: Optional[CircuitBreaker] = None) -> Any:
+        """
+        Await func() until it succeeds, attempts run out or the deadline
+        (time.monotonic()) passes. Outcomes are reported to the breaker, and
+        retrying stops once it is no longer closed.
+        """
+        self._count("calls")
+        last_error: Optional[Exception] = None
+        for attempt in range(self.max_attempts):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            self._count("attempts")
+            try:
+                result = await asyncio.wait_for(func(), remaining)
+            except TimeoutError:
+                self._count("timeouts")
+                if breaker is not None:
+                    breaker.record_failure()
+                raise DeadlineExceeded(f"attempt {attempt + 1} ran past the deadline")
+            except Exception as e:
+                self._count("failures")
+                if breaker is not None:
+                    breaker.record_failure()
+                last_error = e
+            else:
+                if breaker is not None:
+                    breaker.record_success()
+                return result
+
+            if attempt == self.max_attempts - 1:
+                break
+            if breaker is not None and breaker.state != CircuitBreaker.CLOSED:
+                break
+            pause = self.delay(attempt)
+            if time.monotonic() + pause >= deadline:
+                self._count("budgetExhausted")
+                break
+            self._count("retries")
+            await asyncio.sleep(pause)
+
+        raise last_error or DeadlineExceeded("no time left for an attempt")
+
+    def call_sync(self, func: Callable[[], Any], deadline: Optional[float] = None) -> Any:
+        """Blocking variant for code that is not on the event loop (e.g. building the agent pool)"""
+        self._count("calls")
+        last_error: Optional[Exception] = None
+        for attempt in range(self.max_attempts):
+            self._count("attempts")
+            try:
+                return func()
+            except Exception as e:
+                self._count("failures")
+                last_error = e
+            if attempt == self.max_attempts - 1:
+                break
+            pause = self.delay(attempt)
+            if deadline is not None and time.monotonic() + pause >= deadline:
+                self._count("budgetExhausted")
+                break
+            self._count("retries")
+            time.sleep(pause)
+        raise last_error
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.stats_counters)
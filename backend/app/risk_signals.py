@@ -0,0 +1,267 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import config as settings
+
+
+class StaticRiskSignals:
+    """Signals that do not change from one payment to the next"""
+    __slots__ = ("recent_disputes", "device_change", "unusual_country", "location_mismatch",
+                 "account_age_days", "suspicious_activity", "unusual_time", "unusual_amount",
+                 "high_risk_merchant")
+
+    def __init__(self, recent_disputes: int = 0, device_change: bool = False,
+                 unusual_country: bool = False, location_mismatch: bool = False,
+                 account_age_days: int = 365, suspicious_activity: bool = False,
+                 unusual_time: bool = False, unusual_amount: bool = False,
+                 high_risk_merchant: bool = False):
+        self.recent_disputes = recent_disputes
+        self.device_change = device_change
+        self.unusual_country = unusual_country
+        self.location_mismatch = location_mismatch
+        self.account_age_days = account_age_days
+        self.suspicious_activity = suspicious_activity
+        self.unusual_time = unusual_time
+        self.unusual_amount = unusual_amount
+        self.high_risk_merchant = high_risk_merchant
+
+
+#TODO: we are simulating the static signals, in a real system these would come from a risk engine
+_DEFAULT_SIGNALS = StaticRiskSignals()
+_HIGH_RISK_SIGNALS = StaticRiskSignals(recent_disputes=2, device_change=True, suspicious_activity=True)
+_NEW_CUSTOMER_SIGNALS = StaticRiskSignals(account_age_days=5, unusual_amount=True)
+_INTERNATIONAL_SIGNALS = StaticRiskSignals(unusual_country=True, location_mismatch=True)
+
+
+def static_signals(customer_id: str) -> StaticRiskSignals:
+    """Shared, precomputed signals for the customer's (simulated) risk profile"""
+    if customer_id == "c_123":
+        return _HIGH_RISK_SIGNALS
+    if customer_id.startswith("new_"):
+        return _NEW_CUSTOMER_SIGNALS
+    if customer_id.startswith("intl_"):
+        return _INTERNATIONAL_SIGNALS
+    return _DEFAULT_SIGNALS
+
+
+class RiskProfile:
+    """
+    A customer's risk signals. The static signals are copied in; the rolling
+    counters are read live from the customer's velocity window, so a cached
+    profile stays current as decisions are recorded.
+    """
+    __slots__ = StaticRiskSignals.__slots__ + ("window", "expires_at")
+
+    def __init__(self, signals: StaticRiskSignals, window: Optional["VelocityWindow"],
+                 expires_at: float):
+        self.recent_disputes = signals.recent_disputes
+        self.device_change = signals.device_change
+        self.unusual_country = signals.unusual_country
+        self.location_mismatch = signals.location_mismatch
+        self.account_age_days = signals.account_age_days
+        self.suspicious_activity = signals.suspicious_activity
+        self.unusual_time = signals.unusual_time
+        self.unusual_amount = signals.unusual_amount
+        self.high_risk_merchant = signals.high_risk_merchant
+        self.window = window
+        self.expires_at = expires_at
+
+    @property
+    def last_24h_count(self) -> int:
+        return self.window.count if self.window is not None else 0
+
+    @property
+    def last_24h_amount(self) -> float:
+        return self.window.amount if self.window is not None else 0.0
+
+    @property
+    def previous_failures(self) -> int:
+        return self.window.failed if self.window is not None else 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        """The nested layout get_risk_signals has always returned"""
+        return {
+            "recent_disputes": self.recent_disputes,
+            "device_change": self.device_change,
+            "velocity_check": {
+                "last_24h_count": self.last_24h_count,
+                "last_24h_amount": self.last_24h_amount,
+            },
+            "location_risk": {
+                "unusual_country": self.unusual_country,
+                "location_mismatch": self.location_mismatch,
+            },
+            "account_risk": {
+                "account_age_days": self.account_age_days,
+                "previous_failures": self.previous_failures,
+                "suspicious_activity": self.suspicious_activity,
+            },
+            "transaction_pattern": {
+                "unusual_time": self.unusual_time,
+                "unusual_amount": self.unusual_amount,
+                "high_risk_merchant": self.high_risk_merchant,
+            },
+        }
+
+
+class VelocityWindow:
+    """
+    Rolling totals over a ring of time buckets. Adding to the current bucket
+    and expiring old ones keep the totals up to date, so reading them never
+    rescans the window.
+    """
+    __slots__ = ("counts", "amounts", "failures", "head", "count", "amount", "failed")
+
+    def __init__(self, buckets: int, head: int):
+        self.counts = [0] * buckets
+        self.amounts = [0.0] * buckets
+        self.failures = [0] * buckets
+        self.head = head  # absolute number of the newest bucket
+        self.count = 0
+        self.amount = 0.0
+        self.failed = 0
+
+    def advance(self, bucket: int):
+        """Expire every bucket that falls out of the window by time `bucket`"""
+        size = len(self.counts)
+        if bucket <= self.head:
+            return
+        if bucket - self.head >= size:
+            for i in range(size):
+                self.counts[i] = self.failures[i] = 0
+                self.amounts[i] = 0.0
+            self.count = self.failed = 0
+            self.amount = 0.0
+        else:
+            for b in range(self.head + 1, bucket + 1):
+                i = b % size
+                self.count -= self.counts[i]
+                self.amount -= self.amounts[i]
+                self.failed -= self.failures[i]
+                self.counts[i] = self.failures[i] = 0
+                self.amounts[i] = 0.0
+            if not self.count:
+                self.amount = 0.0  # drop float drift from the subtractions
+        self.head = bucket
+
+    def add(self, amount: float, approved: bool):
+        """Count a payment in the newest bucket (call advance first)"""
+        i = self.head % len(self.counts)
+        if approved:
+            self.counts[i] += 1
+            self.amounts[i] += amount
+            self.count += 1
+            self.amount += amount
+        else:
+            self.failures[i] += 1
+            self.failed += 1
+
+
+class _CustomerRisk:
+    __slots__ = ("signals", "window", "profile")
+
+    def __init__(self, signals: StaticRiskSignals, window: Optional[VelocityWindow]):
+        self.signals = signals
+        self.window = window
+        self.profile: Optional[RiskProfile] = None
+
+
+class RiskSignalService:
+    """
+    Per-customer risk profiles: precomputed static signals plus rolling
+    velocity and failure counters updated on every decision.
+
+    Profiles are cached for profile_ttl seconds. Recording a decision
+    updates the window a cached profile reads from, and drops the profile
+    when it has no window yet; expired buckets are cleared on the next write
+    or rebuild. A cache hit is one dict lookup without the lock (profiles are
+    replaced, never rebuilt in place), so the hit counter is approximate.
+    Customers idle for the whole window are evicted a few at a time as new
+    ones arrive, and the oldest go first past max_customers.
+    """
+
+    def __init__(self, window_seconds: float, buckets: int, profile_ttl: float,
+                 max_customers: int, evict_batch: int = 8):
+        self.buckets = buckets
+        self.bucket_seconds = window_seconds / buckets
+        self.profile_ttl = profile_ttl
+        self.max_customers = max_customers
+        self.evict_batch = evict_batch
+        self._customers: "OrderedDict[str, _CustomerRisk]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, customer_id: str) -> RiskProfile:
+        now = time.monotonic()
+        state = self._customers.get(customer_id)
+        if state is not None:
+            profile = state.profile
+            if profile is not None and profile.expires_at > now:
+                self.hits += 1
+                return profile
+        with self._lock:
+            self.misses += 1
+            state = self._state(customer_id, int(now // self.bucket_seconds))
+            window = state.window
+            if window is not None:
+                window.advance(int(now // self.bucket_seconds))
+            state.profile = RiskProfile(state.signals, window, now + self.profile_ttl)
+            return state.profile
+
+    def record(self, customer_id: str, amount: float, approved: bool):
+        """Count a decided payment: approved ones add to velocity, others are failures"""
+        bucket = int(time.monotonic() // self.bucket_seconds)
+        with self._lock:
+            state = self._state(customer_id, bucket)
+            self._customers.move_to_end(customer_id)
+            if state.window is None:
+                state.window = VelocityWindow(self.buckets, bucket)
+                state.profile = None  # it has no window to read counters from
+            else:
+                state.window.advance(bucket)
+            state.window.add(amount, approved)
+
+    def invalidate(self, customer_id: str):
+        """Drop the cached profile, e.g. after the customer's static signals change"""
+        with self._lock:
+            state = self._customers.get(customer_id)
+            if state is not None:
+                state.profile = None
+
+    def _state(self, customer_id: str, bucket: int) -> _CustomerRisk:
+        # Caller holds the lock
+        state = self._customers.get(customer_id)
+        if state is None:
+            self._evict(bucket)
+            state = self._customers[customer_id] = _CustomerRisk(static_signals(customer_id), None)
+        return state
+
+    def _evict(self, bucket: int):
+        # Least recently updated customers come first
+        for _ in range(min(self.evict_batch, len(self._customers))):
+            customer_id, state = next(iter(self._customers.items()))
+            if len(self._customers) < self.max_customers:
+                if state.window is not None:
+                    state.window.advance(bucket)
+                    if state.window.count or state.window.failed:
+                        break
+            del self._customers[customer_id]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "customers": len(self._customers),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+risk_signals = RiskSignalService(
+    window_seconds=settings.RISK_VELOCITY_WINDOW_SECONDS,
+    buckets=settings.RISK_VELOCITY_BUCKETS,
+    profile_ttl=settings.RISK_PROFILE_TTL_SECONDS,
+    max_customers=settings.RISK_MAX_CUSTOMERS
+)
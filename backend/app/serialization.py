@@ -0,0 +1,63 @@
+import re
+from datetime import datetime
+from typing import Dict, List
+
+import orjson
+
+from .models import DECISIONS, AgentStep, PaymentResponse
+
+_REQUEST_ID = re.compile(r"^req_[a-f0-9]+$")
+
+
+def _matches_schema(decision: str, reasons: List[str], trace: List[Dict[str, str]],
+                    request_id: str) -> bool:
+    """The PaymentResponse constraints, checked without building the model"""
+    return (decision in DECISIONS and bool(reasons) and _REQUEST_ID.match(request_id) is not None
+            and all(step["step"] and step["detail"] for step in trace))
+
+
+class EncodedPaymentResponse:
+    """A PaymentResponse already serialized to its wire bytes"""
+    __slots__ = ("decision", "body")
+
+    def __init__(self, decision: str, body: bytes):
+        self.decision = decision
+        self.body = body
+
+
+def encode_payment_response(decision: str, reasons: List[str], trace: List[Dict[str, str]],
+                            request_id: str) -> bytes:
+    """
+    Serialize a response the service built itself, byte-for-byte as
+    PaymentResponse.model_dump_json() would. Trace steps stay plain dicts,
+    and one timestamp is taken for the whole response instead of one
+    datetime.now() per AgentStep. Inputs the schema rejects (an empty
+    reason list or step detail, say) go through the model, which raises
+    the same ValidationError it always did.
+    """
+    timestamp = datetime.now()
+    if not _matches_schema(decision, reasons, trace, request_id):
+        return _encode_with_model(decision, reasons, trace, request_id, timestamp)
+    try:
+        return orjson.dumps({
+            "decision": decision,
+            "reasons": reasons,
+            "agentTrace": [
+                {"step": step["step"], "detail": step["detail"], "timestamp": timestamp}
+                for step in trace
+            ],
+            "requestId": request_id,
+        })
+    except TypeError:
+        # orjson rejects some strings pydantic accepts (e.g. lone surrogates)
+        return _encode_with_model(decision, reasons, trace, request_id, timestamp)
+
+
+def _encode_with_model(decision: str, reasons: List[str], trace: List[Dict[str, str]],
+                       request_id: str, timestamp: datetime) -> bytes:
+    return PaymentResponse(
+        decision=decision,
+        reasons=reasons,
+        agentTrace=[AgentStep(**step, timestamp=timestamp) for step in trace],
+        requestId=request_id
+    ).model_dump_json().encode()
@@ -0,0 +1,191 @@
+import fcntl
+import hashlib
+import mmap
+import os
+import struct
+import threading
+from typing import Callable, Optional, Tuple
+
+# Slot layout: key hash (0 = empty), key bytes (NUL padded), two float values.
+# 64 bytes, so a slot never straddles a cache line.
+_SLOT = struct.Struct("<Q40sdd")
+SLOT_BYTES = _SLOT.size
+MAX_KEY_BYTES = 40
+
+Values = Tuple[float, float]
+
+
+class SharedTableFullError(Exception):
+    """Raised when a key's stripe has no free slot left"""
+    pass
+
+
+def _encode_key(key: str) -> Tuple[bytes, int]:
+    kb = key.encode()
+    digest = hashlib.blake2b(kb, digest_size=32).digest()
+    if len(kb) > MAX_KEY_BYTES:
+        # Long keys are stored by digest; the prefix keeps them apart from short ones
+        kb = b"#" + digest
+    # hash() is salted per process, so derive a stable one from the digest
+    return kb, int.from_bytes(digest[:8], "little") or 1
+
+
+class SharedTable:
+    """
+    Fixed-size hash table in a memory-mapped file. Every process that opens
+    the same path sees the same slots, which lets uvicorn workers on one box
+    share state without an external service.
+
+    Slots are split into stripes. A key hashes to one stripe and probes
+    linearly only inside it, so a single stripe lock covers every slot the
+    key can touch. The lock is a threading lock (fcntl locks are per process
+    and do not exclude threads) followed by an fcntl byte-range lock on the
+    file (across processes).
+
+    Each slot holds two floats whose meaning is up to the caller. Slots are
+    never emptied, which keeps probe chains intact; callers that want
+    eviction pass a `reclaim` predicate and stale slots are reused in place.
+    """
+
+    def __init__(self, path: str, slots: int, stripes: int = 64):
+        self.path = path
+        self.stripes = stripes
+        self.slots_per_stripe = max(1, slots // stripes)
+        self.size = self.slots_per_stripe * stripes * SLOT_BYTES
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        current = os.fstat(self._fd).st_size
+        if current == 0:
+            # Concurrent creators truncate to the same size, which is harmless
+            os.ftruncate(self._fd, self.size)
+        elif current != self.size:
+            os.close(self._fd)
+            raise ValueError(
+                f"{path} holds a table of {current} bytes, expected {self.size}; "
+                "remove it or match the slot and stripe settings"
+            )
+        self._mm = mmap.mmap(self._fd, self.size)
+        self._locks = [threading.Lock() for _ in range(stripes)]
+
+    def _lock(self, stripe: int):
+        self._locks[stripe].acquire()
+        try:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, 1, stripe)
+        except BaseException:
+            self._locks[stripe].release()
+            raise
+
+    def _unlock(self, stripe: int):
+        fcntl.lockf(self._fd, fcntl.LOCK_UN, 1, stripe)
+        self._locks[stripe].release()
+
+    def _probe(self, kb: bytes, h: int, create: bool,
+               reclaim: Optional[Callable[[float, float], bool]]) -> Tuple[int, bool]:
+        """
+        Return (offset, found) for the key. When the key is missing and create
+        is set, the offset is the first empty or reclaimable slot; otherwise -1.
+        Caller must hold the stripe lock.
+        """
+        mm = self._mm
+        sps = self.slots_per_stripe
+        base = (h % self.stripes) * sps
+        start = (h // self.stripes) % sps
+        free = -1
+        for i in range(sps):
+            offset = (base + (start + i) % sps) * SLOT_BYTES
+            slot_hash, slot_key, v0, v1 = _SLOT.unpack_from(mm, offset)
+            if slot_hash == 0:
+                if free < 0:
+                    free = offset
+                break
+            if slot_hash == h and slot_key.rstrip(b"\0") == kb:
+                return offset, True
+            if free < 0 and reclaim is not None and reclaim(v0, v1):
+                free = offset
+        if not create:
+            return -1, False
+        if free < 0:
+            raise SharedTableFullError(f"No free slot in {self.path} stripe {h % self.stripes}")
+        return free, False
+
+    def get(self, key: str) -> Optional[Values]:
+        kb, h = _encode_key(key)
+        stripe = h % self.stripes
+        self._lock(stripe)
+        try:
+            offset, found = self._probe(kb, h, False, None)
+            if not found:
+                return None
+            _, _, v0, v1 = _SLOT.unpack_from(self._mm, offset)
+            return v0, v1
+        finally:
+            self._unlock(stripe)
+
+    def update(self, key: str, fn: Callable[[float, float, bool], Tuple[Values, object]],
+               default: Values, reclaim: Optional[Callable[[float, float], bool]] = None):
+        """
+        Atomically read-modify-write the key's values. fn receives the current
+        values (default for a new key) and whether the key was created, and
+        returns (new_values, result); update returns result.
+        """
+        kb, h = _encode_key(key)
+        stripe = h % self.stripes
+        self._lock(stripe)
+        try:
+            offset, found = self._probe(kb, h, True, reclaim)
+            if found:
+                _, _, v0, v1 = _SLOT.unpack_from(self._mm, offset)
+            else:
+                v0, v1 = default
+            (v0, v1), result = fn(v0, v1, not found)
+            _SLOT.pack_into(self._mm, offset, h, kb, v0, v1)
+            return result
+        finally:
+            self._unlock(stripe)
+
+    def __len__(self) -> int:
+        """Occupied slots (a full scan, for stats and tests)"""
+        mm = self._mm
+        return sum(
+            1 for offset in range(0, self.size, SLOT_BYTES)
+            if _SLOT.unpack_from(mm, offset)[0]
+        )
+
+    def close(self):
+        self._mm.close()
+        os.close(self._fd)
+
+
+class SharedBalances:
+    """Customer balances in a SharedTable; debits are atomic across processes"""
+
+    def __init__(self, table: SharedTable):
+        self.table = table
+
+    def get_or_create(self, customer_id: str, default: float) -> Tuple[float, bool]:
+        return self.table.update(
+            customer_id, lambda v0, v1, created: ((v0, v1), (v0, created)), (default, 0.0)
+        )
+
+    def setdefault(self, customer_id: str, default: float) -> float:
+        return self.get_or_create(customer_id, default)[0]
+
+    def debit(self, customer_id: str, amount: float, default: float) -> Tuple[bool, float, bool]:
+        """Subtract amount if the balance covers it. Returns (ok, balance, created)."""
+        def apply(balance, v1, created):
+            if balance >= amount:
+                balance -= amount
+                return (balance, v1), (True, balance, created)
+            return (balance, v1), (False, balance, created)
+        return self.table.update(customer_id, apply, (default, 0.0))
+
+    def __contains__(self, customer_id: str) -> bool:
+        return self.table.get(customer_id) is not None
+
+    def __getitem__(self, customer_id: str) -> float:
+        values = self.table.get(customer_id)
+        if values is None:
+            raise KeyError(customer_id)
+        return values[0]
+
+    def __setitem__(self, customer_id: str, balance: float):
+        self.table.update(customer_id, lambda v0, v1, created: ((balance, v1), None), (balance, 0.0))
@@ -0,0 +1,80 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+
+class IdempotencyConflictError(Exception):
+    """Raised when an idempotency key is reused with a different request body"""
+    pass
+
+
+class InFlightTable:
+    """
+    Single-flight table for idempotent requests. The first request for a key
+    computes the result; concurrent duplicates await the same future instead
+    of running the agent (and reserving) again.
+
+    Entries hold a thread-safe Future so duplicates arriving on a different
+    event loop or thread can still wait on it.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[str, Tuple[Hashable, Future]] = {}
+        self._lock = threading.Lock()
+        self.coalesced = 0
+        self.conflicts = 0
+
+    def claim(self, key: str, fingerprint: Hashable) -> Tuple[bool, Future]:
+        """
+        Register interest in a key. Returns (True, future) for the leader, who
+        must call finish(), or (False, leader's future) for a duplicate.
+        """
+        with self._lock:
+            entry = self._inflight.get(key)
+            if entry is None:
+                future: Future = Future()
+                self._inflight[key] = (fingerprint, future)
+                return True, future
+            if entry[0] != fingerprint:
+                self.conflicts += 1
+                raise IdempotencyConflictError(
+                    f"Idempotency key {key} is already in use with a different request"
+                )
+            self.coalesced += 1
+            return False, entry[1]
+
+    def finish(self, key: str, future: Future, result: Any = None,
+               error: Optional[BaseException] = None):
+        """Publish the leader's outcome and release the key"""
+        if error is not None:
+            future.set_exception(error)
+            future.exception()  # mark retrieved when nobody else is waiting
+        else:
+            future.set_result(result)
+        # The caller saves the idempotency record before finishing, so the
+        # result is already cached by the time the key leaves this table
+        with self._lock:
+            self._inflight.pop(key, None)
+
+    async def run(self, key: str, fingerprint: Hashable,
+                  compute: Callable[[], Awaitable[Any]]) -> Any:
+        leader, future = self.claim(key, fingerprint)
+        if not leader:
+            return await asyncio.shield(asyncio.wrap_future(future))
+
+        try:
+            result = await compute()
+        except BaseException as e:
+            self.finish(key, future, error=e)
+            raise
+        self.finish(key, future, result)
+        return result
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "inFlight": len(self._inflight),
+                "coalesced": self.coalesced,
+                "conflicts": self.conflicts,
+            }
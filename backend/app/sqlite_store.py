@@ -0,0 +1,219 @@
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+import config as settings
+from .store import LockTimeoutError, StorageBackend
+from .utils import structured_log, timed_stage
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS accounts (
+    customer_id TEXT PRIMARY KEY,
+    balance REAL NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS idempotency (
+    key TEXT PRIMARY KEY,
+    payload BLOB NOT NULL,
+    expires_at REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idempotency_expires_at ON idempotency (expires_at);
+CREATE TABLE IF NOT EXISTS cases (
+    case_id TEXT PRIMARY KEY,
+    customer_id TEXT NOT NULL,
+    reason TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+"""
+
+# Statements are module constants so each pooled connection's statement
+# cache compiles them once and reuses the prepared statement afterwards
+_SELECT_BALANCE = "SELECT balance FROM accounts WHERE customer_id = ?"
+_CREATE_ACCOUNT = "INSERT OR IGNORE INTO accounts (customer_id, balance) VALUES (?, ?)"
+_DEBIT = ("UPDATE accounts SET balance = balance - ? "
+          "WHERE customer_id = ? AND balance >= ? RETURNING balance")
+_INSERT_IDEMPOTENCY = "INSERT OR IGNORE INTO idempotency (key, payload, expires_at) VALUES (?, ?, ?)"
+_UPDATE_IDEMPOTENCY = "UPDATE idempotency SET payload = ?, expires_at = ? WHERE key = ?"
+_GET_IDEMPOTENCY = "SELECT payload FROM idempotency WHERE key = ? AND expires_at > ?"
+_PURGE_IDEMPOTENCY = "DELETE FROM idempotency WHERE expires_at <= ?"
+_COUNT_IDEMPOTENCY = "SELECT COUNT(*) FROM idempotency"
+_CREATE_CASE = "INSERT INTO cases (case_id, customer_id, reason, created_at) VALUES (?, ?, ?, ?)"
+
+# Expired idempotency rows are purged once every this many saves
+PURGE_EVERY = 1000
+
+SYNCHRONOUS_MODES = ("OFF", "NORMAL", "FULL", "EXTRA")
+
+
+class SQLiteConnectionPool:
+    """
+    Fixed set of connections opened once and leased per operation. SQLite in
+    WAL mode lets readers proceed while one connection writes; writers
+    serialize on the database lock and wait up to busy_timeout for it. A
+    lease waits up to acquire_timeout for a free connection.
+    """
+
+    def __init__(self, path: str, size: int, busy_timeout_ms: int, synchronous: str,
+                 acquire_timeout: float = 5.0):
+        if synchronous.upper() not in SYNCHRONOUS_MODES:
+            raise ValueError(f"Unknown SQLite synchronous mode {synchronous!r}")
+        self.size = size
+        self.acquire_timeout = acquire_timeout
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._all = []
+        for _ in range(size):
+            conn = sqlite3.connect(path, timeout=busy_timeout_ms / 1000, isolation_level=None,
+                                   check_same_thread=False, cached_statements=64)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(f"PRAGMA synchronous={synchronous}")
+            self._all.append(conn)
+            self._idle.put(conn)
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        try:
+            conn = self._idle.get(timeout=self.acquire_timeout)
+        except queue.Empty:
+            raise LockTimeoutError(
+                f"No SQLite connection free after {self.acquire_timeout}s (pool size {self.size})"
+            ) from None
+        try:
+            yield conn
+        finally:
+            self._idle.put(conn)
+
+    def close(self):
+        for conn in self._all:
+            conn.close()
+
+
+class SQLiteStore(StorageBackend):
+    """
+    Persistent store on SQLite. Reserves are a single conditional UPDATE, so
+    the database enforces "no overdraft" without per-customer locks in the
+    application. Idempotency records and cases live in their own tables.
+    """
+    ENGINE = "sqlite"
+
+    def __init__(self, path: Optional[str] = None, pool_size: Optional[int] = None):
+        path = path or settings.SQLITE_PATH
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.pool = SQLiteConnectionPool(
+            path,
+            size=pool_size or settings.SQLITE_POOL_SIZE,
+            busy_timeout_ms=settings.SQLITE_BUSY_TIMEOUT_MS,
+            synchronous=settings.SQLITE_SYNCHRONOUS,
+            acquire_timeout=settings.SQLITE_POOL_ACQUIRE_TIMEOUT
+        )
+        self.default_ttl = settings.IDEMPOTENCY_TTL_SECONDS
+        self._counter_lock = threading.Lock()
+        self._saves = 0
+        self.busy_timeouts = 0
+        self.hits = 0
+        self.misses = 0
+        with self.pool.connection() as conn:
+            conn.executescript(_SCHEMA)
+            conn.executemany(_CREATE_ACCOUNT, self.SEED_BALANCES.items())
+            # Counted once here, then kept up to date on save and purge, so
+            # stats() (scraped with /metrics) never scans the table
+            self.idempotency_entries = conn.execute(_COUNT_IDEMPOTENCY).fetchone()[0]
+
+    @contextmanager
+    def _connection(self) -> Iterator[sqlite3.Connection]:
+        """Lease a connection; a write lock that stays busy past the timeout becomes LockTimeoutError"""
+        with self.pool.connection() as conn:
+            try:
+                yield conn
+            except sqlite3.OperationalError as e:
+                if "locked" not in str(e) and "busy" not in str(e):
+                    raise
+                with self._counter_lock:
+                    self.busy_timeouts += 1
+                raise LockTimeoutError(f"SQLite database is busy: {e}") from e
+
+    def _create_account(self, conn: sqlite3.Connection, customer_id: str):
+        if conn.execute(_CREATE_ACCOUNT, (customer_id, self.DEFAULT_INITIAL_BALANCE)).rowcount:
+            structured_log("info", "new_account_created", {
+                "customer_id": customer_id,
+                "initial_balance": self.DEFAULT_INITIAL_BALANCE
+            })
+
+    def get_balance(self, customer_id: str) -> float:
+        with self._connection() as conn:
+            row = conn.execute(_SELECT_BALANCE, (customer_id,)).fetchone()
+            if row is None:
+                self._create_account(conn, customer_id)
+                row = conn.execute(_SELECT_BALANCE, (customer_id,)).fetchone()
+            return row[0]
+
+    @timed_stage("reserve")
+    def reserve(self, customer_id: str, amount: float) -> bool:
+        with self._connection() as conn:
+            # fetchall() steps the statement to completion, which commits the
+            # autocommit transaction; a half-read RETURNING keeps the write lock
+            rows = conn.execute(_DEBIT, (amount, customer_id, amount)).fetchall()
+            if not rows and conn.execute(_SELECT_BALANCE, (customer_id,)).fetchone() is None:
+                # First reservation for a new customer
+                self._create_account(conn, customer_id)
+                rows = conn.execute(_DEBIT, (amount, customer_id, amount)).fetchall()
+        if not rows:
+            return False
+        structured_log("info", "balance_reserved", {
+            "customer_id": customer_id,
+            "amount": amount,
+            "new_balance": rows[0][0]
+        })
+        return True
+
+    def save_idempotency(self, key: str, response: Any, ttl_seconds: Optional[float] = None):
+        payload = response if isinstance(response, bytes) else response.model_dump_json().encode()
+        now = time.time()
+        ttl = self.default_ttl if ttl_seconds is None else ttl_seconds
+        with self._counter_lock:
+            self._saves += 1
+            purge = self._saves % PURGE_EVERY == 0
+        with self._connection() as conn:
+            added = conn.execute(_INSERT_IDEMPOTENCY, (key, payload, now + ttl)).rowcount
+            if not added:
+                conn.execute(_UPDATE_IDEMPOTENCY, (payload, now + ttl, key))
+            purged = conn.execute(_PURGE_IDEMPOTENCY, (now,)).rowcount if purge else 0
+        with self._counter_lock:
+            self.idempotency_entries += added - purged
+        structured_log("info", "idempotency_saved", {
+            "key": key,
+            "bytes": len(payload)
+        })
+
+    def get_idempotency(self, key: str) -> Optional[bytes]:
+        with self._connection() as conn:
+            row = conn.execute(_GET_IDEMPOTENCY, (key, time.time())).fetchone()
+        with self._counter_lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        structured_log("info", "idempotency_hit", {"key": key})
+        return row[0]
+
+    def create_case(self, customer_id: str, reason: str) -> str:
+        case_id = self._new_case_id()
+        with self._connection() as conn:
+            conn.execute(_CREATE_CASE, (case_id, customer_id, reason, time.time()))
+        structured_log("info", "case_created", {"case_id": case_id, "customer_id": customer_id})
+        return case_id
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "engine": self.ENGINE,
+            "lockWait": {"timeouts": self.busy_timeouts},
+            "idempotencyCache": {"entries": self.idempotency_entries, "hits": self.hits,
+                                 "misses": self.misses},
+        }
+
+    def close(self):
+        self.pool.close()
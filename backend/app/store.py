@@ -1,9 +1,18 @@
+import asyncio
+import os
 import threading
-from typing import Dict, Any, Optional
-from datetime import datetime, timedelta
 import time
+import uuid
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Callable, Dict, Any, Iterator, MutableMapping, Optional
 import config as settings
-from .utils import structured_log
+from .utils import structured_log, stage_timer, timed_stage
+from .accounts import Account, AccountBalances, AccountTable, from_minor, to_minor
+from .locks import CustomerLockManager
+from .idempotency_cache import IdempotencyCache
+from .shared_state import SharedBalances, SharedTable
+from .wal import WriteAheadLog
 
 class LockTimeoutError(Exception):
     """Raised when a lock cannot be acquired within the timeout period"""
@@ -13,86 +22,124 @@ class TransactionError(Exception):
     """Raised when a transaction fails"""
     pass
 
-class InMemoryStore:
+class StorageBackend(ABC):
+    """
+    Storage used by the agent and the server: balances, reservations,
+    idempotency records and review cases. Engines are selected by
+    STORAGE_ENGINE (see create_store).
+    """
     DEFAULT_INITIAL_BALANCE = 100.00  # Default initial balance for new customers
+    # Test accounts with specific balances
+    SEED_BALANCES = {
+        "c_123": 300.00,  # Keep this test account with higher balance for testing
+        "c_456": 150.00,  # Additional test account
+    }
+
+    @abstractmethod
+    def get_balance(self, customer_id: str) -> float:
+        """Return the balance, creating the account with the default balance if needed"""
+
+    @abstractmethod
+    def reserve(self, customer_id: str, amount: float) -> bool:
+        """Atomically debit amount if the balance covers it"""
+
+    @abstractmethod
+    def save_idempotency(self, key: str, response: Any, ttl_seconds: Optional[float] = None):
+        """Save the serialized response (a model or bytes) under the idempotency key"""
+
+    @abstractmethod
+    def get_idempotency(self, key: str) -> Optional[bytes]:
+        """Return the serialized response for a key if present and not expired"""
+
+    @abstractmethod
+    def create_case(self, customer_id: str, reason: str) -> str:
+        """Open a manual review case and return its id"""
+
+    @abstractmethod
+    def stats(self) -> Dict[str, Any]:
+        """Engine name plus lockWait and idempotencyCache stats for /metrics"""
+
+    @contextmanager
+    def customer_batch(self, customer_id: str) -> Iterator[Callable[[float], bool]]:
+        """
+        Yield a reserve(amount) function for several reservations by one
+        customer. Engines with per-customer locks hold the lock for the whole
+        block instead of taking it per reservation.
+        """
+        yield lambda amount: self.reserve(customer_id, amount)
+
+    # Async API: by default the blocking calls run in the thread pool
+
+    async def get_balance_async(self, customer_id: str) -> float:
+        return await asyncio.to_thread(self.get_balance, customer_id)
+
+    async def reserve_async(self, customer_id: str, amount: float) -> bool:
+        return await asyncio.to_thread(self.reserve, customer_id, amount)
+
+    async def save_idempotency_async(self, key: str, response: Any, ttl_seconds: Optional[float] = None):
+        await asyncio.to_thread(self.save_idempotency, key, response, ttl_seconds)
+
+    async def get_idempotency_async(self, key: str) -> Optional[bytes]:
+        return await asyncio.to_thread(self.get_idempotency, key)
+
+    async def create_case_async(self, customer_id: str, reason: str) -> str:
+        return await asyncio.to_thread(self.create_case, customer_id, reason)
+
+    def close(self):
+        """Release resources held by the store"""
+        pass
+
+    @staticmethod
+    def _new_case_id() -> str:
+        # The full uuid: a short prefix collides after a few thousand cases
+        return f"case_{uuid.uuid4().hex}"
+
+
+class InMemoryStore(StorageBackend):
+    ENGINE = "memory"
 
     def __init__(self):
-        # Initialize with some test accounts with specific balances
-        self.balances: Dict[str, float] = {
-            "c_123": 300.00,  # Keep this test account with higher balance for testing
-            "c_456": 150.00,  # Additional test account
-        }
-        self.idempotency: Dict[str, Dict[str, Any]] = {}
-        self.idempotency_expiry: Dict[str, datetime] = {}
-        self.locks: Dict[str, threading.Lock] = {}
-        self.lock_timeouts: Dict[str, datetime] = {}
-        self._cleanup_lock = threading.Lock()
-        
-        # Start cleanup thread
-        self._start_cleanup_thread()
-
-    def _start_cleanup_thread(self):
-        def cleanup():
-            while True:
-                time.sleep(300)  # Run every 5 minutes
-                self._cleanup_expired_data()
-        
-        thread = threading.Thread(target=cleanup, daemon=True)
-        thread.start()
-
-    def _cleanup_expired_data(self):
-        """Clean up expired idempotency keys and stale locks"""
-        now = datetime.now()
-        with self._cleanup_lock:
-            # Clean up expired idempotency keys
-            expired_keys = [
-                k for k, v in self.idempotency_expiry.items()
-                if v < now
-            ]
-            for k in expired_keys:
-                self.idempotency.pop(k, None)
-                self.idempotency_expiry.pop(k, None)
-            
-            # Clean up stale locks
-            stale_locks = [
-                k for k, v in self.lock_timeouts.items()
-                if v < now
-            ]
-            for k in stale_locks:
-                self.locks.pop(k, None)
-                self.lock_timeouts.pop(k, None)
+        # One slotted record per customer: balance in minor units plus its lock
+        self.accounts = AccountTable()
+        for customer_id, balance in self.SEED_BALANCES.items():
+            self.accounts.get_or_create(customer_id, to_minor(balance))
+        # Float view of the balances, as other engines expose them
+        self.balances: MutableMapping[str, float] = AccountBalances(self.accounts)
+        # Serialized responses; expired entries are evicted incrementally on access
+        self.idempotency = IdempotencyCache(
+            max_entries=settings.IDEMPOTENCY_MAX_ENTRIES,
+            max_bytes=settings.IDEMPOTENCY_MAX_BYTES,
+            default_ttl=settings.IDEMPOTENCY_TTL_SECONDS
+        )
+        self.lock_manager = CustomerLockManager(
+            timeout=settings.LOCK_TIMEOUT, lock_for=self._account, count=self.accounts.__len__
+        )
+        self.cases: Dict[str, Dict[str, Any]] = {}
+
+    def _account(self, customer_id: str) -> Account:
+        """The customer's account, created with the default balance on first use"""
+        account, created = self.accounts.get_or_create(
+            customer_id, to_minor(self.DEFAULT_INITIAL_BALANCE)
+        )
+        if created:
+            structured_log("info", "new_account_created", {
+                "customer_id": customer_id,
+                "initial_balance": self.DEFAULT_INITIAL_BALANCE
+            })
+        return account
 
     def get_balance(self, customer_id: str) -> float:
         """
         Get customer balance. If customer doesn't exist, automatically initialize
         with default balance and return it.
         """
-        if customer_id not in self.balances:
-            # Initialize new customer with default balance
-            with self._cleanup_lock:  # Use cleanup lock for new account creation
-                self.balances[customer_id] = self.DEFAULT_INITIAL_BALANCE
-                structured_log("info", "new_account_created", {
-                    "customer_id": customer_id,
-                    "initial_balance": self.DEFAULT_INITIAL_BALANCE
-                })
-        return self.balances[customer_id]
+        return from_minor(self._account(customer_id).balance)
 
     def _acquire_lock(self, customer_id: str) -> bool:
-        """Try to acquire a lock with timeout"""
-        if customer_id not in self.locks:
-            self.locks[customer_id] = threading.Lock()
-        
-        lock = self.locks[customer_id]
-        start_time = time.time()
-        
-        while time.time() - start_time < settings.LOCK_TIMEOUT:
-            if lock.acquire(blocking=False):
-                self.lock_timeouts[customer_id] = datetime.now() + timedelta(seconds=settings.LOCK_TIMEOUT)
-                return True
-            time.sleep(0.1)
-        
-        return False
+        """Block on the customer's lock (FIFO) until LOCK_TIMEOUT expires"""
+        return self.lock_manager.acquire(customer_id)
 
+    @timed_stage("reserve")
     def reserve(self, customer_id: str, amount: float) -> bool:
         """Reserve amount from customer's balance with timeout and retry"""
         if not self._acquire_lock(customer_id):
@@ -103,38 +150,270 @@ class InMemoryStore:
             raise LockTimeoutError(f"Could not acquire lock for customer {customer_id}")
 
         try:
-            balance = self.get_balance(customer_id)
-            if balance >= amount:
-                self.balances[customer_id] = balance - amount
-                structured_log("info", "balance_reserved", {
-                    "customer_id": customer_id,
-                    "amount": amount,
-                    "new_balance": self.balances[customer_id]
-                })
-                return True
-            return False
+            return self._debit(customer_id, amount)
+        finally:
+            self.lock_manager.release(customer_id)
+
+    @contextmanager
+    def customer_batch(self, customer_id: str) -> Iterator[Callable[[float], bool]]:
+        if not self._acquire_lock(customer_id):
+            structured_log("error", "lock_timeout", {
+                "customer_id": customer_id,
+                "operation": "customer_batch"
+            })
+            raise LockTimeoutError(f"Could not acquire lock for customer {customer_id}")
+        try:
+            yield lambda amount: self._debit(customer_id, amount)
         finally:
-            self.locks[customer_id].release()
+            self.lock_manager.release(customer_id)
 
-    def save_idempotency(self, key: str, response: Any, ttl_hours: int = 24):
-        """Save idempotency key with expiration"""
-        self.idempotency[key] = response
-        self.idempotency_expiry[key] = datetime.now() + timedelta(hours=ttl_hours)
+    def _debit(self, customer_id: str, amount: float) -> bool:
+        """Debit the balance if sufficient. Caller must hold the customer's lock."""
+        account = self._account(customer_id)
+        units = to_minor(amount)
+        if account.balance >= units:
+            account.balance -= units
+            structured_log("info", "balance_reserved", {
+                "customer_id": customer_id,
+                "amount": amount,
+                "new_balance": from_minor(account.balance)
+            })
+            return True
+        return False
+
+    def save_idempotency(self, key: str, response: Any, ttl_seconds: Optional[float] = None):
+        """Save the serialized response under the idempotency key"""
+        payload = response if isinstance(response, bytes) else response.model_dump_json().encode()
+        self.idempotency.set(key, payload, ttl_seconds)
         structured_log("info", "idempotency_saved", {
             "key": key,
-            "expires_at": self.idempotency_expiry[key].isoformat()
+            "bytes": len(payload)
         })
 
-    def get_idempotency(self, key: str) -> Optional[Any]:
-        """Get idempotency key if not expired"""
-        if key in self.idempotency and key in self.idempotency_expiry:
-            if datetime.now() < self.idempotency_expiry[key]:
-                structured_log("info", "idempotency_hit", {"key": key})
-                return self.idempotency[key]
-            else:
-                # Clean up expired key
-                self.idempotency.pop(key)
-                self.idempotency_expiry.pop(key)
-        return None
-
-store = InMemoryStore()
+    def get_idempotency(self, key: str) -> Optional[bytes]:
+        """Get the serialized response for a key if present and not expired"""
+        payload = self.idempotency.get(key)
+        if payload is not None:
+            structured_log("info", "idempotency_hit", {"key": key})
+        return payload
+
+    # Async API: these run on the event loop. None of the critical sections
+    # await, so coroutines never interleave inside them; only worker threads
+    # (e.g. the AI agent) can contend for a customer's lock.
+
+    async def get_balance_async(self, customer_id: str) -> float:
+        return self.get_balance(customer_id)
+
+    async def reserve_async(self, customer_id: str, amount: float) -> bool:
+        """Reserve without leaving the event loop unless a worker thread holds the lock"""
+        with stage_timer("reserve"):
+            # A miss here is not a timeout: the threaded path below waits properly
+            if self.lock_manager.acquire(customer_id, timeout=0, record=False):
+                try:
+                    return self._debit(customer_id, amount)
+                finally:
+                    self.lock_manager.release(customer_id)
+        # Contended by a thread: wait for the lock in the thread pool
+        return await asyncio.to_thread(self.reserve, customer_id, amount)
+
+    async def save_idempotency_async(self, key: str, response: Any, ttl_seconds: Optional[float] = None):
+        self.save_idempotency(key, response, ttl_seconds)
+
+    async def get_idempotency_async(self, key: str) -> Optional[bytes]:
+        return self.get_idempotency(key)
+
+    async def create_case_async(self, customer_id: str, reason: str) -> str:
+        return self.create_case(customer_id, reason)
+
+    def create_case(self, customer_id: str, reason: str) -> str:
+        case_id = self._new_case_id()
+        self.cases[case_id] = {"customer_id": customer_id, "reason": reason, "created_at": time.time()}
+        structured_log("info", "case_created", {"case_id": case_id, "customer_id": customer_id})
+        return case_id
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "engine": self.ENGINE,
+            "lockWait": self.lock_manager.stats(),
+            "idempotencyCache": self.idempotency.stats(),
+        }
+
+class SharedMemoryStore(InMemoryStore):
+    """
+    Balances live in a memory-mapped table shared by every worker process on
+    the box, and debits are atomic across processes. The customer lock
+    manager still orders threads within a process; idempotency and cases
+    stay per process.
+    """
+    ENGINE = "shared_memory"
+
+    def __init__(self, path: Optional[str] = None):
+        super().__init__()
+        # Balances live in the shared table, so locks get their own dict
+        self.lock_manager = CustomerLockManager(timeout=settings.LOCK_TIMEOUT)
+        path = path or os.path.join(settings.SHARED_STATE_DIR, "paynow-balances.tbl")
+        self.balances = SharedBalances(SharedTable(
+            path, settings.SHARED_BALANCE_SLOTS, settings.SHARED_STATE_STRIPES
+        ))
+        for customer_id, balance in self.SEED_BALANCES.items():
+            self.balances.setdefault(customer_id, balance)
+
+    def get_balance(self, customer_id: str) -> float:
+        balance, created = self.balances.get_or_create(customer_id, self.DEFAULT_INITIAL_BALANCE)
+        if created:
+            structured_log("info", "new_account_created", {
+                "customer_id": customer_id,
+                "initial_balance": self.DEFAULT_INITIAL_BALANCE
+            })
+        return balance
+
+    def _debit(self, customer_id: str, amount: float) -> bool:
+        ok, balance, created = self.balances.debit(customer_id, amount, self.DEFAULT_INITIAL_BALANCE)
+        if created:
+            structured_log("info", "new_account_created", {
+                "customer_id": customer_id,
+                "initial_balance": self.DEFAULT_INITIAL_BALANCE
+            })
+        if ok:
+            structured_log("info", "balance_reserved", {
+                "customer_id": customer_id,
+                "amount": amount,
+                "new_balance": balance
+            })
+        return ok
+
+    # Balance reads and debits take an fcntl lock on the shared table, which
+    # another process may hold: they run in the thread pool
+
+    async def get_balance_async(self, customer_id: str) -> float:
+        return await asyncio.to_thread(self.get_balance, customer_id)
+
+    async def reserve_async(self, customer_id: str, amount: float) -> bool:
+        return await asyncio.to_thread(self.reserve, customer_id, amount)
+
+    def close(self):
+        self.balances.table.close()
+
+
+class DurableMemoryStore(InMemoryStore):
+    """
+    In-memory store whose balance and idempotency writes go through a
+    write-ahead log before they are applied. WAL_FSYNC_POLICY decides whether
+    reserve() waits for the disk flush. A background thread snapshots state
+    every SNAPSHOT_INTERVAL_SECONDS, so recovery only replays the WAL tail.
+    Cases are not logged.
+    """
+    ENGINE = "durable_memory"
+
+    def __init__(self, directory: Optional[str] = None, fsync_policy: Optional[str] = None,
+                 snapshot_interval: Optional[float] = None):
+        super().__init__()
+        self.wal = WriteAheadLog(
+            directory or settings.WAL_DIR,
+            fsync_policy=fsync_policy or settings.WAL_FSYNC_POLICY,
+            group_commit_ms=settings.WAL_GROUP_COMMIT_MS,
+            fsync_interval=settings.WAL_FSYNC_INTERVAL
+        )
+        start = time.perf_counter()
+        balances, idempotency = self.wal.open()
+        self.balances.update(balances)
+        now = time.time()
+        for key, payload, expires_at in idempotency:
+            self.idempotency.set(key, payload, expires_at - now)
+        structured_log("info", "store_recovered", {
+            "balances": len(balances),
+            "idempotency_records": len(idempotency),
+            "duration_ms": round((time.perf_counter() - start) * 1000, 1)
+        })
+
+        if snapshot_interval is None:
+            snapshot_interval = settings.SNAPSHOT_INTERVAL_SECONDS
+        self._stopped = threading.Event()
+        self._snapshot_thread = None
+        if snapshot_interval:
+            self._snapshot_thread = threading.Thread(
+                target=self._snapshot_loop, args=(snapshot_interval,), daemon=True
+            )
+            self._snapshot_thread.start()
+
+    def _debit(self, customer_id: str, amount: float) -> bool:
+        account = self._account(customer_id)
+        units = to_minor(amount)
+        if account.balance < units:
+            return False
+        new_balance = account.balance - units
+        # Durable (per the fsync policy) before anyone can observe it
+        with self.wal.applying():
+            self.wal.log_balance(customer_id, from_minor(new_balance))
+            account.balance = new_balance
+        structured_log("info", "balance_reserved", {
+            "customer_id": customer_id,
+            "amount": amount,
+            "new_balance": from_minor(new_balance)
+        })
+        return True
+
+    def save_idempotency(self, key: str, response: Any, ttl_seconds: Optional[float] = None):
+        payload = response if isinstance(response, bytes) else response.model_dump_json().encode()
+        ttl = self.idempotency.default_ttl if ttl_seconds is None else ttl_seconds
+        with self.wal.applying():
+            self.wal.log_idempotency(key, payload, time.time() + ttl)
+            super().save_idempotency(key, payload, ttl_seconds)
+
+    # Waiting on a group commit must not block the event loop
+
+    async def reserve_async(self, customer_id: str, amount: float) -> bool:
+        if self.wal.waits:
+            return await asyncio.to_thread(self.reserve, customer_id, amount)
+        return await super().reserve_async(customer_id, amount)
+
+    async def save_idempotency_async(self, key: str, response: Any, ttl_seconds: Optional[float] = None):
+        if self.wal.waits:
+            await asyncio.to_thread(self.save_idempotency, key, response, ttl_seconds)
+        else:
+            self.save_idempotency(key, response, ttl_seconds)
+
+    def snapshot(self):
+        """Write a compact snapshot and drop the WAL segments it covers"""
+        def read_state():
+            now = time.time()
+            balances = {customer_id: from_minor(units)
+                        for customer_id, units in self.accounts.balances().items()}
+            return balances, [
+                (key, payload, now + ttl) for key, payload, ttl in self.idempotency.items()
+            ]
+
+        start = time.perf_counter()
+        self.wal.snapshot(read_state)
+        structured_log("info", "snapshot_written", {
+            "balances": len(self.balances),
+            "duration_ms": round((time.perf_counter() - start) * 1000, 1)
+        })
+
+    def _snapshot_loop(self, interval: float):
+        while not self._stopped.wait(interval):
+            try:
+                self.snapshot()
+            except Exception as e:
+                structured_log("error", "snapshot_failed", {"error": str(e)})
+
+    def close(self):
+        self._stopped.set()
+        if self._snapshot_thread is not None:
+            self._snapshot_thread.join()
+        self.wal.close()
+
+
+def create_store() -> StorageBackend:
+    """Build the store selected by STORAGE_ENGINE"""
+    if settings.STORAGE_ENGINE == "shared_memory":
+        return SharedMemoryStore()
+    if settings.STORAGE_ENGINE == "durable_memory":
+        return DurableMemoryStore()
+    if settings.STORAGE_ENGINE == "sqlite":
+        from .sqlite_store import SQLiteStore
+        return SQLiteStore()
+    return InMemoryStore()
+
+
+store = create_store()
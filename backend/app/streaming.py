@@ -0,0 +1,163 @@
+import asyncio
+from typing import AsyncIterator, Awaitable, Callable, Union
+
+from starlette.requests import ClientDisconnect, Request
+from starlette.responses import StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+from .batch import ItemError, encode_result, parse_line
+from .models import PaymentRequest
+from .utils import structured_log
+
+_DONE = object()
+
+
+async def iter_lines(chunks: AsyncIterator[bytes], max_line_bytes: int
+                     ) -> AsyncIterator[Union[bytes, ItemError]]:
+    """
+    Split a byte stream into lines without holding more than one line (plus
+    one chunk) in memory. A line longer than max_line_bytes is skipped and
+    reported as an ItemError in its place.
+    """
+    buffer = b""
+    oversized = False
+    async for chunk in chunks:
+        buffer += chunk
+        start = 0
+        while True:
+            end = buffer.find(b"\n", start)
+            if end < 0:
+                break
+            line = buffer[start:end]
+            start = end + 1
+            if oversized or len(line) > max_line_bytes:
+                oversized = False
+                yield ItemError(413, f"Line exceeds {max_line_bytes} bytes")
+            elif line.strip():
+                yield line
+        buffer = buffer[start:]
+        if len(buffer) > max_line_bytes:
+            # Drop the partial line and skip ahead to the next newline
+            buffer = b""
+            oversized = True
+    if oversized:
+        yield ItemError(413, f"Line exceeds {max_line_bytes} bytes")
+    elif buffer.strip():
+        yield buffer
+
+
+async def stream_decisions(chunks: AsyncIterator[bytes],
+                           decide: Callable[[PaymentRequest], Awaitable[Union[bytes, ItemError]]],
+                           limiter, max_concurrency: int, queue_size: int,
+                           max_line_bytes: int) -> AsyncIterator[bytes]:
+    """
+    Decide NDJSON payments as they arrive and yield one result line per
+    payment as soon as it completes (so out of input order; each line
+    carries its index).
+
+    Memory is bounded at every stage. At most max_concurrency decisions run
+    at once, and the body is not read while they are all busy. Finished
+    lines wait in a queue of queue_size; when the client reads slowly the
+    queue fills, decisions block on it, and reading stops again.
+
+    Each payment line spends its own rate-limit token.
+    """
+    output: asyncio.Queue = asyncio.Queue(queue_size)
+    slots = asyncio.Semaphore(max_concurrency)
+
+    async def run_item(index: int, item: Union[PaymentRequest, ItemError]):
+        try:
+            result = item if isinstance(item, ItemError) else await decide(item)
+            await output.put(encode_result(index, result) + b"\n")
+        finally:
+            slots.release()
+
+    async def produce():
+        tasks = set()
+        try:
+            index = 0
+            async for line in iter_lines(chunks, max_line_bytes):
+                await slots.acquire()
+                item = line if isinstance(line, ItemError) else parse_line(line)
+                if isinstance(item, PaymentRequest) and not limiter.allow(item.customerId):
+                    structured_log("warning", "rate_limit_exceeded", {"customer_id": item.customerId})
+                    item = ItemError(429, "Rate limit exceeded")
+                task = asyncio.create_task(run_item(index, item))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+                index += 1
+            if tasks:
+                await asyncio.gather(*tasks)
+            structured_log("info", "payment_stream_finished", {"items": index})
+        except asyncio.CancelledError:
+            for task in list(tasks):
+                task.cancel()
+            raise
+        except Exception:
+            for task in list(tasks):
+                task.cancel()
+            await output.put(_DONE)
+            raise
+        # The consumer drains the queue until it sees _DONE
+        await output.put(_DONE)
+
+    producer = asyncio.create_task(produce())
+    try:
+        while True:
+            line = await output.get()
+            if line is _DONE:
+                break
+            yield line
+        await producer
+    finally:
+        # Client went away: stop reading and deciding
+        if not producer.done():
+            producer.cancel()
+
+
+class DuplexStreamingResponse(StreamingResponse):
+    """
+    A StreamingResponse whose content reads the request body while the
+    response is being sent. Starlette's StreamingResponse listens for a
+    disconnect by calling receive(), which would swallow body messages, so
+    here the body is read by the content and the disconnect listener only
+    starts once the whole body has arrived.
+    """
+
+    def __init__(self, request: Request,
+                 content: Callable[[AsyncIterator[bytes]], AsyncIterator[bytes]], **kwargs):
+        self._receive = request.receive
+        self._body_read = asyncio.Event()
+        super().__init__(content(self._read_body()), **kwargs)
+
+    async def _read_body(self) -> AsyncIterator[bytes]:
+        while True:
+            message = await self._receive()
+            if message["type"] == "http.disconnect":
+                raise ClientDisconnect()
+            body = message.get("body", b"")
+            if body:
+                yield body
+            if not message.get("more_body", False):
+                break
+        self._body_read.set()
+
+    async def _wait_for_disconnect(self, receive: Receive):
+        await self._body_read.wait()
+        await self.listen_for_disconnect(receive)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        respond = asyncio.ensure_future(self.stream_response(send))
+        watch = asyncio.ensure_future(self._wait_for_disconnect(receive))
+        try:
+            await asyncio.wait({respond, watch}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            respond.cancel()
+            watch.cancel()
+        if respond.done() and not respond.cancelled():
+            try:
+                respond.result()
+            except ClientDisconnect:
+                return
+        if self.background is not None:
+            await self.background()
@@ -1,4 +1,5 @@
 import logging
+import functools
 import uuid
 import json
 from datetime import datetime
@@ -6,7 +7,12 @@ from typing import Any, Dict
 from contextlib import contextmanager
 import time
 import traceback
+import atexit
+import random
 import config as settings
+from .metrics import STAGE_SECONDS
+from .async_logging import BatchingQueueHandler
+from .rate_limiter import TokenBucketRateLimiter
 
 # Configure logging
 logger = logging.getLogger("paynow")
@@ -14,12 +20,43 @@ formatter = logging.Formatter(
     '%(asctime)s - %(module)s:%(funcName)s:%(lineno)d - %(levelname)s - [%(correlation_id)s] - %(message)s'
 )
 
-# Add handler if none exists
-if not logger.handlers:
-    handler = logging.StreamHandler()
+def configure_logging(mode: str = settings.LOG_MODE, stream=None) -> logging.Handler:
+    """
+    Install the paynow log handler. In "async" mode records are queued and
+    formatted/written in batches by a background thread.
+    """
+    for existing in list(logger.handlers):
+        logger.removeHandler(existing)
+        existing.close()
+
+    handler = logging.StreamHandler(stream)
     handler.setFormatter(formatter)
+    if mode == "async":
+        handler = BatchingQueueHandler(
+            handler,
+            queue_size=settings.LOG_QUEUE_SIZE,
+            batch_size=settings.LOG_BATCH_SIZE,
+            flush_interval=settings.LOG_FLUSH_INTERVAL,
+            overflow_policy=settings.LOG_OVERFLOW_POLICY
+        )
     logger.addHandler(handler)
     logger.setLevel(getattr(logging, settings.LOG_LEVEL))
+    return handler
+
+def shutdown_logging():
+    """Flush queued records and stop the background writer"""
+    for handler in list(logger.handlers):
+        # As in logging.shutdown: at exit the stream may already be closed
+        try:
+            handler.flush()
+            handler.close()
+        except (OSError, ValueError):
+            pass
+
+# Add handler if none exists
+if not logger.handlers:
+    configure_logging()
+    atexit.register(shutdown_logging)
 
 class ContextLogger:
     def __init__(self):
@@ -50,49 +87,129 @@ def redact_pii(data: Dict[str, Any]) -> Dict[str, Any]:
             redacted[field] = redact_customer_id(str(redacted[field]))
     return redacted
 
+class StructuredMessage:
+    """
+    Log payload that is only redacted and JSON-encoded when a handler formats
+    the record, so in async mode the work happens on the writer thread.
+    Callable values in data are lazy fields, evaluated at the same point.
+    """
+    __slots__ = ("log_data",)
+
+    def __init__(self, log_data: Dict[str, Any]):
+        self.log_data = log_data
+
+    def __str__(self) -> str:
+        data = {k: (v() if callable(v) else v) for k, v in self.log_data["data"].items()}
+        return json.dumps({**self.log_data, "data": redact_pii(data)}, default=str)
+
+_LEVELS = {
+    "debug": logging.DEBUG,
+    "info": logging.INFO,
+    "warning": logging.WARNING,
+    "error": logging.ERROR,
+    "critical": logging.CRITICAL,
+}
+
+# Error events capture a stack trace; cap how many per second so an error
+# storm cannot spend all its time in traceback.format_stack
+_stack_trace_limiter = TokenBucketRateLimiter(rate=settings.LOG_STACK_TRACES_PER_SECOND, per=1.0)
+
+def should_log(level: str, event: str) -> bool:
+    """Level check plus per-event sampling (LOG_SAMPLING in config.json)"""
+    if not logger.isEnabledFor(_LEVELS[level.lower()]):
+        return False
+    rate = settings.LOG_SAMPLING.get(event)
+    return rate is None or rate >= 1.0 or random.random() < rate
+
 def structured_log(level: str, event: str, data: Dict[str, Any]):
     """Log structured data with correlation ID and PII redaction"""
+    if should_log(level, event):
+        _emit(level, event, data)
+
+def _emit(level: str, event: str, data: Dict[str, Any]):
     log_data = {
         "timestamp": datetime.utcnow().isoformat(),
         "event": event,
         "correlation_id": context_logger.get_correlation_id(),
-        "data": redact_pii(data)
+        "data": data
     }
     
     # Add stack trace for error events
     if level.lower() == "error":
         if data.get("traceback", False) and "exc_info" in data:
+            # An exception's own traceback is always kept; only the
+            # current-stack capture below is rate limited
             exc_type, exc_value, exc_tb = data["exc_info"]
             # Format exception information
             stack_trace = traceback.format_exception(exc_type, exc_value, exc_tb)
             log_data["stack_trace"] = stack_trace
             # Remove exc_info from data to avoid serialization issues
             data.pop("exc_info")
-        else:
+        elif _stack_trace_limiter.allow("stack_trace"):
             # Fallback to getting current stack if no exception info provided
             stack_trace = traceback.format_stack()
             # Remove the last frame which is this function call
             stack_trace = stack_trace[:-1]
             log_data["stack_trace"] = stack_trace
+        else:
+            data.pop("exc_info", None)
+            log_data["stack_trace_suppressed"] = True
     
     getattr(logger, level.lower())(
-        json.dumps(log_data),
-        extra={"correlation_id": context_logger.get_correlation_id()}
+        StructuredMessage(log_data),
+        extra={"correlation_id": log_data["correlation_id"]}
     )
 
+class _StageTimer:
+    # A plain class is ~3x cheaper than a @contextmanager generator
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+        return False
+
+def stage_timer(stage: str) -> _StageTimer:
+    """Time a pipeline stage into the stage histogram without logging"""
+    return _StageTimer(STAGE_SECONDS.labels(stage))
+
+def timed_stage(stage: str):
+    """Decorator form of stage_timer"""
+    def decorator(func):
+        histogram = STAGE_SECONDS.labels(stage)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - start)
+        return wrapper
+    return decorator
+
 @contextmanager
 def timed_operation(operation_name: str):
     """Context manager for timing operations"""
-    start = time.time()
+    start = time.perf_counter()
     try:
         yield
     finally:
-        duration = (time.time() - start) * 1000
-        structured_log(
-            "info",
-            "operation_timing",
-            {
-                "operation": operation_name,
-                "duration_ms": duration
-            }
-        )
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.labels(operation_name).observe(elapsed)
+        # Sampled: checked before the payload is built
+        if should_log("info", "operation_timing"):
+            _emit(
+                "info",
+                "operation_timing",
+                {
+                    "operation": operation_name,
+                    "duration_ms": elapsed * 1000
+                }
+            )
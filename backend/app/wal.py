@@ -0,0 +1,359 @@
+import glob
+import os
+import struct
+import threading
+import time
+import zlib
+from array import array
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from .locks import SharedExclusiveLock
+
+# Record: crc32, op, key length, payload length, then key and payload.
+# The crc covers everything after itself, so a torn tail is detected.
+_HEADER = struct.Struct("<IBHI")
+_BALANCE = struct.Struct("<d")
+_EXPIRES = struct.Struct("<d")
+OP_BALANCE = 1
+OP_IDEMPOTENCY = 2
+
+_SNAPSHOT_MAGIC = b"PNSNAP1\0"
+# magic, balance count, keys blob length, idempotency blob length, body crc32
+_SNAPSHOT_HEADER = struct.Struct("<8sQQQI")
+
+FSYNC_POLICIES = ("always", "group", "interval", "none")
+
+_fdatasync = getattr(os, "fdatasync", os.fsync)
+
+# (key, payload, expires_at as wall-clock time)
+IdempotencyRecord = Tuple[str, bytes, float]
+
+
+class WALError(Exception):
+    """Raised when a record cannot be made durable"""
+    pass
+
+
+def encode_record(op: int, key: str, payload: bytes) -> bytes:
+    kb = key.encode()
+    body = _HEADER.pack(0, op, len(kb), len(payload))[4:] + kb + payload
+    return struct.pack("<I", zlib.crc32(body)) + body
+
+
+def _segment_path(directory: str, seq: int) -> str:
+    return os.path.join(directory, f"wal-{seq:08d}.log")
+
+
+def _snapshot_path(directory: str, seq: int) -> str:
+    return os.path.join(directory, f"snapshot-{seq:08d}.bin")
+
+
+_SUFFIXES = {"wal": ".log", "snapshot": ".bin"}
+
+
+def _seqs(directory: str, prefix: str) -> List[int]:
+    suffix = _SUFFIXES[prefix]
+    return sorted(int(os.path.basename(p)[len(prefix) + 1:-len(suffix)])
+                  for p in glob.glob(os.path.join(directory, f"{prefix}-*{suffix}")))
+
+
+class WriteAheadLog:
+    """
+    Append-only log of balance and idempotency writes with periodic snapshots.
+
+    Records carry absolute values (the new balance, not the debit), so
+    replaying a record that a snapshot already covers is harmless. Callers
+    log and apply each write inside applying(); a snapshot waits for those
+    blocks to finish before it rotates and copies the state.
+
+    fsync policies:
+      always   - write and fsync each record before returning
+      group    - a committer thread writes everything queued and fsyncs once
+                 per batch; callers wait for their batch (group commit)
+      interval - write immediately, fsync every `fsync_interval` seconds;
+                 a crash can lose that window
+      none     - write immediately, never fsync (survives process crashes only)
+    """
+
+    def __init__(self, directory: str, fsync_policy: str = "group",
+                 group_commit_ms: float = 0.0, fsync_interval: float = 1.0):
+        if fsync_policy not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy {fsync_policy!r}")
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.fsync_policy = fsync_policy
+        self.group_commit_seconds = group_commit_ms / 1000
+        self.fsync_interval = fsync_interval
+        # Callers only need to wait when the policy promises durability on return
+        self.waits = fsync_policy in ("always", "group")
+        self._fd = -1
+        self._seq = 0
+        self._write_lock = threading.Lock()
+        self._snapshot_lock = threading.Lock()
+        self._apply_lock = SharedExclusiveLock()
+        self._cond = threading.Condition()
+        self._pending: List[bytes] = []
+        self._next_batch = 1
+        self._durable_batch = 0
+        self._error: Optional[BaseException] = None
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.records = 0
+        self.bytes_written = 0
+        self.fsyncs = 0
+        self.batches = 0
+
+    # Recovery
+
+    def open(self) -> Tuple[Dict[str, float], List[IdempotencyRecord]]:
+        """Recover state from the latest snapshot plus the WAL tail, then start logging"""
+        balances: Dict[str, float] = {}
+        idempotency: Dict[str, IdempotencyRecord] = {}
+        # A snapshot that was being written when the process died
+        for tmp in glob.glob(os.path.join(self.directory, "snapshot-*.bin.tmp")):
+            os.remove(tmp)
+        snapshots = _seqs(self.directory, "snapshot")
+        base = 0
+        for seq in reversed(snapshots):
+            loaded = load_snapshot(_snapshot_path(self.directory, seq))
+            if loaded is not None:
+                balances, records = loaded
+                idempotency = {r[0]: r for r in records}
+                base = seq
+                break
+        segments = [s for s in _seqs(self.directory, "wal") if s >= base]
+        for seq in segments:
+            replay_segment(_segment_path(self.directory, seq), balances, idempotency)
+
+        # Never append to a segment that may end in a torn record
+        self._seq = max(segments + snapshots + [0]) + 1
+        self._fd = os.open(_segment_path(self.directory, self._seq),
+                           os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o600)
+        self._start_thread()
+        now = time.time()
+        return balances, [r for r in idempotency.values() if r[2] > now]
+
+    # Appending
+
+    @contextmanager
+    def applying(self) -> Iterator[None]:
+        """Hold while logging a write and applying it, so a snapshot never sees one without the other"""
+        with self._apply_lock.shared():
+            yield
+
+    def log_balance(self, customer_id: str, balance: float):
+        self._append(encode_record(OP_BALANCE, customer_id, _BALANCE.pack(balance)))
+
+    def log_idempotency(self, key: str, payload: bytes, expires_at: float):
+        self._append(encode_record(OP_IDEMPOTENCY, key, _EXPIRES.pack(expires_at) + payload))
+
+    def _append(self, record: bytes):
+        if self.fsync_policy == "group":
+            with self._cond:
+                if self._error is not None:
+                    raise WALError("WAL committer failed") from self._error
+                self._pending.append(record)
+                batch = self._next_batch
+                self._cond.notify_all()
+                while self._durable_batch < batch and self._error is None:
+                    self._cond.wait()
+                if self._durable_batch < batch:
+                    raise WALError("WAL committer failed") from self._error
+            return
+        with self._write_lock:
+            self._write(record)
+            self.records += 1
+            if self.fsync_policy == "always":
+                self._sync()
+
+    def _write(self, data: bytes):
+        """Caller must hold _write_lock"""
+        view = memoryview(data)
+        while view:
+            view = view[os.write(self._fd, view):]
+        self.bytes_written += len(data)
+
+    def _sync(self):
+        _fdatasync(self._fd)
+        self.fsyncs += 1
+
+    def _start_thread(self):
+        target = {"group": self._commit_loop, "interval": self._sync_loop}.get(self.fsync_policy)
+        if target is not None:
+            self._thread = threading.Thread(target=target, name="wal-committer", daemon=True)
+            self._thread.start()
+
+    def _commit_loop(self):
+        cond = self._cond
+        while True:
+            with cond:
+                while not self._pending and not self._stopped.is_set():
+                    cond.wait(0.1)
+                if not self._pending:
+                    return
+            if self.group_commit_seconds:
+                # Let concurrent writers join this batch
+                time.sleep(self.group_commit_seconds)
+            with cond:
+                batch, self._pending = self._pending, []
+                batch_id = self._next_batch
+                self._next_batch += 1
+            try:
+                with self._write_lock:
+                    self._write(b"".join(batch))
+                    self._sync()
+                    self.records += len(batch)
+                    self.batches += 1
+            except BaseException as e:
+                with cond:
+                    self._error = e
+                    cond.notify_all()
+                return
+            with cond:
+                self._durable_batch = batch_id
+                cond.notify_all()
+
+    def _sync_loop(self):
+        while not self._stopped.wait(self.fsync_interval):
+            with self._write_lock:
+                self._sync()
+
+    # Snapshots
+
+    def snapshot(self, read_state: Callable[[], Tuple[Dict[str, float], List[IdempotencyRecord]]]):
+        """
+        Write a compact snapshot and drop the segments it covers.
+
+        Writers are paused (see applying()) while the log switches to a new
+        segment and read_state() copies the state, so every record in the
+        older segments has been applied by the time it is read. Writes
+        resume once the copy is taken, while the snapshot file is written.
+        """
+        with self._snapshot_lock:
+            with self._apply_lock.exclusive():
+                seq = self.rotate()
+                balances, idempotency = read_state()
+            write_snapshot(_snapshot_path(self.directory, seq), balances, idempotency)
+            for old in _seqs(self.directory, "wal"):
+                if old < seq:
+                    os.remove(_segment_path(self.directory, old))
+            for old in _seqs(self.directory, "snapshot"):
+                if old < seq:
+                    os.remove(_snapshot_path(self.directory, old))
+
+    def rotate(self) -> int:
+        """Start a new segment and return its sequence number"""
+        with self._write_lock:
+            if self.fsync_policy != "none":
+                self._sync()
+            self._seq += 1
+            fd = os.open(_segment_path(self.directory, self._seq),
+                         os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o600)
+            os.close(self._fd)
+            self._fd = fd
+            return self._seq
+
+    def close(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+        with self._write_lock:
+            if self._fd >= 0:
+                if self.fsync_policy != "none":
+                    self._sync()
+                os.close(self._fd)
+                self._fd = -1
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "policy": self.fsync_policy,
+            "segment": self._seq,
+            "records": self.records,
+            "bytes": self.bytes_written,
+            "fsyncs": self.fsyncs,
+            "batches": self.batches,
+        }
+
+
+def replay_records(data: bytes, balances: Dict[str, float],
+                   idempotency: Dict[str, IdempotencyRecord]) -> int:
+    """Apply records in order; return the offset of the first torn or corrupt one"""
+    header = _HEADER
+    header_size = header.size
+    crc32 = zlib.crc32
+    unpack_balance = _BALANCE.unpack_from
+    offset = 0
+    end = len(data)
+    while offset + header_size <= end:
+        crc, op, klen, plen = header.unpack_from(data, offset)
+        stop = offset + header_size + klen + plen
+        if stop > end or crc32(data[offset + 4:stop]) != crc:
+            break
+        start = stop - plen
+        key = data[offset + header_size:start].decode()
+        if op == OP_BALANCE:
+            balances[key] = unpack_balance(data, start)[0]
+        elif op == OP_IDEMPOTENCY:
+            expires_at = _EXPIRES.unpack_from(data, start)[0]
+            idempotency[key] = (key, data[start + _EXPIRES.size:stop], expires_at)
+        offset = stop
+    return offset
+
+
+def replay_segment(path: str, balances: Dict[str, float],
+                   idempotency: Dict[str, IdempotencyRecord]):
+    """Replay a segment file, truncating it at the first torn or corrupt record"""
+    with open(path, "rb") as f:
+        data = f.read()
+    offset = replay_records(data, balances, idempotency)
+    if offset < len(data):
+        os.truncate(path, offset)
+
+
+def write_snapshot(path: str, balances: Dict[str, float], idempotency: List[IdempotencyRecord]):
+    """Atomically write a snapshot: a temp file is fsynced and renamed into place"""
+    # Customer ids never contain newlines (see PaymentRequest), so keys are
+    # stored as one joined blob and values as a packed double array
+    keys = "\n".join(balances).encode()
+    values = array("d", balances.values()).tobytes()
+    records = b"".join(
+        encode_record(OP_IDEMPOTENCY, key, _EXPIRES.pack(expires_at) + payload)
+        for key, payload, expires_at in idempotency
+    )
+    crc = zlib.crc32(records, zlib.crc32(values, zlib.crc32(keys)))
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(_SNAPSHOT_HEADER.pack(_SNAPSHOT_MAGIC, len(balances), len(keys), len(records), crc))
+        f.write(keys)
+        f.write(values)
+        f.write(records)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def load_snapshot(path: str) -> Optional[Tuple[Dict[str, float], List[IdempotencyRecord]]]:
+    """Return the snapshot's state, or None if it is missing or corrupt"""
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+    if len(data) < _SNAPSHOT_HEADER.size:
+        return None
+    magic, count, keys_len, records_len, crc = _SNAPSHOT_HEADER.unpack_from(data)
+    body = memoryview(data)[_SNAPSHOT_HEADER.size:]
+    if magic != _SNAPSHOT_MAGIC or len(body) != keys_len + 8 * count + records_len:
+        return None
+    if zlib.crc32(body) != crc:
+        return None
+    keys = bytes(body[:keys_len]).decode().split("\n") if count else []
+    values = array("d")
+    values.frombytes(body[keys_len:keys_len + 8 * count])
+    balances = dict(zip(keys, values))
+
+    idempotency: Dict[str, IdempotencyRecord] = {}
+    replay_records(bytes(body[keys_len + 8 * count:]), {}, idempotency)
+    return balances, list(idempotency.values())
+
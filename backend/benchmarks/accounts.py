@@ -0,0 +1,110 @@
+"""
+Memory per customer of InMemoryStore's account state at 1M and 10M
+customers: the original layout (a balances dict of floats plus a lock
+manager dict of FairLocks, each with its own mutex and waiter deque) vs
+the slotted Account records in minor units.
+
+Each measurement runs in a fresh subprocess and reports the RSS growth
+while the accounts are created, after the customer id strings already
+exist. Sizes that would not fit in available memory are projected from
+the 1M run. Run from backend/:
+
+    python -m benchmarks.accounts --customers 1000000 10000000
+"""
+import argparse
+import gc
+import json
+import logging
+import subprocess
+import sys
+import threading
+from collections import deque
+
+
+class OriginalFairLock:
+    """The FairLock every customer used to get, kept for comparison"""
+    __slots__ = ("_mutex", "_locked", "_waiters")
+
+    def __init__(self):
+        self._mutex = threading.Lock()
+        self._locked = False
+        self._waiters = deque()
+
+
+def rss_bytes():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * 4096
+
+
+def available_bytes():
+    with open("/proc/meminfo") as f:
+        for line in f:
+            if line.startswith("MemAvailable:"):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+def populate(layout, customers):
+    keys = [f"cust_{i}" for i in range(customers)]
+    gc.collect()
+    before = rss_bytes()
+    if layout == "original":
+        balances = {}
+        locks = {}
+        for key in keys:
+            balances[key] = 100.0 + len(key)  # distinct float objects, as after debits
+            locks[key] = OriginalFairLock()
+        state = (balances, locks)
+    else:
+        from app.store import InMemoryStore
+        logging.getLogger("paynow").setLevel(logging.WARNING)
+        store = InMemoryStore()
+        for key in keys:
+            store._account(key)
+        state = store
+    gc.collect()
+    return (rss_bytes() - before) / customers, state
+
+
+def measure(layout, customers):
+    out = subprocess.run(
+        [sys.executable, "-m", "benchmarks.accounts", "--worker", layout, str(customers)],
+        check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(out)["bytesPerCustomer"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--customers", type=int, nargs="+", default=[1000000, 10000000])
+    parser.add_argument("--worker", nargs=2, metavar=("LAYOUT", "CUSTOMERS"),
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        per_customer, _ = populate(args.worker[0], int(args.worker[1]))
+        print(json.dumps({"bytesPerCustomer": per_customer}))
+        return
+
+    results = []
+    measured = {}
+    for customers in args.customers:
+        row = {"customers": customers}
+        for layout in ("original", "account"):
+            # Key strings and list overhead come on top of the per-customer cost
+            needed = customers * (measured.get(layout, 1200) + 120)
+            if needed > available_bytes() * 0.8:
+                row[layout] = {"bytesPerCustomer": round(measured[layout]), "projected": True}
+                continue
+            measured[layout] = measure(layout, customers)
+            row[layout] = {"bytesPerCustomer": round(measured[layout]), "projected": False}
+        row["totalMb"] = {
+            layout: round(row[layout]["bytesPerCustomer"] * customers / 2**20)
+            for layout in ("original", "account")
+        }
+        results.append(row)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Per-request LLM agent construction vs a pre-initialized agent pool.
+
+Uses the offline stub chat model so no API calls are made. With
+--gemini-client the per-request mode also constructs a ChatGoogleGenerativeAI
+client each time (construction only, nothing is sent). Run from backend/:
+
+    python -m benchmarks.agent_pool --requests 500 --threads 8
+"""
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+
+from app.agent import _build_executor, init_agent_pool, shutdown_agent_pool
+from app.agent_pool import build_gemini_llm, build_stub_llm
+
+PROMPT = "Customer c_456 wants to pay 20.0 USD to p_1"
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q / 100))]
+
+
+def per_request(gemini_client: bool):
+    if gemini_client:
+        build_gemini_llm()
+    executor = _build_executor(build_stub_llm)
+    return executor.run(PROMPT)
+
+
+def pooled(pool):
+    worker = pool.acquire(timeout=5)
+    try:
+        return worker.executor.run(PROMPT)
+    finally:
+        pool.release(worker)
+
+
+def measure(name, fn, requests, threads):
+    latencies = []
+    lock = threading.Lock()
+
+    def timed(_):
+        start = time.perf_counter()
+        fn()
+        elapsed = (time.perf_counter() - start) * 1000
+        with lock:
+            latencies.append(elapsed)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(timed, range(requests)))
+    elapsed = time.perf_counter() - start
+    return {
+        "mode": name,
+        "requests": requests,
+        "threads": threads,
+        "reqPerSec": round(requests / elapsed, 1),
+        "p50Ms": round(percentile(latencies, 50), 3),
+        "p99Ms": round(percentile(latencies, 99), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--gemini-client", action="store_true")
+    args = parser.parse_args()
+
+    logging.getLogger("paynow").setLevel(logging.WARNING)
+    warnings.filterwarnings("ignore")
+    if args.gemini_client:
+        os.environ.setdefault("GOOGLE_API_KEY", "benchmark-placeholder")
+
+    results = [measure("per_request", lambda: per_request(args.gemini_client),
+                       args.requests, args.threads)]
+    pool = init_agent_pool(llm_factory=build_stub_llm, size=args.threads)
+    try:
+        results.append(measure("pooled", lambda: pooled(pool), args.requests, args.threads))
+    finally:
+        shutdown_agent_pool()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
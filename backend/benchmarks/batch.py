@@ -0,0 +1,90 @@
+"""
+10k payments through /payments/decide (one request each, 64 concurrent
+clients) vs /payments/decide:batch (JSON arrays of --batch-size items).
+
+Runs the ASGI app in-process with the rate limiter disabled. Run from
+backend/:
+
+    python -m benchmarks.batch --payments 10000 --batch-size 1000
+"""
+import argparse
+import asyncio
+import json
+import logging
+import time
+
+import httpx
+
+import config as settings
+from server import app
+from app.rate_limiter import rate_limiter
+from benchmarks.decide_modes import drive
+
+
+def payments(prefix, total, customers):
+    return [{
+        "customerId": f"{prefix}_{i % customers}",
+        "amount": 1.0,
+        "currency": "USD",
+        "payeeId": "p_bench",
+        "idempotencyKey": f"{prefix}_{i}",
+    } for i in range(total)]
+
+
+async def drive_batch(total, batch_size, customers, concurrency):
+    items = payments(f"bench_batch{batch_size}", total, customers)
+    batches = [items[i:i + batch_size] for i in range(0, total, batch_size)]
+    headers = {"X-API-Key": settings.API_KEY}
+    transport = httpx.ASGITransport(app=app)
+    statuses = {}
+    queue = iter(batches)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        async def worker():
+            for batch in queue:
+                r = await client.post("/payments/decide:batch", json=batch, headers=headers)
+                for result in r.json()["results"]:
+                    statuses[result["status"]] = statuses.get(result["status"], 0) + 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    return {
+        "mode": f"batch_{batch_size}",
+        "payments": total,
+        "paymentsPerSec": round(total / elapsed, 1),
+        "seconds": round(elapsed, 2),
+        "statuses": statuses,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--payments", type=int, default=10000)
+    parser.add_argument("--batch-size", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--customers", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=64)
+    args = parser.parse_args()
+
+    logging.getLogger("paynow").setLevel(logging.WARNING)
+    rate_limiter.allow = lambda key: True
+
+    single = asyncio.run(drive(settings.DECISION_MODE, args.payments, args.concurrency,
+                               args.customers, tag="_single"))
+    results = [{
+        "mode": "single",
+        "payments": args.payments,
+        "paymentsPerSec": single["reqPerSec"],
+        "seconds": round(args.payments / single["reqPerSec"], 2),
+        "statuses": single["statuses"],
+    }]
+    for size in args.batch_size:
+        # A few batches in flight at once, as parallel settlement jobs would send
+        results.append(asyncio.run(drive_batch(args.payments, size, args.customers,
+                                               min(4, max(1, args.payments // size)))))
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
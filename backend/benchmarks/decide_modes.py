@@ -0,0 +1,75 @@
+"""
+Throughput of /payments/decide in "thread" vs "async" DECISION_MODE.
+
+Drives the ASGI app in-process with concurrent clients, so the numbers
+reflect server-side overhead rather than network cost. Run from backend/:
+
+    python -m benchmarks.decide_modes --requests 5000 --concurrency 64
+"""
+import argparse
+import asyncio
+import json
+import logging
+import time
+
+import httpx
+
+import config as settings
+from server import app
+from app.rate_limiter import rate_limiter
+
+
+async def drive(mode: str, total: int, concurrency: int, customers: int, tag: str = ""):
+    settings.DECISION_MODE = mode
+    prefix = f"bench_{mode}{tag}"
+    headers = {"X-API-Key": settings.API_KEY}
+    transport = httpx.ASGITransport(app=app)
+    counter = iter(range(total))
+    statuses = {}
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def worker():
+            for i in counter:
+                payload = {
+                    "customerId": f"{prefix}_{i % customers}",
+                    "amount": 1.0,
+                    "currency": "USD",
+                    "payeeId": "p_bench",
+                    "idempotencyKey": f"{prefix}_{i}",
+                }
+                r = await client.post("/payments/decide", json=payload, headers=headers)
+                statuses[r.status_code] = statuses.get(r.status_code, 0) + 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    return {
+        "mode": mode,
+        "requests": total,
+        "concurrency": concurrency,
+        "reqPerSec": round(total / elapsed, 1),
+        "statuses": statuses,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--customers", type=int, default=500)
+    args = parser.parse_args()
+
+    logging.getLogger("paynow").setLevel(logging.WARNING)
+    # Benchmark the decision path, not the per-customer limiter
+    rate_limiter.allow = lambda key: True
+
+    results = [
+        asyncio.run(drive(mode, args.requests, args.concurrency, args.customers))
+        for mode in ("thread", "async")
+    ]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
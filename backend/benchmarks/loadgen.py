@@ -0,0 +1,286 @@
+"""
+Load generator for /payments/decide: synthetic workloads driven in-process
+(httpx.ASGITransport) or against a real uvicorn server, with the results
+written as JSON so runs can be compared against a saved baseline.
+
+The workload is deterministic for a given --seed:
+  - customers are drawn from a Zipf distribution (--skew, 0 = uniform)
+  - --hot-share of the traffic goes to --hot-accounts customers, which
+    exhaust their balance and start getting blocked; c_123 (recent
+    disputes) is always one of them, so it is reviewed
+  - customers are spread over the simulated risk profiles (clean, new_, intl_)
+  - --review-share of the payments are above REVIEW_THRESHOLD
+  - --retry-share of the requests resend an earlier request with the same
+    idempotency key and body, exercising the replay path
+
+Allocations per request are measured in-process only: a sequential sample
+of --alloc-sample requests runs under tracemalloc after the timed run and
+reports peak and retained bytes per request (client side included). For
+uvicorn the server's RSS growth per request is reported instead. The rate
+limiter is disabled unless --rate-limit is given. Run from backend/:
+
+    python -m benchmarks.loadgen --transport asgi uvicorn --concurrency 1 64 \\
+        --requests 5000 --output loadgen.json
+    python -m benchmarks.loadgen --baseline loadgen.json
+"""
+import argparse
+import asyncio
+import bisect
+import itertools
+import json
+import logging
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import httpx
+
+import config as settings
+
+SERVER = """
+import logging, uvicorn, server
+logging.getLogger("paynow").setLevel(logging.WARNING)
+server.settings.DECISION_MODE = {mode!r}
+if not {rate_limit!r}:
+    server.rate_limiter.allow = lambda key: True
+uvicorn.run(server.app, host="127.0.0.1", port={port}, log_level="warning")
+"""
+
+PROFILES = ("", "new_", "intl_")
+
+
+class Workload:
+    """A deterministic list of (customer_id, JSON body, is_retry) requests"""
+
+    def __init__(self, requests, customers=10000, skew=1.0, hot_accounts=4, hot_share=0.1,
+                 review_share=0.05, retry_share=0.05, seed=1, tag="lg"):
+        rng = random.Random(seed)
+        self.tag = f"{tag}{seed}_{rng.randrange(1 << 30):x}"
+        ids = [f"{PROFILES[i % len(PROFILES)]}{self.tag}_{i}" for i in range(customers)]
+        hot = ["c_123"] + [f"{self.tag}_hot_{i}" for i in range(max(0, hot_accounts - 1))]
+        cumulative = list(itertools.accumulate(1 / (rank ** skew) for rank in range(1, customers + 1)))
+
+        self.items = []
+        for i in range(requests):
+            if self.items and rng.random() < retry_share:
+                customer_id, body, _ = rng.choice(self.items)
+                self.items.append((customer_id, body, True))
+                continue
+            if hot and rng.random() < hot_share:
+                customer_id = rng.choice(hot)
+                amount = round(rng.uniform(5, 40), 2)
+            else:
+                pick = rng.random() * cumulative[-1]
+                customer_id = ids[bisect.bisect_left(cumulative, pick)]
+                amount = round(rng.uniform(1, 20), 2)
+            if rng.random() < review_share:
+                amount = round(settings.REVIEW_THRESHOLD + rng.uniform(1, 500), 2)
+            body = json.dumps({
+                "customerId": customer_id,
+                "amount": amount,
+                "currency": "USD",
+                "payeeId": "p_bench",
+                "idempotencyKey": f"{self.tag}_{i}",
+            }).encode()
+            self.items.append((customer_id, body, False))
+
+    def __len__(self):
+        return len(self.items)
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+async def run(client, workload, concurrency):
+    headers = {"X-API-Key": settings.API_KEY, "Content-Type": "application/json"}
+    counter = iter(workload.items)
+    latencies, statuses, decisions = [], {}, {}
+
+    async def worker():
+        for _, body, _ in counter:
+            start = time.perf_counter()
+            r = await client.post("/payments/decide", content=body, headers=headers)
+            latencies.append((time.perf_counter() - start) * 1000)
+            statuses[r.status_code] = statuses.get(r.status_code, 0) + 1
+            if r.status_code == 200:
+                decision = r.json()["decision"]
+                decisions[decision] = decisions.get(decision, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "requests": len(workload),
+        "retries": sum(1 for item in workload.items if item[2]),
+        "seconds": round(elapsed, 3),
+        "reqPerSec": round(len(workload) / elapsed, 1),
+        "latencyMs": {
+            "p50": round(percentile(latencies, 50), 3),
+            "p95": round(percentile(latencies, 95), 3),
+            "p99": round(percentile(latencies, 99), 3),
+            "max": round(latencies[-1], 3) if latencies else 0.0,
+            "mean": round(statistics.fmean(latencies), 3) if latencies else 0.0,
+        },
+        "statuses": {str(code): n for code, n in sorted(statuses.items())},
+        "decisions": dict(sorted(decisions.items())),
+    }
+
+
+async def sample_allocations(client, workload):
+    """Peak and retained traced bytes per request, one request at a time"""
+    headers = {"X-API-Key": settings.API_KEY, "Content-Type": "application/json"}
+    peaks = []
+    tracemalloc.start()
+    try:
+        start_current, _ = tracemalloc.get_traced_memory()
+        for _, body, _ in workload.items:
+            before, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            await client.post("/payments/decide", content=body, headers=headers)
+            _, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - before)
+        end_current, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "sampled": len(peaks),
+        "peakBytesPerRequest": round(statistics.median(peaks)) if peaks else 0,
+        "retainedBytesPerRequest": round((end_current - start_current) / max(1, len(peaks))),
+    }
+
+
+def rss_bytes(pid):
+    with open(f"/proc/{pid}/statm") as f:
+        return int(f.read().split()[1]) * 4096
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def drive_asgi(args, workload, sample, concurrency):
+    from server import app
+    from app.rate_limiter import rate_limiter
+
+    logging.getLogger("paynow").setLevel(logging.WARNING)
+    settings.DECISION_MODE = args.mode
+    if not args.rate_limit:
+        rate_limiter.allow = lambda key: True
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        result = await run(client, workload, concurrency)
+        result["allocations"] = await sample_allocations(client, sample) if len(sample) else None
+    return result
+
+
+async def drive_uvicorn(args, workload, concurrency):
+    port = free_port()
+    script = SERVER.format(port=port, mode=args.mode, rate_limit=args.rate_limit)
+    proc = subprocess.Popen([sys.executable, "-c", script])
+    try:
+        for _ in range(100):
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+                break
+            except OSError:
+                time.sleep(0.1)
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits) as client:
+            before = rss_bytes(proc.pid)
+            result = await run(client, workload, concurrency)
+            grown = rss_bytes(proc.pid) - before
+    finally:
+        proc.terminate()
+        proc.wait()
+    result["allocations"] = {"serverRssGrowthBytesPerRequest": round(grown / len(workload))}
+    return result
+
+
+def compare(results, baseline, tolerance):
+    """Regressions of reqPerSec or p99 beyond tolerance against matching baseline runs"""
+    previous = {(r["transport"], r["concurrency"]): r for r in baseline["results"]}
+    regressions = []
+    for result in results:
+        old = previous.get((result["transport"], result["concurrency"]))
+        if old is None:
+            continue
+        if result["reqPerSec"] < old["reqPerSec"] * (1 - tolerance):
+            regressions.append({"transport": result["transport"], "concurrency": result["concurrency"],
+                                "metric": "reqPerSec", "baseline": old["reqPerSec"],
+                                "current": result["reqPerSec"]})
+        if result["latencyMs"]["p99"] > old["latencyMs"]["p99"] * (1 + tolerance):
+            regressions.append({"transport": result["transport"], "concurrency": result["concurrency"],
+                                "metric": "p99LatencyMs", "baseline": old["latencyMs"]["p99"],
+                                "current": result["latencyMs"]["p99"]})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--transport", nargs="+", choices=("asgi", "uvicorn"), default=["asgi"])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[64])
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--customers", type=int, default=10000)
+    parser.add_argument("--skew", type=float, default=1.0, help="Zipf exponent, 0 = uniform")
+    parser.add_argument("--hot-accounts", type=int, default=4)
+    parser.add_argument("--hot-share", type=float, default=0.1)
+    parser.add_argument("--review-share", type=float, default=0.05)
+    parser.add_argument("--retry-share", type=float, default=0.05)
+    parser.add_argument("--alloc-sample", type=int, default=200)
+    parser.add_argument("--mode", choices=("thread", "async", "tiered"), default="async",
+                        help="DECISION_MODE for the server under test")
+    parser.add_argument("--rate-limit", action="store_true", help="keep the rate limiter on")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write the JSON report to this file as well")
+    parser.add_argument("--baseline", help="JSON report to compare against; exit 1 on regression")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    options = dict(customers=args.customers, skew=args.skew, hot_accounts=args.hot_accounts,
+                   hot_share=args.hot_share, review_share=args.review_share,
+                   retry_share=args.retry_share)
+    results = []
+    for run_number, (transport, concurrency) in enumerate(
+            itertools.product(args.transport, args.concurrency)):
+        # Fresh idempotency keys and accounts for every run, same shape of traffic
+        workload = Workload(args.requests, seed=args.seed + run_number, **options)
+        if transport == "asgi":
+            sample = Workload(args.alloc_sample, seed=args.seed + run_number, tag="lga", **options)
+            result = asyncio.run(drive_asgi(args, workload, sample, concurrency))
+        else:
+            result = asyncio.run(drive_uvicorn(args, workload, concurrency))
+        results.append({"transport": transport, "concurrency": concurrency, **result})
+
+    report = {
+        "workload": {"requests": args.requests, "mode": args.mode, "seed": args.seed,
+                     "rateLimit": args.rate_limit, **options},
+        "results": results,
+    }
+    if args.baseline:
+        with open(args.baseline) as f:
+            report["regressions"] = compare(results, json.load(f), args.tolerance)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    print(text)
+    if report.get("regressions"):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Lock contention benchmark: N threads reserving against one hot customer.
+
+Compares the legacy 100 ms spin-sleep acquire with the FIFO lock manager.
+Run from the backend directory:
+
+    python -m benchmarks.lock_contention --threads 16 --ops 200
+"""
+import argparse
+import json
+import logging
+import threading
+import time
+
+from app.locks import CustomerLockManager
+from app.store import InMemoryStore
+
+HOT_CUSTOMER = "c_123"
+
+
+class SpinSleepLocks:
+    """The original InMemoryStore._acquire_lock strategy, kept for comparison"""
+
+    def __init__(self, timeout: float):
+        self.timeout = timeout
+        self.locks = {}
+
+    def acquire(self, customer_id: str) -> bool:
+        if customer_id not in self.locks:
+            self.locks[customer_id] = threading.Lock()
+        lock = self.locks[customer_id]
+        start_time = time.time()
+        while time.time() - start_time < self.timeout:
+            if lock.acquire(blocking=False):
+                return True
+            time.sleep(0.1)
+        return False
+
+    def release(self, customer_id: str):
+        self.locks[customer_id].release()
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q / 100))]
+
+
+def run(strategy_name: str, threads: int, ops: int, hold_ms: float, timeout: float):
+    store = InMemoryStore()
+    store.balances[HOT_CUSTOMER] = float(threads * ops)
+    if strategy_name == "spin":
+        store.lock_manager = SpinSleepLocks(timeout)
+    else:
+        store.lock_manager = CustomerLockManager(timeout)
+
+    original_debit = store._debit
+
+    def slow_debit(customer_id, amount):
+        # Simulate work done while holding the lock (risk lookups, logging)
+        if hold_ms:
+            time.sleep(hold_ms / 1000)
+        return original_debit(customer_id, amount)
+
+    store._debit = slow_debit
+
+    latencies = []
+    failures = [0]
+    latencies_lock = threading.Lock()
+    barrier = threading.Barrier(threads)
+
+    def worker():
+        local = []
+        barrier.wait()
+        for _ in range(ops):
+            start = time.perf_counter()
+            try:
+                store.reserve(HOT_CUSTOMER, 1.0)
+            except Exception:
+                failures[0] += 1
+            local.append((time.perf_counter() - start) * 1000)
+        with latencies_lock:
+            latencies.extend(local)
+
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    return {
+        "strategy": strategy_name,
+        "threads": threads,
+        "opsPerThread": ops,
+        "holdMs": hold_ms,
+        "throughputOpsPerSec": round(len(latencies) / elapsed, 1),
+        "p50Ms": round(percentile(latencies, 50), 3),
+        "p99Ms": round(percentile(latencies, 99), 3),
+        "maxMs": round(max(latencies), 3),
+        "lockTimeouts": failures[0],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--ops", type=int, default=100)
+    parser.add_argument("--hold-ms", type=float, default=0.2)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--strategy", choices=["spin", "fifo", "both"], default="both")
+    args = parser.parse_args()
+
+    logging.getLogger("paynow").setLevel(logging.WARNING)
+    strategies = ["spin", "fifo"] if args.strategy == "both" else [args.strategy]
+    results = [run(s, args.threads, args.ops, args.hold_ms, args.timeout) for s in strategies]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Decide throughput with synchronous vs queued/batched logging.
+
+Logs are written to a real file so the I/O cost is included. --write-latency-ms
+adds a fixed delay per write() call to model a slow consumer on stderr (a
+terminal, a pipe into a log shipper). Run from backend/:
+
+    python -m benchmarks.logging_modes --requests 3000 --concurrency 64 --write-latency-ms 0.2
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+from app.rate_limiter import rate_limiter
+from app.utils import configure_logging
+from benchmarks.decide_modes import drive
+
+
+class SlowStream:
+    """File wrapper that pays a fixed latency on every write"""
+
+    def __init__(self, stream, latency_ms: float):
+        self.stream = stream
+        self.latency = latency_ms / 1000
+
+    def write(self, data):
+        if self.latency:
+            time.sleep(self.latency)
+        return self.stream.write(data)
+
+    def flush(self):
+        self.stream.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=3000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--customers", type=int, default=500)
+    parser.add_argument("--write-latency-ms", type=float, default=0.0)
+    args = parser.parse_args()
+
+    rate_limiter.allow = lambda key: True
+    results = []
+    for log_mode in ("sync", "async"):
+        fd, path = tempfile.mkstemp(prefix=f"paynow_{log_mode}_", suffix=".log")
+        with os.fdopen(fd, "w") as stream:
+            handler = configure_logging(log_mode, stream=SlowStream(stream, args.write_latency_ms))
+            result = asyncio.run(drive("async", args.requests, args.concurrency, args.customers,
+                                   tag=f"_{log_mode}log"))
+            handler.flush()
+            result["logMode"] = log_mode
+            result["writeLatencyMs"] = args.write_latency_ms
+            result["logBytes"] = os.path.getsize(path)
+            result["droppedRecords"] = getattr(handler, "dropped", 0)
+            configure_logging("sync", stream=open(os.devnull, "w"))
+        os.unlink(path)
+        results.append(result)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Risk-signal lookup cost: the original get_risk_signals (a nested dict built
+per call) vs RiskSignalService on a cache hit, on a miss, and recording a
+decision. Allocation is measured with tracemalloc over the same loop.
+Run from backend/:
+
+    python -m benchmarks.risk_signals --lookups 200000
+"""
+import argparse
+import gc
+import json
+import time
+import tracemalloc
+from datetime import datetime
+
+from app.risk_signals import RiskSignalService
+
+
+def original_get_risk_signals(customer_id):
+    """The implementation the service replaced, kept for comparison"""
+    current_time = datetime.now()
+    risk_signals = {
+        "recent_disputes": 0,
+        "device_change": False,
+        "velocity_check": {"last_24h_count": 0, "last_24h_amount": 0.0},
+        "location_risk": {"unusual_country": False, "location_mismatch": False},
+        "account_risk": {"account_age_days": 365, "previous_failures": 0, "suspicious_activity": False},
+        "transaction_pattern": {"unusual_time": False, "unusual_amount": False, "high_risk_merchant": False},
+    }
+    if customer_id == "c_123":
+        risk_signals.update({
+            "recent_disputes": 2,
+            "device_change": True,
+            "velocity_check": {"last_24h_count": 15, "last_24h_amount": 2000.0},
+            "account_risk": {"previous_failures": 3, "suspicious_activity": True},
+        })
+    elif customer_id.startswith("new_"):
+        risk_signals.update({
+            "account_risk": {"account_age_days": 5, "previous_failures": 0},
+            "transaction_pattern": {"unusual_amount": True},
+        })
+    elif customer_id.startswith("intl_"):
+        risk_signals.update({
+            "location_risk": {"unusual_country": True, "location_mismatch": True},
+        })
+    return risk_signals
+
+
+def measure(name, fn, keys):
+    gc.collect()
+    start = time.perf_counter()
+    for key in keys:
+        fn(key)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    kept = [fn(key) for key in keys[:10000]]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    allocated = sum(s.size_diff for s in after.compare_to(before, "filename"))
+    per_call = (allocated - len(kept) * 8) / len(kept)  # minus the list's own pointers
+    return {
+        "case": name,
+        "nsPerCall": round(elapsed / len(keys) * 1e9),
+        "bytesPerCall": round(max(per_call, 0)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--lookups", type=int, default=200000)
+    parser.add_argument("--customers", type=int, default=1000)
+    args = parser.parse_args()
+
+    keys = [f"cust_{i % args.customers}" for i in range(args.lookups)]
+    hot = RiskSignalService(86400, 24, profile_ttl=3600, max_customers=args.customers)
+    for key in keys[:args.customers]:
+        hot.record(key, 10.0, approved=True)
+        hot.get(key)
+    cold = RiskSignalService(86400, 24, profile_ttl=0, max_customers=args.customers)
+    for key in keys[:args.customers]:
+        cold.record(key, 10.0, approved=True)
+    writer = RiskSignalService(86400, 24, profile_ttl=3600, max_customers=args.customers)
+
+    results = [
+        measure("original get_risk_signals", original_get_risk_signals, keys),
+        measure("service get (cache hit)", hot.get, keys),
+        measure("service get (miss, rebuild)", cold.get, keys),
+        measure("service record", lambda key: writer.record(key, 10.0, True), keys),
+    ]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Encode cost per PaymentResponse with 5- and 50-step traces.
+
+"model" is the original path: PaymentResponse(...) with one AgentStep per
+trace dict, then FastAPI's response_model validation and JSON dump, the same
+calls the route made. "lean" is encode_payment_response. Both produce the
+same bytes. Run from backend/:
+
+    python -m benchmarks.serialization --iterations 20000
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from fastapi.routing import serialize_response
+
+from server import app
+from app.models import AgentStep, PaymentResponse
+from app.serialization import encode_payment_response
+
+
+def make_trace(steps):
+    trace = [{"step": "plan", "detail": "Check balance, risk, and limits"},
+             {"step": "tool:getBalance", "detail": "balance=4821.17"}]
+    while len(trace) < steps - 1:
+        trace.append({"step": "tool:getRiskSignals",
+                      "detail": "{'chargebacks': 0, 'velocity': 3, 'country': 'US'}"})
+    trace.append({"step": "tool:recommend", "detail": "allow"})
+    return trace[:steps]
+
+
+def response_field():
+    for route in app.routes:
+        if getattr(route, "path", None) == "/payments/decide":
+            return route.response_field
+    raise LookupError("/payments/decide route not found")
+
+
+async def model_path(field, trace, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        response = PaymentResponse(
+            decision="allow",
+            reasons=["within_limits"],
+            agentTrace=[AgentStep(**s) for s in trace],
+            requestId="req_0123456789ab"
+        )
+        body = await serialize_response(field=field, response_content=response, dump_json=True)
+    return time.perf_counter() - start, body
+
+
+def lean_path(trace, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        body = encode_payment_response("allow", ["within_limits"], trace, "req_0123456789ab")
+    return time.perf_counter() - start, body
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--steps", type=int, nargs="+", default=[5, 50])
+    args = parser.parse_args()
+
+    field = response_field()
+    results = []
+    for steps in args.steps:
+        trace = make_trace(steps)
+        model_seconds, model_body = asyncio.run(model_path(field, trace, args.iterations))
+        lean_seconds, lean_body = lean_path(trace, args.iterations)
+        # Same bytes apart from the timestamps
+        assert len(model_body) == len(lean_body)
+        model_us = model_seconds / args.iterations * 1e6
+        lean_us = lean_seconds / args.iterations * 1e6
+        results.append({
+            "steps": steps,
+            "bytes": len(lean_body),
+            "modelMicros": round(model_us, 2),
+            "leanMicros": round(lean_us, 2),
+            "speedup": round(model_us / lean_us, 1),
+        })
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Shared-memory state benchmark: 1..N worker processes, each calling
+rate_limiter.allow() + store.reserve() for random customers.
+
+"memory" gives every process its own limiter and balances (the default,
+and what uvicorn --workers N does today); "shared_memory" puts both in
+mmap'd tables every process opens. Also checks that a hot key's limit
+holds globally. Run from backend/:
+
+    python -m benchmarks.shared_state --workers 1 2 4 8 --ops 20000
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+
+from app.rate_limiter import SharedTokenBucketRateLimiter, TokenBucketRateLimiter
+from app.store import InMemoryStore, SharedMemoryStore
+
+CUSTOMERS = 10_000
+
+
+def build(backend, directory):
+    if backend == "shared_memory":
+        limiter = SharedTokenBucketRateLimiter(
+            rate=1_000_000, per=1.0, path=os.path.join(directory, "limits.tbl"),
+            slots=1 << 16, stripes=256
+        )
+        store = SharedMemoryStore(os.path.join(directory, "balances.tbl"))
+    else:
+        limiter = TokenBucketRateLimiter(rate=1_000_000, per=1.0)
+        store = InMemoryStore()
+    return limiter, store
+
+
+def worker(backend, directory, ops, start_event, results):
+    logging.getLogger("paynow").setLevel(logging.WARNING)
+    limiter, store = build(backend, directory)
+    rng = random.Random(os.getpid())
+    customers = [f"cust_{rng.randrange(CUSTOMERS)}" for _ in range(ops)]
+    start_event.wait()
+    start = time.monotonic()
+    for customer_id in customers:
+        if limiter.allow(customer_id):
+            store.reserve(customer_id, 0.001)
+    results.put((start, time.monotonic()))
+
+
+def run(backend, workers, ops):
+    ctx = multiprocessing.get_context("fork")
+    with tempfile.TemporaryDirectory(dir="/dev/shm" if os.path.isdir("/dev/shm") else None) as directory:
+        build(backend, directory)  # create the tables before the workers race for them
+        start_event = ctx.Event()
+        results = ctx.Queue()
+        procs = [ctx.Process(target=worker, args=(backend, directory, ops, start_event, results))
+                 for _ in range(workers)]
+        for p in procs:
+            p.start()
+        time.sleep(0.5)
+        start_event.set()
+        spans = [results.get() for _ in procs]
+        for p in procs:
+            p.join()
+    elapsed = max(end for _, end in spans) - min(start for start, _ in spans)
+    return {
+        "backend": backend,
+        "workers": workers,
+        "opsPerWorker": ops,
+        "throughputOpsPerSec": round(workers * ops / elapsed),
+    }
+
+
+def _hammer(directory, backend, attempts, counter):
+    if backend == "shared_memory":
+        limiter = SharedTokenBucketRateLimiter(rate=5, per=60.0, path=os.path.join(directory, "hot.tbl"),
+                                               slots=64, stripes=4)
+    else:
+        limiter = TokenBucketRateLimiter(rate=5, per=60.0)
+    allowed = sum(limiter.allow("hot_customer") for _ in range(attempts))
+    with counter.get_lock():
+        counter.value += allowed
+
+
+def global_limit(backend, workers):
+    """How many of a hot customer's requests get through with a limit of 5/minute"""
+    ctx = multiprocessing.get_context("fork")
+    with tempfile.TemporaryDirectory() as directory:
+        counter = ctx.Value("i", 0)
+        procs = [ctx.Process(target=_hammer, args=(directory, backend, 100, counter))
+                 for _ in range(workers)]
+        for p in procs:
+            p.start()
+        for p in procs:
+            p.join()
+    return {"backend": backend, "workers": workers, "limit": 5, "allowed": counter.value}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--ops", type=int, default=20000)
+    args = parser.parse_args()
+
+    results = [run(backend, n, args.ops)
+               for backend in ("memory", "shared_memory") for n in args.workers]
+    results += [global_limit(backend, max(args.workers)) for backend in ("memory", "shared_memory")]
+    print(json.dumps({"cpus": os.cpu_count(), "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
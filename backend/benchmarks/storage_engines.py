@@ -0,0 +1,67 @@
+"""
+Load test of /payments/decide against each STORAGE_ENGINE.
+
+Uses the in-process driver from decide_modes (async decision mode) with the
+store swapped under the server and agent. Engine files go to a temp dir.
+Run from backend/:
+
+    python -m benchmarks.storage_engines --requests 5000 --concurrency 64
+"""
+import argparse
+import asyncio
+import json
+import logging
+import tempfile
+
+import config as settings
+import server
+from app import agent
+from app.rate_limiter import rate_limiter
+from app.sqlite_store import SQLiteStore
+from app.store import DurableMemoryStore, InMemoryStore, SharedMemoryStore
+from benchmarks.decide_modes import drive
+
+
+def build(engine, directory):
+    if engine == "shared_memory":
+        return SharedMemoryStore(f"{directory}/balances.tbl")
+    if engine == "durable_memory":
+        return DurableMemoryStore(f"{directory}/wal", snapshot_interval=0)
+    if engine == "sqlite":
+        return SQLiteStore(f"{directory}/paynow.db")
+    return InMemoryStore()
+
+
+def run(engine, args):
+    with tempfile.TemporaryDirectory() as directory:
+        store = build(engine, directory)
+        server.store = agent.store = store
+        try:
+            result = asyncio.run(drive("async", args.requests, args.concurrency,
+                                       args.customers, tag=f"_{engine}"))
+        finally:
+            store.close()
+    result["engine"] = engine
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--customers", type=int, default=500)
+    parser.add_argument("--engines", nargs="+",
+                        default=["memory", "shared_memory", "durable_memory", "sqlite"])
+    args = parser.parse_args()
+
+    logging.getLogger("paynow").setLevel(logging.WARNING)
+    rate_limiter.allow = lambda key: True
+    print(json.dumps({
+        "walFsyncPolicy": settings.WAL_FSYNC_POLICY,
+        "sqliteSynchronous": settings.SQLITE_SYNCHRONOUS,
+        "results": [run(engine, args) for engine in args.engines],
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Stream a large NDJSON body through /payments/decide:stream and watch the
+server's memory.
+
+Starts a real uvicorn server in a subprocess (in-process ASGI transports
+buffer the whole response) and talks raw HTTP/1.1 to it, writing the body
+with chunked encoding while reading result lines on the same connection.
+Each payment line is padded with an ignored field to --line-bytes so
+--megabytes of input is reached with a realistic number of decisions.
+Run from backend/:
+
+    python -m benchmarks.streaming --megabytes 1024 --line-bytes 10000
+"""
+import argparse
+import asyncio
+import json
+import socket
+import subprocess
+import sys
+import time
+
+import config as settings
+
+SERVER = """
+import logging, uvicorn, server
+logging.getLogger("paynow").setLevel(logging.WARNING)
+server.rate_limiter.allow = lambda key: True
+uvicorn.run(server.app, host="127.0.0.1", port={port}, log_level="warning")
+"""
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def memory_kb(pid):
+    fields = {}
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            if key in ("VmRSS", "VmHWM"):
+                fields[key] = int(value.split()[0])
+    return fields
+
+
+def payment_line(i, customers, line_bytes):
+    line = json.dumps({
+        "customerId": f"bench_stream_{i % customers}",
+        "amount": 1.0,
+        "currency": "USD",
+        "payeeId": "p_bench",
+        "idempotencyKey": f"bench_stream_{i}",
+        "note": "",
+    })
+    return (line[:-2] + "x" * max(0, line_bytes - len(line) - 1) + '"}\n').encode()
+
+
+async def stream(port, total_bytes, line_bytes, customers, pid):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write((
+        "POST /payments/decide:stream HTTP/1.1\r\n"
+        "Host: bench\r\n"
+        f"X-API-Key: {settings.API_KEY}\r\n"
+        "Content-Type: application/x-ndjson\r\n"
+        "Transfer-Encoding: chunked\r\n\r\n"
+    ).encode())
+    sent = {"bytes": 0, "items": 0}
+    samples = []
+
+    async def send():
+        i = 0
+        while sent["bytes"] < total_bytes:
+            chunk = b"".join(payment_line(i + j, customers, line_bytes) for j in range(16))
+            i += 16
+            writer.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+            await writer.drain()
+            sent["bytes"] += len(chunk)
+            sent["items"] = i
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+    async def sample():
+        while True:
+            samples.append(memory_kb(pid)["VmRSS"])
+            await asyncio.sleep(0.5)
+
+    start = time.perf_counter()
+    sender = asyncio.create_task(send())
+    sampler = asyncio.create_task(sample())
+    results, ok, tail = 0, 0, b""
+    while True:
+        data = await reader.read(1 << 16)
+        if not data:
+            break
+        window = tail + data
+        results += window.count(b'"index":') - tail.count(b'"index":')
+        ok += window.count(b'"status":200') - tail.count(b'"status":200')
+        tail = window[-16:]
+        if data.endswith(b"0\r\n\r\n"):
+            break
+    elapsed = time.perf_counter() - start
+    await sender
+    sampler.cancel()
+    writer.close()
+    return {
+        "inputMegabytes": round(sent["bytes"] / 2**20, 1),
+        "payments": sent["items"],
+        "results": results,
+        "allowed": ok,
+        "seconds": round(elapsed, 1),
+        "paymentsPerSec": round(results / elapsed, 1),
+        "rssSamplesMb": [round(kb / 1024, 1) for kb in samples[::max(1, len(samples) // 10)]],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--megabytes", type=int, default=1024)
+    parser.add_argument("--line-bytes", type=int, default=10000)
+    parser.add_argument("--customers", type=int, default=500)
+    args = parser.parse_args()
+
+    port = free_port()
+    proc = subprocess.Popen([sys.executable, "-c", SERVER.format(port=port)])
+    try:
+        for _ in range(100):
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+                break
+            except OSError:
+                time.sleep(0.1)
+        before = memory_kb(proc.pid)
+        result = asyncio.run(stream(port, args.megabytes * 2**20, args.line_bytes,
+                                    args.customers, proc.pid))
+        after = memory_kb(proc.pid)
+    finally:
+        proc.terminate()
+        proc.wait()
+    result.update({
+        "rssBeforeMb": round(before["VmRSS"] / 1024, 1),
+        "rssAfterMb": round(after["VmRSS"] / 1024, 1),
+        "peakRssMb": round(after["VmHWM"] / 1024, 1),
+        "streamMaxConcurrency": settings.STREAM_MAX_CONCURRENCY,
+        "streamQueueSize": settings.STREAM_QUEUE_SIZE,
+    })
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
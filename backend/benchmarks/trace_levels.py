@@ -0,0 +1,98 @@
+"""
+Response size and throughput of /payments/decide at each trace level.
+
+Drives the ASGI app in-process (async DECISION_MODE, rate limiter disabled)
+with X-Trace-Level set per run. Customers rotate through the simulated risk
+profiles (clean, new_, intl_) so the risk-signal step is representative.
+The AI tier is measured by encoding its trace with an analysis text of
+--analysis-chars, since the live model is not called here. Run from
+backend/:
+
+    python -m benchmarks.trace_levels --requests 5000 --concurrency 64
+"""
+import argparse
+import asyncio
+import json
+import logging
+import statistics
+import time
+
+import httpx
+
+import config as settings
+from server import app
+from app.agent import _summarize
+from app.rate_limiter import rate_limiter
+from app.serialization import encode_payment_response
+
+PROFILES = ("bench", "new_bench", "intl_bench")
+
+
+async def drive(level, total, concurrency, customers):
+    headers = {"X-API-Key": settings.API_KEY, "X-Trace-Level": level}
+    transport = httpx.ASGITransport(app=app)
+    counter = iter(range(total))
+    sizes, latencies = [], []
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def worker():
+            for i in counter:
+                payload = {
+                    "customerId": f"{PROFILES[i % 3]}_trace_{level}_{i % customers}",
+                    "amount": 1.0,
+                    "currency": "USD",
+                    "payeeId": "p_bench",
+                    "idempotencyKey": f"bench_trace_{level}_{i}",
+                }
+                start = time.perf_counter()
+                r = await client.post("/payments/decide", json=payload, headers=headers)
+                latencies.append((time.perf_counter() - start) * 1000)
+                sizes.append(len(r.content))
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    return {
+        "level": level,
+        "meanResponseBytes": round(statistics.mean(sizes)),
+        "reqPerSec": round(total / elapsed, 1),
+        "p50LatencyMs": round(statistics.median(latencies), 2),
+    }
+
+
+def ai_trace_bytes(level, analysis_chars):
+    analysis = ("The customer has a healthy balance and no disputes. " * 100)[:analysis_chars]
+    trace = [
+        {"step": "plan", "detail": "Initiating payment evaluation process"},
+        {"step": "AI analysis", "detail": _summarize(analysis, level)},
+        {"step": "final_decision", "detail": "Decision: allow, Reasons: ['transaction_allowed']"},
+        {"step": "tier", "detail": "ai"},
+    ]
+    body = encode_payment_response("allow", ["transaction_allowed"],
+                                   [] if level == "none" else trace, "req_0123456789ab")
+    return len(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--customers", type=int, default=500)
+    parser.add_argument("--analysis-chars", type=int, default=2000)
+    args = parser.parse_args()
+
+    logging.getLogger("paynow").setLevel(logging.WARNING)
+    rate_limiter.allow = lambda key: True
+    settings.DECISION_MODE = "async"
+
+    results = []
+    for level in ("full", "summary", "none"):
+        result = asyncio.run(drive(level, args.requests, args.concurrency, args.customers))
+        result["aiResponseBytes"] = ai_trace_bytes(level, args.analysis_chars)
+        results.append(result)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Write-ahead log benchmark.
+
+1. Reserve throughput under each fsync policy: N threads reserving for
+   distinct customers through DurableMemoryStore, against the plain
+   InMemoryStore.
+2. Recovery time for a log of --entries balance records: replaying the
+   whole WAL vs loading a snapshot of the same state plus a short tail.
+
+Run from backend/ (the WAL goes to a temp dir on the same disk as /tmp):
+
+    python -m benchmarks.wal --threads 16 --ops 500 --entries 10000000
+"""
+import argparse
+import gc
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+from app.store import DurableMemoryStore, InMemoryStore
+from app.wal import (
+    OP_BALANCE, FSYNC_POLICIES, WriteAheadLog, _BALANCE, _segment_path,
+    encode_record, write_snapshot,
+)
+
+
+def reserve_throughput(policy, threads, ops, directory):
+    if policy == "memory":
+        store = InMemoryStore()
+    else:
+        store = DurableMemoryStore(directory, fsync_policy=policy, snapshot_interval=0)
+    barrier = threading.Barrier(threads + 1)
+
+    def worker(n):
+        customer_id = f"bench_{n}"
+        store.balances[customer_id] = float(ops)
+        barrier.wait()
+        for _ in range(ops):
+            store.reserve(customer_id, 1.0)
+
+    pool = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    for t in pool:
+        t.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - start
+    result = {
+        "policy": policy,
+        "threads": threads,
+        "reservesPerSec": round(threads * ops / elapsed),
+    }
+    if policy != "memory":
+        stats = store.wal.stats()
+        result["fsyncs"] = stats["fsyncs"]
+        result["recordsPerFsync"] = round(stats["records"] / stats["fsyncs"], 1) if stats["fsyncs"] else None
+        store.close()
+    return result
+
+
+def write_log(directory, entries, chunk=100_000):
+    """Write `entries` balance records (one per customer) straight to a segment"""
+    with open(_segment_path(directory, 1), "wb") as f:
+        for base in range(0, entries, chunk):
+            f.write(b"".join(
+                encode_record(OP_BALANCE, f"cust_{i}", _BALANCE.pack(100.0 - i % 100))
+                for i in range(base, min(entries, base + chunk))
+            ))
+
+
+def timed_open(directory):
+    gc.collect()
+    start = time.perf_counter()
+    wal = WriteAheadLog(directory, fsync_policy="none")
+    balances, _ = wal.open()
+    elapsed = time.perf_counter() - start
+    wal.close()
+    return elapsed, balances
+
+
+def recovery(entries, tail):
+    with tempfile.TemporaryDirectory() as directory:
+        write_log(directory, entries)
+        wal_bytes = os.path.getsize(_segment_path(directory, 1))
+        replay_seconds, balances = timed_open(directory)
+        recovered = len(balances)
+
+        # Same state as a snapshot, plus a WAL tail written after it
+        for name in os.listdir(directory):
+            os.remove(os.path.join(directory, name))
+        write_snapshot(os.path.join(directory, "snapshot-00000001.bin"), balances, [])
+        snapshot_bytes = os.path.getsize(os.path.join(directory, "snapshot-00000001.bin"))
+        del balances
+        write_log(directory, tail)
+        snapshot_seconds, balances = timed_open(directory)
+
+    return {
+        "entries": entries,
+        "walBytes": wal_bytes,
+        "walReplaySeconds": round(replay_seconds, 2),
+        "recoveredBalances": recovered,
+        "snapshotBytes": snapshot_bytes,
+        "tailRecords": tail,
+        "snapshotPlusTailSeconds": round(snapshot_seconds, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--ops", type=int, default=500)
+    parser.add_argument("--entries", type=int, default=10_000_000)
+    parser.add_argument("--tail", type=int, default=100_000)
+    args = parser.parse_args()
+
+    logging.getLogger("paynow").setLevel(logging.WARNING)
+    throughput = []
+    for policy in ("memory",) + FSYNC_POLICIES:
+        with tempfile.TemporaryDirectory() as directory:
+            throughput.append(reserve_throughput(policy, args.threads, args.ops, directory))
+    print(json.dumps({"throughput": throughput, "recovery": recovery(args.entries, args.tail)}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,6 @@
 import json
 import os
+import tempfile
 
 #the config.json is ignored, refer to config_sample.json and provide the secrets in that file and rename it to config.json before starting the server
 with open('config.json', "r") as f:
@@ -12,6 +13,16 @@ API_KEY: str = os.getenv("API_KEY", conf["API_KEY"])
 RATE_LIMIT_PER_SECOND = conf.get("RATE_LIMIT_PER_SECOND", 5)
 RATE_LIMIT_WINDOW = conf.get("RATE_LIMIT_WINDOW", 1.0)
 
+# "memory" keeps buckets per process; "shared_memory" shares them across workers on one box
+RATE_LIMIT_BACKEND = conf.get("RATE_LIMIT_BACKEND", "memory")
+
+# Largest batch accepted by /payments/decide:batch
+BATCH_MAX_ITEMS = conf.get("BATCH_MAX_ITEMS", 10000)
+# /payments/decide:stream: decisions in flight, result lines buffered, longest input line
+STREAM_MAX_CONCURRENCY = conf.get("STREAM_MAX_CONCURRENCY", 32)
+STREAM_QUEUE_SIZE = conf.get("STREAM_QUEUE_SIZE", 256)
+STREAM_MAX_LINE_BYTES = conf.get("STREAM_MAX_LINE_BYTES", 65536)
+
 # Payment Thresholds
 MAX_PAYMENT_AMOUNT = conf.get("MAX_PAYMENT_AMOUNT", 1000000.0)
 REVIEW_THRESHOLD = conf.get("REVIEW_THRESHOLD", 100.0)
@@ -20,8 +31,69 @@ REVIEW_THRESHOLD = conf.get("REVIEW_THRESHOLD", 100.0)
 LOCK_TIMEOUT = conf.get("LOCK_TIMEOUT", 5)
 REQUEST_TIMEOUT = conf.get("REQUEST_TIMEOUT", 30)
 
+# Idempotency cache
+IDEMPOTENCY_TTL_SECONDS = conf.get("IDEMPOTENCY_TTL_SECONDS", 24 * 3600)
+IDEMPOTENCY_MAX_ENTRIES = conf.get("IDEMPOTENCY_MAX_ENTRIES", 100000)
+IDEMPOTENCY_MAX_BYTES = conf.get("IDEMPOTENCY_MAX_BYTES", 64 * 1024 * 1024)
+
+# Storage: "memory" (per process), "shared_memory" (balances shared across workers
+# on one box), "durable_memory" (in memory, backed by a write-ahead log) or "sqlite"
+STORAGE_ENGINE = conf.get("STORAGE_ENGINE", "memory")
+# Shared-memory tables are files here; delete them to reset shared state
+SHARED_STATE_DIR = conf.get("SHARED_STATE_DIR", "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir())
+SHARED_BALANCE_SLOTS = conf.get("SHARED_BALANCE_SLOTS", 1 << 20)
+SHARED_RATE_LIMIT_SLOTS = conf.get("SHARED_RATE_LIMIT_SLOTS", 1 << 18)
+SHARED_STATE_STRIPES = conf.get("SHARED_STATE_STRIPES", 256)
+# Write-ahead log: fsync policy is "always", "group" (group commit), "interval" or "none"
+WAL_DIR = conf.get("WAL_DIR", "data/wal")
+WAL_FSYNC_POLICY = conf.get("WAL_FSYNC_POLICY", "group")
+WAL_GROUP_COMMIT_MS = conf.get("WAL_GROUP_COMMIT_MS", 0.0)  # extra wait for a batch to fill
+WAL_FSYNC_INTERVAL = conf.get("WAL_FSYNC_INTERVAL", 1.0)
+SNAPSHOT_INTERVAL_SECONDS = conf.get("SNAPSHOT_INTERVAL_SECONDS", 300)
+# SQLite engine (WAL journal mode, pooled connections)
+SQLITE_PATH = conf.get("SQLITE_PATH", "data/paynow.db")
+SQLITE_POOL_SIZE = conf.get("SQLITE_POOL_SIZE", 8)
+SQLITE_POOL_ACQUIRE_TIMEOUT = conf.get("SQLITE_POOL_ACQUIRE_TIMEOUT", 5.0)  # seconds to wait for a free connection
+SQLITE_BUSY_TIMEOUT_MS = conf.get("SQLITE_BUSY_TIMEOUT_MS", 5000)
+SQLITE_SYNCHRONOUS = conf.get("SQLITE_SYNCHRONOUS", "NORMAL")  # "FULL" fsyncs every commit
+
 # Feature Flags
 USE_AI_AGENT = True if conf.get("USE_AI_AGENT") else False
+# "async" runs the rule-based agent on the event loop, "thread" hops through asyncio.to_thread
+DECISION_MODE = conf.get("DECISION_MODE", "thread")
+# agentTrace verbosity: "none", "summary" (compact risk fields, truncated AI text) or "full"
+TRACE_LEVEL = conf.get("TRACE_LEVEL", "full")
+TRACE_SUMMARY_MAX_CHARS = conf.get("TRACE_SUMMARY_MAX_CHARS", 200)
+
+# Risk signals: rolling per-customer counters over a ring of time buckets
+RISK_VELOCITY_WINDOW_SECONDS = conf.get("RISK_VELOCITY_WINDOW_SECONDS", 86400)
+RISK_VELOCITY_BUCKETS = conf.get("RISK_VELOCITY_BUCKETS", 24)
+# Cached profiles are also dropped whenever the customer's counters change
+RISK_PROFILE_TTL_SECONDS = conf.get("RISK_PROFILE_TTL_SECONDS", 30)
+RISK_MAX_CUSTOMERS = conf.get("RISK_MAX_CUSTOMERS", 100000)
+
+# AI agent pool: clients and executors are built once at startup and reused
+LLM_PROVIDER = conf.get("LLM_PROVIDER", "gemini")  # "gemini" or "stub" (offline)
+AGENT_POOL_SIZE = conf.get("AGENT_POOL_SIZE", 4)
+AGENT_POOL_ACQUIRE_TIMEOUT = conf.get("AGENT_POOL_ACQUIRE_TIMEOUT", 0.5)
+AGENT_POOL_MAX_FAILURES = conf.get("AGENT_POOL_MAX_FAILURES", 3)
+# Agent final answer: "json" (validated verdict object) or "text" (DECISION:/REASONS: lines);
+# answers without a valid decision are decided by the rules
+AI_OUTPUT_FORMAT = conf.get("AI_OUTPUT_FORMAT", "json")
+# LLM calls: jittered exponential backoff within REQUEST_TIMEOUT, then the breaker
+# routes payments to the rules for AI_BREAKER_RESET_SECONDS after repeated failures
+AI_RETRY_MAX_ATTEMPTS = conf.get("AI_RETRY_MAX_ATTEMPTS", 3)
+AI_RETRY_BASE_DELAY = conf.get("AI_RETRY_BASE_DELAY", 0.25)
+AI_RETRY_MAX_DELAY = conf.get("AI_RETRY_MAX_DELAY", 2.0)
+AI_BREAKER_FAILURE_THRESHOLD = conf.get("AI_BREAKER_FAILURE_THRESHOLD", 5)
+AI_BREAKER_RESET_SECONDS = conf.get("AI_BREAKER_RESET_SECONDS", 30)
+# AI verdicts are reused for payments with the same risk features (amount band,
+# balance sufficiency, disputes, velocity band, risk flags, currency); REVIEW_THRESHOLD
+# is always an amount band edge
+AI_DECISION_CACHE_ENABLED = conf.get("AI_DECISION_CACHE_ENABLED", True)
+AI_DECISION_CACHE_TTL_SECONDS = conf.get("AI_DECISION_CACHE_TTL_SECONDS", 300)
+AI_DECISION_CACHE_MAX_ENTRIES = conf.get("AI_DECISION_CACHE_MAX_ENTRIES", 10000)
+AI_DECISION_CACHE_AMOUNT_EDGES = conf.get("AI_DECISION_CACHE_AMOUNT_EDGES", [10, 25, 50, 250, 500, 1000, 5000])
 
 #NOTE: if USE_AI_AGENT is True, then GOOGLE_API_KEY should be provided in config.json
 if USE_AI_AGENT:
@@ -29,6 +101,16 @@ if USE_AI_AGENT:
 # Logging
 LOG_LEVEL = conf.get("LOG_LEVEL", "INFO")
 REDACT_PII = conf.get("REDACT_PII", True)
+# "sync" writes each record inline; "async" queues records for a batching writer thread
+LOG_MODE = conf.get("LOG_MODE", "sync")
+LOG_QUEUE_SIZE = conf.get("LOG_QUEUE_SIZE", 10000)
+LOG_BATCH_SIZE = conf.get("LOG_BATCH_SIZE", 256)
+LOG_FLUSH_INTERVAL = conf.get("LOG_FLUSH_INTERVAL", 0.05)
+# Full queue in async mode: "block" waits up to a second for room, "drop" discards the record
+LOG_OVERFLOW_POLICY = conf.get("LOG_OVERFLOW_POLICY", "block")
+# Per-event sampling rates in [0, 1]; events not listed are always logged
+LOG_SAMPLING = conf.get("LOG_SAMPLING", {})
+LOG_STACK_TRACES_PER_SECOND = conf.get("LOG_STACK_TRACES_PER_SECOND", 5)
 
 class Config:
     env_prefix = "PAYNOW_"
\ No newline at end of file
@@ -1,4 +1,6 @@
+import argparse
 import json
+import logging
 from fastapi.testclient import TestClient
 from server import app
 
@@ -74,5 +76,87 @@ def run_evaluations():
     else:
         console.print("\n[red]Significant issues detected. Please review failed cases.[/red]")
 
+def run_parallel(args):
+    """
+    Decide the cases directly through the agent, args.workers at a time, each
+    against its own in-memory store and risk signals so results do not depend
+    on order. With --cassette the LLM answers are recorded (--record) or
+    replayed offline.
+    """
+    from app.agent import agent_decide, agent_decide_ai, init_agent_pool, shutdown_agent_pool
+    from app.agent_pool import LLM_FACTORIES
+    from app.evaluation import Cassette, CassetteChatModel, run_evaluation
+
+    with open(args.cases) as f:
+        cases = json.load(f)
+    # Per-case logs would swamp the report on large eval sets
+    logging.getLogger("paynow").setLevel(logging.WARNING)
+
+    cassette = None
+    use_ai = settings.USE_AI_AGENT or args.ai
+    if use_ai:
+        factory = LLM_FACTORIES[args.provider or settings.LLM_PROVIDER]
+        if args.cassette:
+            cassette = Cassette(args.cassette, record=args.record)
+            inner = factory if args.record else lambda: None
+            factory = lambda: CassetteChatModel(cassette=cassette, inner=inner())
+        init_agent_pool(llm_factory=factory, size=args.workers)
+
+    try:
+        report = run_evaluation(cases, agent_decide_ai if use_ai else agent_decide, args.workers)
+    finally:
+        if use_ai:
+            shutdown_agent_pool()
+        if cassette:
+            cassette.save()
+
+    summary = report["summary"]
+    if cassette:
+        summary["cassette"] = cassette.stats()
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    failed = [case for case in report["cases"] if not case["passed"]]
+    if failed:
+        table = Table(title=f"Failed cases ({len(failed)} of {summary['total']})")
+        for column, style in (("Test Case", "cyan"), ("Customer", "blue"), ("Amount", "yellow"),
+                              ("Expected", "green"), ("Got", "red"), ("Latency ms", "magenta"),
+                              ("Description", "italic")):
+            table.add_column(column, style=style)
+        for case in failed[:50]:
+            table.add_row(f"#{case['case']}", case["customerId"], f"${case['amount']:.2f}",
+                          case["expected"], case["got"], f"{case['latencyMs']:.1f}",
+                          case["error"] or case["description"])
+        console.print(table)
+
+    latency = summary.get("latencyMs", {})
+    console.print(f"\n[bold]Summary:[/bold]")
+    console.print(f"Total Cases: {summary['total']} ({args.workers} workers, {summary['wallSeconds']:.2f}s)")
+    console.print(f"Passed: {summary['passed']}")
+    console.print(f"Failed: {summary['failed']}")
+    console.print(f"Accuracy: {summary['accuracy']:.2%}")
+    if summary["shortCircuited"]:
+        console.print(f"Sent to the rules by the open circuit breaker (failed): {summary['shortCircuited']}")
+    if latency:
+        console.print(f"Latency ms: p50 {latency['p50']:.1f}, p95 {latency['p95']:.1f}, p99 {latency['p99']:.1f}")
+    if cassette:
+        console.print(f"Cassette: {summary['cassette']}")
+
+
 if __name__ == "__main__":
-    run_evaluations()
+    parser = argparse.ArgumentParser(description="Evaluate payment decisions against expected outcomes")
+    parser.add_argument("--parallel", action="store_true",
+                        help="isolated cases on a worker pool instead of serial requests through the API")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--cases", default="sample_evals.json")
+    parser.add_argument("--ai", action="store_true", help="use the AI agent even if USE_AI_AGENT is off")
+    parser.add_argument("--provider", help="LLM_PROVIDER override, e.g. stub")
+    parser.add_argument("--cassette", help="JSON file of recorded LLM responses")
+    parser.add_argument("--record", action="store_true", help="call the LLM for prompts missing from the cassette")
+    parser.add_argument("--output", help="write the summary and per-case results as JSON")
+    args = parser.parse_args()
+    if args.parallel:
+        run_parallel(args)
+    else:
+        run_evaluations()
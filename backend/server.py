@@ -1,23 +1,48 @@
 from fastapi import FastAPI, Request, Header, HTTPException, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, Response
 import time
-from typing import Optional
+from typing import Literal, Optional, Union
+from contextlib import asynccontextmanager
 import asyncio
 
-from app.models import PaymentRequest, PaymentResponse, AgentStep
+from app.models import PaymentRequest, PaymentResponse
 from app.store import store, LockTimeoutError, TransactionError
-from app.agent import agent_decide, agent_decide_ai
+from app.agent import (
+    agent_decide, agent_decide_async, agent_decide_tiered, visible_trace,
+    init_agent_pool, shutdown_agent_pool, agent_pool_stats, tier_stats, ai_resilience_stats,
+    decision_cache_stats
+)
 from app.rate_limiter import rate_limiter
+from app.risk_signals import risk_signals
+from app.metrics import RequestMetrics, registry
+from app.singleflight import InFlightTable, IdempotencyConflictError
+from app.batch import (
+    BatchFormatError, ItemError, apply_rate_limits, decide_batch, encode_results, item_error, parse_batch
+)
+from app.serialization import EncodedPaymentResponse, encode_payment_response
+from app.streaming import DuplexStreamingResponse, stream_decisions
 from app.utils import (
-    generate_request_id, structured_log, timed_operation,
-    context_logger, redact_customer_id
+    generate_request_id, structured_log, timed_operation, stage_timer,
+    context_logger, redact_customer_id, shutdown_logging
 )
 import config as settings
 import os
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Build the LLM agent pool before taking traffic
+    if settings.USE_AI_AGENT:
+        await asyncio.to_thread(init_agent_pool)
+    yield
+    shutdown_agent_pool()
+    store.close()
+    shutdown_logging()
+
 app = FastAPI(title="PayNow API",
              description="Payment processing API with AI-assisted decision making",
-             version="1.0.0")
+             version="1.0.0",
+             lifespan=lifespan)
 
 # Add CORS middleware
 app.add_middleware(
@@ -29,12 +54,20 @@ app.add_middleware(
 )
 
 # Metrics storage
-metrics = {
-    "totalRequests": 0,
-    "decisionCounts": {},
-    "latencies": [],
-    "errors": {},
-}
+metrics = RequestMetrics()
+inflight = InFlightTable()
+DECISIONS_TOTAL = registry.counter("paynow_decisions_total", "Payment decisions by outcome", ("decision",))
+ERRORS_TOTAL = registry.counter("paynow_errors_total", "Decide failures by exception type", ("error_type",))
+registry.counter("paynow_lock_timeouts_total", "Customer lock acquisitions that timed out",
+                 callback=lambda: store.stats()["lockWait"]["timeouts"])
+registry.gauge("paynow_llm_breaker_open", "1 while the AI agent circuit breaker is open, 0.5 half-open",
+               callback=lambda: {"closed": 0, "half_open": 0.5, "open": 1}[ai_resilience_stats()["breaker"]["state"]])
+registry.counter("paynow_llm_retries_total", "LLM call retries after a failed attempt",
+                 callback=lambda: ai_resilience_stats()["retries"]["retries"])
+registry.counter("paynow_llm_calls_saved_total", "AI decisions answered from the decision cache",
+                 callback=lambda: decision_cache_stats()["llmCallsSaved"])
+registry.counter("paynow_llm_short_circuited_total", "Payments sent to the rules while the breaker was open",
+                 callback=lambda: ai_resilience_stats()["breaker"]["shortCircuited"])
 
 @app.middleware("http")
 async def add_correlation_id(request: Request, call_next):
@@ -58,6 +91,13 @@ async def lock_timeout_handler(request: Request, exc: LockTimeoutError):
         content={"detail": str(exc)}
     )
 
+@app.exception_handler(IdempotencyConflictError)
+async def idempotency_conflict_handler(request: Request, exc: IdempotencyConflictError):
+    return JSONResponse(
+        status_code=status.HTTP_409_CONFLICT,
+        content={"detail": str(exc)}
+    )
+
 @app.exception_handler(TransactionError)
 async def transaction_error_handler(request: Request, exc: TransactionError):
     return JSONResponse(
@@ -65,14 +105,44 @@ async def transaction_error_handler(request: Request, exc: TransactionError):
         content={"detail": str(exc)}
     )
 
+TraceLevelHeader = Optional[Literal["none", "summary", "full"]]
+
+def _apply_trace_level(payment: PaymentRequest, header: Optional[str]):
+    """The X-Trace-Level header applies to payments that do not set traceLevel"""
+    if payment.traceLevel is None and header is not None:
+        payment.traceLevel = header
+
+def _agent_type() -> str:
+    return "ai" if settings.USE_AI_AGENT else f"rules_{settings.DECISION_MODE}"
+
 @app.post("/payments/decide", response_model=PaymentResponse)
 async def decide_payment(
     request: PaymentRequest,
     x_api_key: str = Header(None),
+    x_trace_level: TraceLevelHeader = Header(None),
 ):
+    # Every call is recorded, including cache hits and rejected requests
+    start = time.perf_counter()
+    _apply_trace_level(request, x_trace_level)
+    decision = None
+    try:
+        response = await _decide(request, x_api_key)
+        if isinstance(response, bytes):
+            # Idempotent replay: the cached body is already serialized
+            decision = "cached"
+            return Response(content=response, media_type="application/json")
+        decision = response.decision
+        # Already encoded; returning a Response skips response_model validation
+        return Response(content=response.body, media_type="application/json")
+    finally:
+        metrics.observe_latency((time.perf_counter() - start) * 1000, decision, _agent_type())
+
+async def _decide(request: PaymentRequest, x_api_key: Optional[str]) -> Union[EncodedPaymentResponse, bytes]:
     with timed_operation("decide_payment"):
         # Validate API key
-        if x_api_key != settings.API_KEY:
+        with stage_timer("auth"):
+            authorized = x_api_key == settings.API_KEY
+        if not authorized:
             structured_log("warning", "auth_failed", {
                 "reason": "invalid_api_key"
             })
@@ -82,7 +152,9 @@ async def decide_payment(
             )
 
         # Check rate limit
-        if not rate_limiter.allow(request.customerId):
+        with stage_timer("rate_limit"):
+            allowed = rate_limiter.allow(request.customerId)
+        if not allowed:
             structured_log("warning", "rate_limit_exceeded", {
                 "customer_id": request.customerId
             })
@@ -90,90 +162,235 @@ async def decide_payment(
                 status_code=status.HTTP_429_TOO_MANY_REQUESTS,
                 detail="Rate limit exceeded"
             )
-        idempotency_key = request.idempotencyKey
-        # Check idempotency
-        if idempotency_key:
-            cached = store.get_idempotency(idempotency_key)
-            if cached:
-                return cached
+        return await _decide_item(request)
 
-        request_id = generate_request_id()
-        structured_log("info", "payment_request_received", {
-            "request_id": request_id,
-            "customer_id": request.customerId,
-            "amount": str(request.amount),
-            "currency": request.currency
-        })
+async def _decide_item(request: PaymentRequest) -> Union[EncodedPaymentResponse, bytes]:
+    """Idempotency lookup, then decide (coalescing concurrent duplicates)"""
+    idempotency_key = request.idempotencyKey
+    # Check idempotency
+    if idempotency_key:
+        with stage_timer("idempotency_lookup"):
+            cached = await store.get_idempotency_async(idempotency_key)
+        if cached:
+            return cached
+        # Concurrent duplicates share the first request's computation
+        return await inflight.run(
+            idempotency_key,
+            _fingerprint(request),
+            lambda: _process(request, idempotency_key)
+        )
+    return await _process(request, idempotency_key)
+
+@app.post("/payments/decide:batch")
+async def decide_payment_batch(
+    request: Request,
+    x_api_key: str = Header(None),
+    x_trace_level: TraceLevelHeader = Header(None),
+):
+    """
+    Decide a JSON array (or NDJSON body) of payments in one round trip.
+    Results come back in input order, each with its own status; one bad item
+    does not fail the rest.
+    """
+    start = time.perf_counter()
+    with timed_operation("decide_batch"):
+        with stage_timer("auth"):
+            authorized = x_api_key == settings.API_KEY
+        if not authorized:
+            structured_log("warning", "auth_failed", {
+                "reason": "invalid_api_key"
+            })
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Invalid API key"
+            )
 
         try:
-            # Use AI agent if enabled, otherwise use regular agent
-            agent = agent_decide_ai if settings.USE_AI_AGENT else agent_decide
-            decision, reasons, trace = await asyncio.to_thread(agent, request)
-
-            response = PaymentResponse(
-                decision=decision,
-                reasons=reasons,
-                agentTrace=[AgentStep(**s) for s in trace],
-                requestId=request_id
+            items = parse_batch(await request.body(), request.headers.get("content-type", ""))
+        except BatchFormatError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        if len(items) > settings.BATCH_MAX_ITEMS:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"Batch exceeds {settings.BATCH_MAX_ITEMS} items"
             )
+        structured_log("info", "payment_batch_received", {"items": len(items)})
+        for item in items:
+            if isinstance(item, PaymentRequest):
+                _apply_trace_level(item, x_trace_level)
 
-            if idempotency_key:
-                store.save_idempotency(idempotency_key, response)
-
-            # Update metrics
-            metrics["totalRequests"] += 1
-            metrics["decisionCounts"][decision] = metrics["decisionCounts"].get(decision, 0) + 1
-            
-            # Log decision event
-            structured_log("info", "payment.decided", {
-                "request_id": request_id,
-                "decision": decision,
-                "reasons": reasons,
-                "customer_id": request.customerId
-            })
+        # Payments that passed validation count as requests, as on /payments/decide
+        payments = [i for i, item in enumerate(items) if isinstance(item, PaymentRequest)]
+        with stage_timer("rate_limit"):
+            apply_rate_limits(items, rate_limiter)
+        # One thread hop for the whole batch instead of one per payment
+        results, decisions, labels, errors = await asyncio.to_thread(
+            decide_batch, items, store, inflight, _fingerprint
+        )
 
-            return response
+        for decision in decisions:
+            metrics.record_decision(decision)
+            DECISIONS_TOTAL.labels(decision).inc()
+        for error_type in errors:
+            metrics.record_error(error_type)
+            ERRORS_TOTAL.labels(error_type).inc()
+        with stage_timer("serialization"):
+            content = encode_results(results)
+    # Each payment waited for the whole batch
+    latency_ms = (time.perf_counter() - start) * 1000
+    agent_type = _agent_type()
+    for i in payments:
+        metrics.observe_latency(latency_ms, labels[i], agent_type)
+    return Response(content=content, media_type="application/json")
 
+@app.post("/payments/decide:stream")
+async def decide_payment_stream(
+    request: Request,
+    x_api_key: str = Header(None),
+    x_trace_level: TraceLevelHeader = Header(None),
+):
+    """
+    Decide an NDJSON stream of payments, reading the body incrementally and
+    streaming one result line per payment as each completes. Concurrency,
+    buffered output and line length are bounded by the STREAM_* settings.
+    """
+    with stage_timer("auth"):
+        authorized = x_api_key == settings.API_KEY
+    if not authorized:
+        structured_log("warning", "auth_failed", {
+            "reason": "invalid_api_key"
+        })
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Invalid API key"
+        )
+
+    async def decide(payment: PaymentRequest) -> Union[bytes, ItemError]:
+        _apply_trace_level(payment, x_trace_level)
+        try:
+            result = await _decide_item(payment)
+        except HTTPException as e:
+            return ItemError(e.status_code, e.detail)
         except Exception as e:
-            metrics["errors"][type(e).__name__] = metrics["errors"].get(type(e).__name__, 0) + 1
-            
-            # Get exception info including traceback
-            import sys
-            exc_info = sys.exc_info()
-            
-            structured_log("error", "payment_processing_failed", {
-                "request_id": request_id,
-                "error": str(e),
-                "error_type": type(e).__name__,
-                "traceback": True,  # This signals to structured_log to include traceback
-                "exc_info": exc_info
-            })
+            return item_error(e)
+        return result if isinstance(result, bytes) else result.body
+
+    return DuplexStreamingResponse(
+        request,
+        lambda body: stream_decisions(
+            body, decide, rate_limiter,
+            max_concurrency=settings.STREAM_MAX_CONCURRENCY,
+            queue_size=settings.STREAM_QUEUE_SIZE,
+            max_line_bytes=settings.STREAM_MAX_LINE_BYTES
+        ),
+        media_type="application/x-ndjson"
+    )
+
+def _fingerprint(request: PaymentRequest):
+    """Cheap identity of a payment body, used to reject reused idempotency keys"""
+    return (request.customerId, request.amount, request.currency, request.payeeId)
+
+async def _process(request: PaymentRequest, idempotency_key: Optional[str]) -> Union[EncodedPaymentResponse, bytes]:
+    if idempotency_key:
+        # A request for this key may have finished between the lookup and
+        # becoming the in-flight leader; its result is cached before it leaves
+        cached = await store.get_idempotency_async(idempotency_key)
+        if cached:
+            return cached
+
+    request_id = generate_request_id()
+    structured_log("info", "payment_request_received", {
+        "request_id": request_id,
+        "customer_id": request.customerId,
+        "amount": str(request.amount),
+        "currency": request.currency
+    })
 
-            # Handle validation errors specifically
-            if "ValidationError" in type(e).__name__:
-                raise HTTPException(
-                    status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
-                    detail=f"Validation error: {str(e)}"
-                )
-            
+    try:
+        # With the AI agent enabled, clear-cut cases are still decided by the
+        # rules tier; only escalations do blocking work in the thread pool.
+        if settings.USE_AI_AGENT:
+            decision, reasons, trace = await agent_decide_tiered(request)
+        elif settings.DECISION_MODE == "async":
+            decision, reasons, trace = await agent_decide_async(request)
+        else:
+            decision, reasons, trace = await asyncio.to_thread(agent_decide, request)
+
+        with stage_timer("serialization"):
+            response = EncodedPaymentResponse(
+                decision, encode_payment_response(decision, reasons, visible_trace(request, trace), request_id))
+
+        if idempotency_key:
+            await store.save_idempotency_async(idempotency_key, response.body)
+
+        # Update metrics
+        metrics.record_decision(decision)
+        DECISIONS_TOTAL.labels(decision).inc()
+        
+        # Log decision event
+        structured_log("info", "payment.decided", {
+            "request_id": request_id,
+            "decision": decision,
+            "reasons": reasons,
+            "customer_id": request.customerId
+        })
+
+        return response
+
+    except Exception as e:
+        metrics.record_error(type(e).__name__)
+        ERRORS_TOTAL.labels(type(e).__name__).inc()
+        
+        # Get exception info including traceback
+        import sys
+        exc_info = sys.exc_info()
+        
+        structured_log("error", "payment_processing_failed", {
+            "request_id": request_id,
+            "error": str(e),
+            "error_type": type(e).__name__,
+            "traceback": True,  # This signals to structured_log to include traceback
+            "exc_info": exc_info
+        })
+
+        # Handle validation errors specifically
+        if "ValidationError" in type(e).__name__:
             raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="An error occurred processing the payment"
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=f"Validation error: {str(e)}"
             )
+        
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="An error occurred processing the payment"
+        )
 
 @app.get("/metrics")
 def get_metrics():
-    latencies = sorted(metrics["latencies"])
-    p95 = 0
-    if latencies:
-        idx = int(len(latencies) * 0.95) - 1
-        p95 = latencies[max(idx, 0)]
+    snapshot = metrics.snapshot()
+    storage = store.stats()
     return {
-        "totalRequests": metrics["totalRequests"],
-        "decisionCounts": metrics["decisionCounts"],
-        "p95LatencyMs": p95
+        "totalRequests": snapshot["totalRequests"],
+        "decisionCounts": snapshot["decisionCounts"],
+        "errors": snapshot["errors"],
+        "p95LatencyMs": snapshot["latencyMs"]["all"]["5m"]["p95"] or 0,
+        "latencyMs": snapshot["latencyMs"],
+        "storageEngine": storage["engine"],
+        "lockWait": storage["lockWait"],
+        "agentPool": agent_pool_stats(),
+        "tierCounts": tier_stats(),
+        "aiResilience": ai_resilience_stats(),
+        "aiDecisionCache": decision_cache_stats(),
+        "idempotencyInFlight": inflight.stats(),
+        "idempotencyCache": storage["idempotencyCache"],
+        "riskSignals": risk_signals.stats()
     }
 
+@app.get("/metrics/prometheus", response_class=PlainTextResponse)
+def get_prometheus_metrics():
+    """Counters, gauges and stage timers in Prometheus text exposition format"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
 
 
 if __name__ == "__main__":
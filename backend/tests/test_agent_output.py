@@ -0,0 +1,110 @@
+import config as settings
+from app.agent import agent_decide_ai, init_agent_pool, parse_verdict, shutdown_agent_pool
+from app.agent_pool import build_stub_llm
+from app.models import PaymentRequest
+from app.serialization import encode_payment_response
+
+
+def test_json_verdicts_are_validated_against_the_enums():
+    assert parse_verdict('{"decision": "allow", "reasons": ["transaction_allowed"]}') == \
+        ("allow", ["transaction_allowed"])
+    fenced = '```json\n{"decision": "block", "reasons": ["insufficient_balance", "insufficient_balance"]}\n```'
+    assert parse_verdict(fenced) == ("block", ["insufficient_balance"])
+    assert parse_verdict('{"decision": "review", "reasons": []}') == ("review", ["flagged_suspicious"])
+
+    assert parse_verdict('{"decision": "approve", "reasons": []}') is None
+    assert parse_verdict('{"reasons": ["transaction_allowed"]}') is None
+    assert parse_verdict('{"decision": "allow"') is None
+    assert parse_verdict("DECISION: allow") is None
+
+
+def test_unknown_reasons_are_dropped_and_the_decision_kept():
+    """Escalated payments carry risk flags the model tends to repeat as reasons"""
+    answer = '{"decision": "review", "reasons": ["unusual_country", "device_change", "Recent_Disputes"]}'
+    assert parse_verdict(answer) == ("review", ["recent_disputes"])
+    assert parse_verdict('{"decision": "review", "reasons": ["new_account"]}') == ("review", ["flagged_suspicious"])
+    assert parse_verdict('{"decision": "allow", "reasons": ["looks_fine"]}') == ("allow", ["transaction_allowed"])
+
+
+def test_text_verdicts_find_the_decision_case_insensitively(monkeypatch):
+    monkeypatch.setattr(settings, "AI_OUTPUT_FORMAT", "text")
+    assert parse_verdict("DECISION: allow\nREASONS: none") == ("allow", ["transaction_allowed"])
+    assert parse_verdict("decision: **BLOCK**\nreasons: Insufficient_Balance, high_velocity") == \
+        ("block", ["insufficient_balance", "high_transaction_velocity"])
+    assert parse_verdict("I think this one is fine") is None
+
+
+def make_payment(customer_id, key):
+    return PaymentRequest(customerId=customer_id, amount=10.0, currency="USD",
+                          payeeId="p_1", idempotencyKey=key)
+
+
+def test_malformed_answer_falls_back_to_the_rules(monkeypatch):
+    monkeypatch.setattr(settings, "AI_DECISION_CACHE_ENABLED", False)
+    init_agent_pool(llm_factory=lambda: build_stub_llm(["Final Answer: probably fine?"]), size=1)
+    try:
+        decision, reasons, trace = agent_decide_ai(make_payment("intl_output_1", "output_1"))
+    finally:
+        shutdown_agent_pool()
+    assert (decision, reasons) == ("allow", ["transaction_allowed"])
+    assert {"step": "fallback", "detail": "AI agent output malformed, used rule-based agent"} in trace
+
+
+def test_allow_verdict_is_no_longer_turned_into_review(monkeypatch):
+    monkeypatch.setattr(settings, "AI_DECISION_CACHE_ENABLED", False)
+    answer = 'Final Answer: {"decision": "allow", "reasons": ["transaction_allowed"]}'
+    init_agent_pool(llm_factory=lambda: build_stub_llm([answer]), size=1)
+    try:
+        decision, reasons, trace = agent_decide_ai(make_payment("intl_output_2", "output_2"))
+    finally:
+        shutdown_agent_pool()
+    assert (decision, reasons) == ("allow", ["transaction_allowed"])
+    assert trace[-2]["detail"] == "Decision: allow, Reasons: ['transaction_allowed']"
+
+
+def test_review_citing_risk_flags_is_not_replaced_by_the_rules(monkeypatch):
+    monkeypatch.setattr(settings, "AI_DECISION_CACHE_ENABLED", False)
+    answer = 'Final Answer: {"decision": "review", "reasons": ["unusual_country", "new_account"]}'
+    init_agent_pool(llm_factory=lambda: build_stub_llm([answer]), size=1)
+    try:
+        decision, reasons, trace = agent_decide_ai(make_payment("intl_output_3", "output_3"))
+    finally:
+        shutdown_agent_pool()
+    assert (decision, reasons) == ("review", ["flagged_suspicious"])
+    assert not any(step["step"] == "fallback" for step in trace)
+
+
+def test_empty_answer_falls_back_with_a_valid_trace(monkeypatch):
+    monkeypatch.setattr(settings, "AI_DECISION_CACHE_ENABLED", False)
+    init_agent_pool(llm_factory=lambda: build_stub_llm(["Final Answer: "]), size=1)
+    try:
+        decision, reasons, trace = agent_decide_ai(make_payment("intl_output_4", "output_4"))
+    finally:
+        shutdown_agent_pool()
+    assert (decision, reasons) == ("allow", ["transaction_allowed"])
+    assert all(step["detail"] for step in trace)
+    encode_payment_response(decision, reasons, trace, "req_04")
+
+
+class RecordingExecutor:
+    def __init__(self):
+        self.prompts = []
+
+    def run(self, prompt):
+        self.prompts.append(prompt)
+        return '{"decision": "review", "reasons": ["amount_above_daily_threshold"]}'
+
+
+def test_prompt_uses_the_configured_review_threshold(monkeypatch):
+    monkeypatch.setattr(settings, "AI_DECISION_CACHE_ENABLED", False)
+    monkeypatch.setattr(settings, "REVIEW_THRESHOLD", 250.0)
+    pool = init_agent_pool(llm_factory=build_stub_llm, size=1)
+    executor = RecordingExecutor()
+    try:
+        worker = pool.acquire(timeout=0)
+        worker.executor = executor
+        pool.release(worker)
+        agent_decide_ai(make_payment("intl_output_5", "output_5"))
+    finally:
+        shutdown_agent_pool()
+    assert "If payment > 250.0: REVIEW" in executor.prompts[0]
@@ -0,0 +1,115 @@
+import asyncio
+import threading
+import time
+
+import app.agent as agent
+import config as settings
+from app.agent import (
+    agent_decide_ai, agent_decide_tiered, init_agent_pool, shutdown_agent_pool, tier_stats
+)
+from app.agent_pool import AgentPool, build_stub_llm
+from app.models import PaymentRequest
+
+
+def make_payment(customer_id, amount=20.0):
+    return PaymentRequest(customerId=customer_id, amount=amount, currency="USD",
+                          payeeId="p_1", idempotencyKey=f"pool_{customer_id}")
+
+
+def test_pooled_agent_reuses_workers(monkeypatch):
+    """Executors are built once at startup and reused across payments"""
+    monkeypatch.setattr(settings, "AI_DECISION_CACHE_ENABLED", False)
+    builds = []
+
+    def factory():
+        builds.append(1)
+        return build_stub_llm()
+
+    pool = init_agent_pool(llm_factory=factory, size=2)
+    try:
+        for i in range(5):
+            decision, reasons, trace = agent_decide_ai(make_payment(f"pool_c{i}"))
+            assert decision == "review"
+            assert any(step["step"] == "AI analysis" for step in trace)
+        assert len(builds) == 2
+        assert pool.stats()["leased"] == 5
+    finally:
+        shutdown_agent_pool()
+
+
+def test_exhausted_pool_falls_back_to_rules():
+    """When no worker can be leased the rule-based agent decides"""
+    pool = init_agent_pool(llm_factory=build_stub_llm, size=1)
+    try:
+        leased = pool.acquire(timeout=0)
+        decision, reasons, trace = agent_decide_ai(make_payment("pool_fallback"))
+        pool.release(leased)
+        assert decision == "allow"
+        assert trace[0]["step"] == "fallback"
+        assert pool.stats()["exhausted"] == 1
+    finally:
+        shutdown_agent_pool()
+
+
+def test_lazy_pool_is_built_off_the_event_loop(monkeypatch):
+    monkeypatch.setattr(settings, "AI_DECISION_CACHE_ENABLED", False)
+    monkeypatch.setattr(agent, "_agent_pool", None)
+    builders = []
+
+    def recording_init():
+        builders.append(threading.current_thread())
+        return init_agent_pool(llm_factory=build_stub_llm, size=1)
+
+    monkeypatch.setattr(agent, "init_agent_pool", recording_init)
+    try:
+        decision, _, _ = asyncio.run(agent.agent_decide_ai_async(make_payment("pool_lazy")))
+    finally:
+        shutdown_agent_pool()
+    assert decision == "review"
+    assert builders and threading.current_thread() not in builders
+
+
+def test_failing_worker_is_retired_and_rebuilt_off_the_caller():
+    building = threading.Event()
+    built = []
+
+    def build_executor():
+        if built:
+            building.wait(5)  # a slow client for the replacement
+        built.append(1)
+        return object()
+
+    pool = AgentPool(1, build_executor=build_executor, max_failures=2)
+    pool.start()
+    worker = pool.acquire(timeout=0)
+    pool.release(worker, ok=False)
+    worker = pool.acquire(timeout=0)
+    start = time.monotonic()
+    pool.release(worker, ok=False)
+    assert time.monotonic() - start < 1  # release() does not wait for the build
+    building.set()
+    replacement = pool.acquire(timeout=5)
+    assert replacement is not worker
+    assert pool.stats()["rebuilt"] == 1
+    pool.shutdown()
+
+
+def test_tiered_pipeline_only_escalates_risky_payments():
+    """Clean accounts are decided by the rules; risk signals escalate to the AI tier"""
+    init_agent_pool(llm_factory=build_stub_llm, size=1)
+    try:
+        before = tier_stats()
+        decision, _, trace = asyncio.run(agent_decide_tiered(make_payment("tier_clean", 10.0)))
+        assert decision == "allow"
+        assert {"step": "tier", "detail": "rules"} in trace
+
+        decision, _, trace = asyncio.run(agent_decide_tiered(make_payment("intl_tier", 10.0)))
+        assert decision == "review"
+        assert any(step["step"] == "escalate" for step in trace)
+        assert {"step": "tier", "detail": "ai"} in trace
+
+        after = tier_stats()
+        assert after["rules"] == before["rules"] + 1
+        assert after["ai"] == before["ai"] + 1
+    finally:
+        shutdown_agent_pool()
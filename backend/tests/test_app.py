@@ -65,6 +65,12 @@ def test_input_validation(api_headers):
     r = client.post("/payments/decide", json=invalid_request, headers=api_headers)
     assert r.status_code == 422
 
+    # Test sub-cent amounts, which would debit nothing
+    for amount in (0.004, 10.005):
+        invalid_request["amount"] = amount
+        r = client.post("/payments/decide", json=invalid_request, headers=api_headers)
+        assert r.status_code == 422
+
     # Test invalid currency
     invalid_request["amount"] = 50.00
     invalid_request["currency"] = "INVALID"
@@ -180,4 +186,43 @@ def test_concurrent_requests(api_headers):
     # Check that all requests were processed
     assert len(responses) == 5
     # Check that at least one request succeeded
-    assert any(r.status_code == 200 for r in responses)
\ No newline at end of file
+    assert any(r.status_code == 200 for r in responses)
+
+def test_async_decision_matches_threaded():
+    """The async rule agent should reach the same decisions as agent_decide"""
+    from app.agent import agent_decide, agent_decide_async
+    from app.models import PaymentRequest
+
+    for customer_id, amount in [("async_c1", 50.0), ("async_c2", 150.0), ("async_c3", 500.0)]:
+        payment = PaymentRequest(customerId=customer_id, amount=amount, currency="USD",
+                                 payeeId="p_1", idempotencyKey=f"k_{customer_id}")
+        sync_decision, sync_reasons, _ = agent_decide(payment)
+        # A fresh account with the same starting balance for the async run
+        payment = payment.model_copy(update={"customerId": f"{customer_id}_async"})
+        async_decision, async_reasons, _ = asyncio.run(agent_decide_async(payment))
+        assert (sync_decision, sync_reasons) == (async_decision, async_reasons)
+
+def test_trace_levels(api_headers):
+    """traceLevel in the body wins over X-Trace-Level, which wins over config"""
+    def decide(key, headers=None, **fields):
+        payment = {"customerId": f"new_trace_{key}", "amount": 5.0, "currency": "USD",
+                   "payeeId": "p_1", "idempotencyKey": f"trace_{key}", **fields}
+        r = client.post("/payments/decide", json=payment, headers={**api_headers, **(headers or {})})
+        assert r.status_code == 200
+        return {s["step"]: s["detail"] for s in r.json()["agentTrace"]}
+
+    full = decide("default")
+    assert full["tool:getRiskSignals"].startswith("{")
+
+    summary = decide("summary", {"X-Trace-Level": "summary"})
+    assert summary["tool:getRiskSignals"] == (
+        "disputes=0 velocity_24h=0 account_age_days=5 flags=new_account,unusual_amount"
+    )
+    assert summary.keys() == full.keys()
+
+    assert decide("none", {"X-Trace-Level": "summary"}, traceLevel="none") == {}
+
+    payment = {"customerId": "new_trace_bad", "amount": 5.0, "currency": "USD",
+               "payeeId": "p_1", "idempotencyKey": "trace_bad"}
+    r = client.post("/payments/decide", json=payment, headers={**api_headers, "X-Trace-Level": "loud"})
+    assert r.status_code == 422
@@ -0,0 +1,70 @@
+import json
+
+from fastapi.testclient import TestClient
+
+import config as settings
+import server
+from app.store import store
+
+client = TestClient(server.app)
+HEADERS = {"X-API-Key": settings.API_KEY}
+
+
+def payment(customer_id, key, amount=10.0):
+    return {"customerId": customer_id, "amount": amount, "currency": "USD",
+            "payeeId": "p_batch", "idempotencyKey": key}
+
+
+def test_batch_results_are_ordered_with_partial_failures():
+    cached = client.post("/payments/decide", json=payment("batch_c0", "batch_k0"), headers=HEADERS).json()
+    items = [
+        payment("batch_c1", "batch_k1", 60.0),
+        {"customerId": "batch_c1", "amount": -5},        # invalid
+        payment("batch_c1", "batch_k2", 60.0),           # exceeds the remaining balance
+        payment("batch_c1", "batch_k1", 60.0),           # repeated key, same body
+        payment("batch_c2", "batch_k1", 1.0),            # repeated key, different body
+        payment("batch_c0", "batch_k0"),                 # cached from the single endpoint
+    ]
+    r = client.post("/payments/decide:batch", json=items, headers=HEADERS)
+    assert r.status_code == 200
+    results = r.json()["results"]
+    assert [x["index"] for x in results] == list(range(len(items)))
+    assert [x["status"] for x in results] == [200, 422, 200, 200, 409, 200]
+    assert results[0]["response"]["decision"] == "allow"
+    assert results[2]["response"]["reasons"] == ["insufficient_balance"]
+    assert results[3]["response"] == results[0]["response"]
+    assert results[5]["response"] == cached
+    assert store.get_balance("batch_c1") == 40.0
+
+
+def test_ndjson_batch_takes_each_customer_lock_once(monkeypatch):
+    acquired = []
+    original = store.lock_manager.acquire
+
+    def counting_acquire(customer_id, timeout=None):
+        acquired.append(customer_id)
+        return original(customer_id, timeout)
+
+    monkeypatch.setattr(store.lock_manager, "acquire", counting_acquire)
+    lines = [payment(f"nd_c{i % 2}", f"nd_k{i}", 1.0) for i in range(6)]
+    body = "\n".join(json.dumps(p) for p in lines) + "\nnot json\n"
+    r = client.post("/payments/decide:batch", content=body,
+                    headers={**HEADERS, "Content-Type": "application/x-ndjson"})
+    statuses = [x["status"] for x in r.json()["results"]]
+    assert statuses == [200] * 6 + [400]
+    assert sorted(acquired) == ["nd_c0", "nd_c1"]
+
+
+def test_batch_requires_a_json_array():
+    r = client.post("/payments/decide:batch", json={"not": "a list"}, headers=HEADERS)
+    assert r.status_code == 400
+
+
+def test_each_batch_item_spends_a_rate_limit_token_and_is_measured():
+    count = lambda: server.metrics.snapshot()["latencyMs"]["all"]["5m"]["count"]
+    before = count()
+    items = [payment("batch_rl", f"batch_rl_k{i}", 1.0) for i in range(settings.RATE_LIMIT_PER_SECOND + 2)]
+    r = client.post("/payments/decide:batch", json=items, headers=HEADERS)
+    statuses = [x["status"] for x in r.json()["results"]]
+    assert statuses == [200] * settings.RATE_LIMIT_PER_SECOND + [429, 429]
+    assert count() == before + len(items)
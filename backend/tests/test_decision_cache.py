@@ -0,0 +1,53 @@
+import time
+
+import app.agent as agent
+from app.agent import agent_decide_ai, init_agent_pool, shutdown_agent_pool
+from app.agent_pool import build_stub_llm
+from app.decision_cache import DecisionCache
+from app.models import PaymentRequest
+from app.store import store
+
+
+def make_payment(customer_id, amount, key):
+    return PaymentRequest(customerId=customer_id, amount=amount, currency="USD",
+                          payeeId="p_1", idempotencyKey=key)
+
+
+def test_cache_expires_and_evicts_least_recently_used():
+    cache = DecisionCache(max_entries=2, ttl=0.05, amount_edges=[10, 100])
+    assert [cache.amount_bucket(a) for a in (5, 10, 10.01, 100, 100.01)] == [0, 0, 1, 1, 2]
+
+    cache.set("a", "allow", ["transaction_allowed"])
+    cache.set("b", "review", ["recent_disputes"])
+    assert cache.get("a") == ("allow", ("transaction_allowed",))
+    cache.set("c", "block", ["transaction_blocked"])  # evicts b, the least recently used
+    assert cache.get("b") is None
+    time.sleep(0.06)
+    assert cache.get("a") is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["evictions"], stats["expirations"]) == (1, 2, 1, 1)
+
+
+def test_matching_risk_features_reuse_the_verdict_but_not_the_side_effects(monkeypatch):
+    """Payments with the same features share one agent run; each still creates its own case"""
+    monkeypatch.setattr(agent, "ai_decision_cache",
+                        DecisionCache(max_entries=100, ttl=60, amount_edges=[10, 50]))
+    pool = init_agent_pool(llm_factory=build_stub_llm, size=1)
+    try:
+        cases_before = len(store.cases)
+        first = agent_decide_ai(make_payment("intl_cache_a", 20.0, "cache_1"))
+        second = agent_decide_ai(make_payment("intl_cache_b", 30.0, "cache_2"))
+        # A different amount band is a different key
+        third = agent_decide_ai(make_payment("intl_cache_c", 60.0, "cache_3"))
+        leased = pool.stats()["leased"]
+    finally:
+        shutdown_agent_pool()
+
+    assert first[0] == second[0] == "review"
+    assert {"step": "decision_cache", "detail": "reused AI verdict for matching risk features"} in second[2]
+    assert not any(step["step"] == "decision_cache" for step in third[2])
+    assert leased == 2  # one agent run per distinct key
+    assert len(store.cases) == cases_before + 3
+    stats = agent.decision_cache_stats()
+    assert stats["llmCallsSaved"] == 1
+    assert stats["hitRate"] == round(1 / 3, 4)
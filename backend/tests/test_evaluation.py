@@ -0,0 +1,72 @@
+import app.agent as agent
+import config as settings
+from app.agent import agent_decide, agent_decide_ai, init_agent_pool, shutdown_agent_pool
+from app.agent_pool import build_stub_llm
+from app.evaluation import Cassette, CassetteChatModel, run_evaluation
+from app.store import store
+
+
+def case(customer_id, amount, expected):
+    return {"input": {"customerId": customer_id, "amount": amount, "currency": "USD",
+                      "payeeId": "p_1", "idempotencyKey": f"eval_{customer_id}_{amount}"},
+            "expected": expected}
+
+
+def test_cases_are_isolated_from_each_other_and_the_shared_store():
+    """Each case starts from the seed balances, whatever ran before or alongside it"""
+    before = store.get_balance("c_456")
+    cases = [case("c_456", 100.0, "allow") for _ in range(6)]
+    report = run_evaluation(cases, agent_decide, workers=3)
+    assert report["summary"]["accuracy"] == 1.0
+    assert [result["case"] for result in report["cases"]] == list(range(1, 7))
+    assert all(result["latencyMs"] >= 0 for result in report["cases"])
+    assert store.get_balance("c_456") == before
+
+
+def test_recorded_llm_answers_replay_offline(tmp_path):
+    """A cassette recorded against the model replays the same decisions without it"""
+    react = [
+        "Thought: check the balance\nAction: get_balance\nAction Input: c_456",
+        'Thought: done\nFinal Answer: {"decision": "review", "reasons": ["flagged_suspicious"]}',
+    ]
+    cases = [case("c_456", 40.0, "review"), case("new_eval", 30.0, "review")]
+    path = str(tmp_path / "cassette.json")
+
+    recorder = Cassette(path, record=True)
+    init_agent_pool(llm_factory=lambda: CassetteChatModel(cassette=recorder, inner=build_stub_llm(react)),
+                    size=1)
+    try:
+        recorded = run_evaluation(cases, agent_decide_ai, workers=1)
+    finally:
+        shutdown_agent_pool()
+    recorder.save()
+    # Two model calls per case: the tool step and the final answer
+    assert recorder.stats()["recorded"] == 4
+
+    player = Cassette(path)
+    init_agent_pool(llm_factory=lambda: CassetteChatModel(cassette=player), size=2)
+    try:
+        replayed = run_evaluation(cases, agent_decide_ai, workers=2)
+    finally:
+        shutdown_agent_pool()
+    assert player.stats()["misses"] == 0
+    assert player.stats()["hits"] == 4
+    assert [r["got"] for r in replayed["cases"]] == [r["got"] for r in recorded["cases"]]
+
+
+def test_a_run_has_its_own_breaker_and_short_circuited_cases_fail(tmp_path, monkeypatch):
+    """Cassette misses open the run's breaker, not the server's; later cases fail"""
+    monkeypatch.setattr(settings, "AI_BREAKER_FAILURE_THRESHOLD", 2)
+    monkeypatch.setattr(settings, "AI_DECISION_CACHE_ENABLED", True)
+    empty = Cassette(str(tmp_path / "empty.json"))
+    init_agent_pool(llm_factory=lambda: CassetteChatModel(cassette=empty), size=1)
+    try:
+        report = run_evaluation([case(f"c_breaker_{i}", 10.0, "allow") for i in range(4)],
+                                agent_decide_ai, workers=1)
+    finally:
+        shutdown_agent_pool()
+    short = [result for result in report["cases"] if result["error"] == "AI agent circuit open"]
+    assert short and not any(result["passed"] for result in short)
+    assert report["summary"]["shortCircuited"] == len(short)
+    assert agent.ai_breaker.state == "closed"
+    assert settings.AI_DECISION_CACHE_ENABLED
@@ -0,0 +1,94 @@
+import asyncio
+
+import httpx
+
+import config as settings
+import server
+from app.rate_limiter import rate_limiter
+
+
+def post_many(payloads):
+    async def run():
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await asyncio.gather(*(
+                client.post("/payments/decide", json=p, headers={"X-API-Key": settings.API_KEY})
+                for p in payloads
+            ))
+    return asyncio.run(run())
+
+
+def slow_agent(calls):
+    async def agent(payment):
+        calls.append(payment.idempotencyKey)
+        await asyncio.sleep(0.05)
+        return "allow", ["transaction_allowed"], [{"step": "plan", "detail": "stub"}]
+    return agent
+
+
+def payment(key, amount=10.0):
+    return {"customerId": "sf_c1", "amount": amount, "currency": "USD",
+            "payeeId": "p_1", "idempotencyKey": key}
+
+
+def test_concurrent_duplicates_run_agent_once(monkeypatch):
+    """100 identical in-flight requests should execute the agent exactly once"""
+    calls = []
+    monkeypatch.setattr(settings, "DECISION_MODE", "async")
+    monkeypatch.setattr(server, "agent_decide_async", slow_agent(calls))
+    monkeypatch.setattr(rate_limiter, "allow", lambda key: True)
+
+    responses = post_many([payment("sf_key_1")] * 100)
+
+    assert len(calls) == 1
+    assert all(r.status_code == 200 for r in responses)
+    assert len({r.text for r in responses}) == 1
+    assert server.inflight.stats()["inFlight"] == 0
+
+
+def test_reused_key_with_different_body_is_rejected(monkeypatch):
+    calls = []
+    monkeypatch.setattr(settings, "DECISION_MODE", "async")
+    monkeypatch.setattr(server, "agent_decide_async", slow_agent(calls))
+    monkeypatch.setattr(rate_limiter, "allow", lambda key: True)
+
+    first, second = post_many([payment("sf_key_2", 10.0), payment("sf_key_2", 20.0)])
+
+    assert first.status_code == 200
+    assert second.status_code == 409
+    assert len(calls) == 1
+
+
+def test_cache_expires_and_evicts(monkeypatch):
+    from app import idempotency_cache
+    from app.idempotency_cache import IdempotencyCache
+
+    now = [1000.0]
+    monkeypatch.setattr(idempotency_cache.time, "monotonic", lambda: now[0])
+
+    cache = IdempotencyCache(max_entries=3, max_bytes=10**6, default_ttl=60)
+    for i in range(3):
+        cache.set(f"k{i}", b"{}")
+    assert cache.get("k0") == b"{}"      # k0 becomes most recently used
+    cache.set("k3", b"{}")               # evicts LRU entry k1
+    assert cache.get("k1") is None
+    assert cache.stats()["evictions"] == 1
+
+    now[0] += 61
+    assert cache.get("k0") is None
+    cache.purge_expired()
+    stats = cache.stats()
+    assert stats["entries"] == 0
+    assert stats["expirations"] == 3
+    assert stats["hits"] == 1
+
+
+def test_cache_respects_byte_budget():
+    from app.idempotency_cache import IdempotencyCache, ENTRY_OVERHEAD_BYTES
+
+    cache = IdempotencyCache(max_entries=100, max_bytes=3 * (ENTRY_OVERHEAD_BYTES + 102),
+                             default_ttl=60)
+    for i in range(10):
+        cache.set(f"k{i}", b"x" * 100)
+    assert len(cache) == 3
+    assert cache.stats()["bytes"] <= cache.max_bytes
@@ -0,0 +1,53 @@
+import threading
+import time
+
+from app.locks import FairLock, CustomerLockManager
+
+
+def test_fair_lock_serves_waiters_in_order():
+    """Waiters should be granted the lock in arrival order"""
+    lock = FairLock()
+    assert lock.acquire()
+    order = []
+
+    def waiter(i):
+        assert lock.acquire(timeout=5)
+        order.append(i)
+        lock.release()
+
+    threads = []
+    for i in range(5):
+        t = threading.Thread(target=waiter, args=(i,))
+        t.start()
+        threads.append(t)
+        time.sleep(0.02)  # make arrival order deterministic
+
+    lock.release()
+    for t in threads:
+        t.join()
+    assert order == [0, 1, 2, 3, 4]
+
+
+def test_lock_manager_timeout():
+    """Acquire should give up after the timeout and record it"""
+    manager = CustomerLockManager(timeout=0.05)
+    assert manager.acquire("c_lock")
+    start = time.perf_counter()
+    assert not manager.acquire("c_lock")
+    assert time.perf_counter() - start < 1
+    manager.release("c_lock")
+    assert manager.acquire("c_lock")
+    manager.release("c_lock")
+    stats = manager.stats()
+    assert stats["timeouts"] == 1
+    assert stats["waitMs"]["count"] == 3
+
+
+def test_unrecorded_try_lock_misses_are_not_timeouts():
+    manager = CustomerLockManager(timeout=0.05)
+    assert manager.acquire("c_try")
+    assert not manager.acquire("c_try", timeout=0, record=False)
+    manager.release("c_try")
+    stats = manager.stats()
+    assert stats["timeouts"] == 0
+    assert stats["waitMs"]["count"] == 1
@@ -0,0 +1,102 @@
+import io
+import logging
+import threading
+
+from app.async_logging import BatchingQueueHandler
+
+
+def make_logger(name, handler):
+    log = logging.getLogger(name)
+    log.handlers = [handler]
+    log.setLevel(logging.INFO)
+    log.propagate = False
+    return log
+
+
+def test_batching_handler_writes_everything_on_flush():
+    stream = io.StringIO()
+    handler = BatchingQueueHandler(logging.StreamHandler(stream), batch_size=16, flush_interval=0.01)
+    log = make_logger("paynow.test.batch", handler)
+    for i in range(100):
+        log.info("line %d", i)
+    handler.close()
+    lines = stream.getvalue().splitlines()
+    assert lines == [f"line {i}" for i in range(100)]
+    assert handler.written == 100
+
+
+class BlockingStream(io.StringIO):
+    def __init__(self):
+        super().__init__()
+        self.release = threading.Event()
+
+    def write(self, s):
+        self.release.wait(5)
+        return super().write(s)
+
+
+def test_drop_policy_bounds_the_queue():
+    stream = BlockingStream()
+    handler = BatchingQueueHandler(logging.StreamHandler(stream), queue_size=2,
+                                   batch_size=1, overflow_policy="drop")
+    log = make_logger("paynow.test.drop", handler)
+    for i in range(50):
+        log.info("line %d", i)
+    assert handler.dropped > 0
+    stream.release.set()
+    handler.close()
+    assert handler.written + handler.dropped == 50
+
+
+def test_disabled_and_sampled_events_skip_formatting(monkeypatch):
+    import config as settings
+    from app import utils
+
+    calls = []
+    utils.structured_log("debug", "lazy_event", {"risk": lambda: calls.append(1)})
+    assert calls == []  # debug is below the configured level
+
+    monkeypatch.setattr(settings, "LOG_SAMPLING", {"sampled_event": 0.0})
+    assert not utils.should_log("info", "sampled_event")
+    assert utils.should_log("info", "other_event")
+
+
+def test_stack_traces_are_rate_limited(monkeypatch):
+    from app import utils
+    from app.rate_limiter import TokenBucketRateLimiter
+
+    messages = []
+    monkeypatch.setattr(utils, "_stack_trace_limiter", TokenBucketRateLimiter(rate=2, per=60.0))
+    monkeypatch.setattr(utils.logger, "error",
+                        lambda msg, extra=None: messages.append(msg.log_data))
+    for _ in range(5):
+        utils.structured_log("error", "storm", {"error": "boom"})
+    assert sum("stack_trace" in m for m in messages) == 2
+    assert sum(m.get("stack_trace_suppressed", False) for m in messages) == 3
+
+
+def test_exception_tracebacks_are_never_rate_limited(monkeypatch):
+    import sys
+    from app import utils
+    from app.rate_limiter import TokenBucketRateLimiter
+
+    messages = []
+    monkeypatch.setattr(utils, "_stack_trace_limiter", TokenBucketRateLimiter(rate=1, per=60.0))
+    monkeypatch.setattr(utils.logger, "error",
+                        lambda msg, extra=None: messages.append(msg.log_data))
+    for _ in range(3):
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            utils.structured_log("error", "failed", {"traceback": True, "exc_info": sys.exc_info()})
+    assert all("ValueError: boom" in m["stack_trace"][-1] for m in messages)
+    assert not any(m.get("stack_trace_suppressed") for m in messages)
+
+
+def test_shutdown_tolerates_a_closed_stream(monkeypatch):
+    from app import utils
+
+    stream = io.StringIO()
+    monkeypatch.setattr(utils.logger, "handlers", [logging.StreamHandler(stream)])
+    stream.close()
+    utils.shutdown_logging()
@@ -0,0 +1,68 @@
+import threading
+
+from app.metrics import RollingHistogram, RequestMetrics
+
+
+def test_rolling_histogram_percentiles():
+    """Percentiles should be within one log bucket (~12%) of the true value"""
+    histogram = RollingHistogram()
+    now = 1_000_000.0
+    for value in range(1, 1001):
+        histogram.observe(float(value), now=now)
+    snap = histogram.snapshot(60, now=now)
+    assert snap["count"] == 1000
+    assert snap["max"] == 1000.0
+    assert 500 <= snap["p50"] <= 500 * 1.13
+    assert 990 <= snap["p99"] <= 1000
+
+
+def test_rolling_histogram_window_expiry():
+    histogram = RollingHistogram(slot_seconds=10, slots=30)
+    histogram.observe(5.0, now=0.0)
+    histogram.observe(50.0, now=250.0)
+    assert histogram.snapshot(60, now=250.0)["count"] == 1
+    assert histogram.snapshot(300, now=250.0)["count"] == 2
+    # The first slot is reused after a full ring rotation
+    histogram.observe(7.0, now=300.0)
+    assert histogram.snapshot(300, now=300.0)["count"] == 2
+
+
+def test_request_metrics_concurrent_updates():
+    metrics = RequestMetrics()
+
+    def worker():
+        for _ in range(1000):
+            metrics.record_decision("allow")
+            metrics.observe_latency(1.0, "allow", "rules_async")
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    snap = metrics.snapshot()
+    assert snap["totalRequests"] == 8000
+    assert snap["latencyMs"]["byDecision"]["allow"]["5m"]["count"] == 8000
+
+
+def test_prometheus_exposition():
+    from fastapi.testclient import TestClient
+    from server import app
+    import config as settings
+
+    client = TestClient(app)
+    client.post("/payments/decide", headers={"X-API-Key": settings.API_KEY}, json={
+        "customerId": "prom_c1", "amount": 10.0, "currency": "USD",
+        "payeeId": "p_1", "idempotencyKey": "prom_k1"
+    })
+    r = client.get("/metrics/prometheus")
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/plain")
+    body = r.text
+    for stage in ("auth", "rate_limit", "idempotency_lookup", "get_balance",
+                  "get_risk_signals", "reserve", "serialization"):
+        assert f'paynow_stage_duration_seconds_count{{stage="{stage}"}}' in body
+    assert 'paynow_decisions_total{decision="allow"}' in body
+    for total in ("paynow_lock_timeouts_total", "paynow_llm_retries_total",
+                  "paynow_llm_calls_saved_total", "paynow_llm_short_circuited_total"):
+        assert f"# TYPE {total} counter" in body
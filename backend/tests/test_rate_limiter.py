@@ -0,0 +1,31 @@
+from app import rate_limiter as rl
+from app.rate_limiter import TokenBucketRateLimiter
+
+
+def fake_clock(monkeypatch, start=1000.0):
+    now = [start]
+    monkeypatch.setattr(rl.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_bucket_refills_continuously(monkeypatch):
+    now = fake_clock(monkeypatch)
+    limiter = TokenBucketRateLimiter(rate=2, per=1.0)
+    assert limiter.allow("c_1") and limiter.allow("c_1")
+    assert not limiter.allow("c_1")
+    now[0] += 0.5  # one token back at 2 tokens/second
+    assert limiter.allow("c_1")
+    assert not limiter.allow("c_1")
+
+
+def test_idle_keys_are_evicted_on_insert(monkeypatch):
+    now = fake_clock(monkeypatch)
+    limiter = TokenBucketRateLimiter(rate=1, per=1.0, evict_batch=8)
+    for i in range(8):
+        limiter.allow(f"old_{i}")
+    now[0] += 0.5
+    limiter.allow("recent")
+    assert len(limiter) == 9
+    now[0] += 0.6
+    limiter.allow("new")
+    assert set(limiter.buckets) == {"recent", "new"}
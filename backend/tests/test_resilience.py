@@ -0,0 +1,148 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+import app.agent as agent
+from app.agent import agent_decide_ai, agent_decide_tiered, init_agent_pool, shutdown_agent_pool
+from app.agent_pool import build_stub_llm
+from app.models import PaymentRequest
+from app.resilience import CircuitBreaker, DeadlineExceeded, RetryPolicy
+
+
+def failing(calls):
+    async def call():
+        calls.append(time.monotonic())
+        raise RuntimeError("llm unavailable")
+    return call
+
+
+def test_retries_never_sleep_past_the_deadline():
+    """Backoff stops retrying once the next sleep would overrun the budget"""
+    calls = []
+    policy = RetryPolicy(max_attempts=10, base_delay=0.04, max_delay=0.04)
+    start = time.monotonic()
+    with pytest.raises(RuntimeError):
+        asyncio.run(policy.call(failing(calls), deadline=start + 0.1))
+    # Allow for the sleep overshooting by a scheduler tick and loop teardown
+    assert time.monotonic() - start < 0.11
+    assert 1 < len(calls) < 10
+    stats = policy.stats()
+    assert stats["retries"] == len(calls) - 1
+    assert stats["budgetExhausted"] == 1
+
+
+def test_slow_attempt_is_cut_off_at_the_deadline():
+    async def slow():
+        await asyncio.sleep(1)
+
+    policy = RetryPolicy(max_attempts=3, base_delay=0.01)
+    start = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(policy.call(slow, deadline=start + 0.05))
+    assert time.monotonic() - start < 0.5
+    assert policy.stats()["timeouts"] == 1
+
+
+def test_breaker_opens_then_probes_after_reset():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.allow()  # the probe
+    assert not breaker.allow()  # only one at a time
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.stats()["opened"] == 1
+    assert breaker.stats()["shortCircuited"] == 2
+
+
+class FailingExecutor:
+    def __init__(self):
+        self.runs = 0
+
+    def run(self, prompt):
+        self.runs += 1
+        raise RuntimeError("llm unavailable")
+
+
+def test_open_breaker_sends_payments_to_the_rules(monkeypatch):
+    monkeypatch.setattr(agent, "ai_breaker", CircuitBreaker(failure_threshold=2, reset_timeout=60))
+    monkeypatch.setattr(agent, "ai_retry_policy", RetryPolicy(max_attempts=3, base_delay=0.001))
+    pool = init_agent_pool(llm_factory=build_stub_llm, size=1)
+    try:
+        executor = FailingExecutor()
+        worker = pool.acquire(timeout=0)
+        worker.executor = executor
+        pool.release(worker)
+
+        payment = PaymentRequest(customerId="breaker_c1", amount=10.0, currency="USD",
+                                 payeeId="p_1", idempotencyKey="breaker_1")
+        decision, _, trace = agent_decide_ai(payment)
+        # Two failures open the breaker, which stops the third attempt
+        assert executor.runs == 2
+        assert decision == "allow"
+        assert trace[1]["step"] == "error"
+
+        decision, _, trace = agent_decide_ai(payment.model_copy(update={"idempotencyKey": "breaker_2"}))
+        assert executor.runs == 2
+        assert decision == "allow"
+        assert trace[0] == {"step": "fallback", "detail": "AI agent circuit open, used rule-based agent"}
+        assert agent.ai_resilience_stats()["breaker"]["shortCircuited"] == 1
+    finally:
+        shutdown_agent_pool()
+
+
+class HangingExecutor:
+    def __init__(self):
+        self.unblock = threading.Event()
+
+    def run(self, prompt):
+        self.unblock.wait(5)
+        raise RuntimeError("llm hung")
+
+
+def test_blocking_wrapper_returns_at_the_deadline_while_the_llm_hangs(monkeypatch):
+    monkeypatch.setattr(agent, "ai_breaker", CircuitBreaker(failure_threshold=5, reset_timeout=60))
+    pool = init_agent_pool(llm_factory=build_stub_llm, size=1)
+    executor = HangingExecutor()
+    try:
+        worker = pool.acquire(timeout=0)
+        worker.executor = executor
+        pool.release(worker)
+
+        payment = PaymentRequest(customerId="hang_c1", amount=10.0, currency="USD",
+                                 payeeId="p_1", idempotencyKey="hang_1")
+        start = time.monotonic()
+        decision, _, trace = agent_decide_ai(payment, deadline=start + 0.1)
+        assert time.monotonic() - start < 1
+        assert decision == "allow"
+        assert trace[1]["step"] == "error"
+    finally:
+        executor.unblock.set()
+        shutdown_agent_pool()
+
+
+def test_fallback_does_not_repeat_the_signal_steps(monkeypatch):
+    monkeypatch.setattr(agent, "ai_breaker", CircuitBreaker(failure_threshold=1, reset_timeout=60))
+    monkeypatch.setattr(agent, "ai_retry_policy", RetryPolicy(max_attempts=1))
+    pool = init_agent_pool(llm_factory=build_stub_llm, size=1)
+    try:
+        worker = pool.acquire(timeout=0)
+        worker.executor = FailingExecutor()
+        pool.release(worker)
+
+        payment = PaymentRequest(customerId="intl_fallback_c1", amount=10.0, currency="USD",
+                                 payeeId="p_1", idempotencyKey="fallback_1")
+        _, _, trace = asyncio.run(agent_decide_tiered(payment))
+    finally:
+        shutdown_agent_pool()
+    steps = [step["step"] for step in trace]
+    assert steps.count("tool:getBalance") == 1
+    assert steps.count("tool:getRiskSignals") == 1
+    assert steps[:4] == ["plan", "tool:getBalance", "tool:getRiskSignals", "escalate"]
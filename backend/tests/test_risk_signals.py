@@ -0,0 +1,59 @@
+import time
+
+from app.risk_signals import RiskSignalService, VelocityWindow
+
+
+def service(**kwargs):
+    options = dict(window_seconds=24.0, buckets=24, profile_ttl=60.0, max_customers=100)
+    options.update(kwargs)
+    return RiskSignalService(**options)
+
+
+def test_counters_follow_decisions():
+    signals = service()
+    first = signals.get("cust_a")
+    assert (first.last_24h_count, first.previous_failures) == (0, 0)
+    assert signals.get("cust_a") is first  # served from the cache
+
+    signals.record("cust_a", 40.0, approved=True)
+    profile = signals.get("cust_a")
+    assert profile is not first  # the first write gives the customer a window
+    signals.record("cust_a", 2.5, approved=True)
+    signals.record("cust_a", 99.0, approved=False)
+    assert signals.get("cust_a") is profile
+    assert (profile.last_24h_count, profile.last_24h_amount, profile.previous_failures) == (2, 42.5, 1)
+
+    signals.invalidate("cust_a")
+    assert signals.get("cust_a") is not profile
+
+
+def test_static_signals_come_from_the_customer_profile():
+    signals = service()
+    assert signals.get("c_123").recent_disputes == 2
+    assert signals.get("intl_9").unusual_country
+    assert signals.get("new_9").account_age_days == 5
+    assert signals.get("c_123").as_dict()["velocity_check"] == {"last_24h_count": 0, "last_24h_amount": 0.0}
+
+
+def test_window_expires_old_buckets():
+    window = VelocityWindow(buckets=4, head=10)
+    window.add(5.0, approved=True)
+    window.advance(11)
+    window.add(1.0, approved=True)
+    window.add(1.0, approved=False)
+    assert (window.count, window.amount, window.failed) == (2, 6.0, 1)
+    window.advance(14)  # bucket 10 falls out, 11 is still inside
+    assert (window.count, window.amount, window.failed) == (1, 1.0, 1)
+    window.advance(100)
+    assert (window.count, window.amount, window.failed) == (0, 0.0, 0)
+
+
+def test_profile_ttl_and_idle_window_eviction():
+    signals = service(window_seconds=0.08, buckets=4, profile_ttl=0.01, evict_batch=4)
+    signals.record("cust_old", 1.0, approved=True)
+    cached = signals.get("cust_old")
+    time.sleep(0.1)
+    refreshed = signals.get("cust_old")
+    assert refreshed is not cached and refreshed.last_24h_count == 0
+    signals.record("cust_new", 1.0, approved=True)
+    assert signals.stats()["customers"] == 1
@@ -0,0 +1,56 @@
+import json
+from datetime import datetime
+
+import pytest
+from pydantic import ValidationError
+
+from app.models import AgentStep, PaymentResponse
+from app.serialization import encode_payment_response
+
+TRACE = [
+    {"step": "plan", "detail": "Check balance, risk, and limits"},
+    {"step": "tool:getBalance", "detail": "balance=1,234.50"},
+    {"step": "tool:getRiskSignals", "detail": "{'intl': True, 'note': \"é 日本 😀 \\u2028 </script>\"}"},
+    {"step": "control", "detail": "\x00\x1f\x7f \"quoted\" \\ tab\t"},
+]
+
+
+def model_bytes(body, trace=TRACE):
+    """What the validated model path produces for the same content and timestamp"""
+    data = json.loads(body)
+    timestamp = datetime.fromisoformat(data["agentTrace"][0]["timestamp"])
+    return PaymentResponse(
+        decision=data["decision"],
+        reasons=data["reasons"],
+        agentTrace=[AgentStep(**s, timestamp=timestamp) for s in trace],
+        requestId=data["requestId"]
+    ).model_dump_json().encode()
+
+
+def test_encoding_matches_the_model_byte_for_byte():
+    body = encode_payment_response("review", ["international_payment", "ünïcode"], TRACE, "req_ab12cd")
+    assert body == model_bytes(body)
+
+
+def test_every_step_shares_one_timestamp():
+    body = encode_payment_response("allow", ["within_limits"], TRACE, "req_00")
+    assert len({s["timestamp"] for s in json.loads(body)["agentTrace"]}) == 1
+
+
+def test_edge_cases_match_the_model_or_fail_like_it():
+    """Inputs at the schema's limits encode identically; inputs past them raise as the model does"""
+    smallest = [{"step": "p", "detail": " "}]
+    body = encode_payment_response("block", ["x"], smallest, "req_0")
+    assert body == model_bytes(body, smallest)
+
+    for decision, reasons, trace, request_id in [
+        ("review", ["flagged_suspicious"], [{"step": "AI analysis", "detail": ""}], "req_01"),
+        ("review", [], TRACE, "req_01"),
+        ("maybe", ["flagged_suspicious"], TRACE, "req_01"),
+        ("allow", ["transaction_allowed"], TRACE, "request_01"),
+    ]:
+        with pytest.raises(ValidationError):
+            PaymentResponse(decision=decision, reasons=reasons, requestId=request_id,
+                            agentTrace=[AgentStep(**step) for step in trace])
+        with pytest.raises(ValidationError):
+            encode_payment_response(decision, reasons, trace, request_id)
@@ -0,0 +1,47 @@
+import multiprocessing
+
+import pytest
+
+from app.rate_limiter import SharedTokenBucketRateLimiter
+from app.shared_state import SharedBalances, SharedTable, SharedTableFullError
+from app.store import SharedMemoryStore
+
+
+def _reserve_many(path, customer_id, count):
+    store = SharedMemoryStore(path)
+    for _ in range(count):
+        store.reserve(customer_id, 1.0)
+
+
+def test_debits_from_several_processes_are_not_lost(tmp_path):
+    path = str(tmp_path / "balances.tbl")
+    store = SharedMemoryStore(path)
+    store.balances["c_shared"] = 1000.0
+    ctx = multiprocessing.get_context("fork")
+    procs = [ctx.Process(target=_reserve_many, args=(path, "c_shared", 200)) for _ in range(4)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+    assert store.get_balance("c_shared") == 200.0
+    assert store.get_balance("c_123") == 300.0  # seeded once, not per process
+
+
+def test_rate_limit_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / "limits.tbl")
+    workers = [SharedTokenBucketRateLimiter(rate=3, per=60.0, path=path, slots=64, stripes=4)
+               for _ in range(2)]
+    allowed = [w.allow("c_1") for _ in range(3) for w in workers]
+    assert allowed.count(True) == 3
+
+
+def test_idle_slots_are_reclaimed_when_stripe_is_full(tmp_path):
+    table = SharedTable(str(tmp_path / "t.tbl"), slots=2, stripes=1)
+    balances = SharedBalances(table)
+    balances["a_1"] = 1.0
+    balances["a_2"] = 2.0
+    with pytest.raises(SharedTableFullError):
+        balances["a_3"] = 3.0
+    table.update("a_3", lambda v0, v1, created: ((3.0, 0.0), created), (0.0, 0.0),
+                 reclaim=lambda v0, v1: v0 == 1.0)
+    assert "a_1" not in balances and balances["a_3"] == 3.0 and len(table) == 2
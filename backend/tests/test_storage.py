@@ -0,0 +1,123 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.agent import agent_decide_async, agent_decide_tiered, isolated_state
+from app.models import PaymentRequest
+from app.risk_signals import RiskSignalService
+import app.sqlite_store as sqlite_store
+from app.sqlite_store import SQLiteConnectionPool, SQLiteStore
+from app.store import DurableMemoryStore, InMemoryStore, LockTimeoutError, SharedMemoryStore, StorageBackend
+
+
+@pytest.fixture(params=["memory", "shared_memory", "durable_memory", "sqlite"])
+def backend(request, tmp_path):
+    store = {
+        "memory": lambda: InMemoryStore(),
+        "shared_memory": lambda: SharedMemoryStore(str(tmp_path / "balances.tbl")),
+        "durable_memory": lambda: DurableMemoryStore(str(tmp_path / "wal"), snapshot_interval=0),
+        "sqlite": lambda: SQLiteStore(str(tmp_path / "paynow.db"), pool_size=4),
+    }[request.param]()
+    yield store
+    store.close()
+
+
+def test_engine_contract(backend):
+    assert isinstance(backend, StorageBackend)
+    assert backend.get_balance("c_123") == 300.0
+    assert backend.get_balance("c_new_1") == backend.DEFAULT_INITIAL_BALANCE
+    assert backend.reserve("c_new_2", 60.0)
+    assert not backend.reserve("c_new_2", 60.0)
+    assert backend.get_balance("c_new_2") == 40.0
+
+    backend.save_idempotency("k_1", b'{"decision":"allow"}')
+    assert backend.get_idempotency("k_1") == b'{"decision":"allow"}'
+    backend.save_idempotency("k_2", b"{}", ttl_seconds=-1)
+    assert backend.get_idempotency("k_2") is None
+
+    case_ids = {backend.create_case("c_123", "recent_disputes") for _ in range(50)}
+    assert len(case_ids) == 50
+    assert all(case_id.startswith("case_") for case_id in case_ids)
+    assert backend.stats()["engine"] == backend.ENGINE
+
+
+def test_concurrent_reserves_never_overdraw(backend):
+    backend.get_balance("c_race")
+    results = []
+
+    def worker():
+        for _ in range(20):
+            results.append(backend.reserve("c_race", 1.0))
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results.count(True) == 100
+    assert backend.get_balance("c_race") == 0.0
+
+
+@pytest.mark.parametrize("engine", [InMemoryStore, DurableMemoryStore])
+def test_balances_are_exact_minor_units(engine, tmp_path):
+    store = engine() if engine is InMemoryStore else engine(str(tmp_path / "wal"), snapshot_interval=0)
+    store.balances["c_cents"] = 0.3
+    # 0.3 - 0.1 - 0.1 leaves 0.09999999999999998 in floats
+    assert all(store.reserve("c_cents", 0.1) for _ in range(3))
+    assert store.get_balance("c_cents") == 0.0
+    assert not store.reserve("c_cents", 0.01)
+    store.close()
+
+
+@pytest.mark.parametrize("decide", [agent_decide_async, agent_decide_tiered])
+def test_async_paths_keep_sqlite_calls_off_the_event_loop(decide, tmp_path):
+    """Balance reads and case inserts can wait on SQLite's write lock"""
+    store = SQLiteStore(str(tmp_path / "paynow.db"), pool_size=2)
+    threads = []
+    for name in ("get_balance", "create_case"):
+        method = getattr(store, name)
+
+        def recording(*args, method=method):
+            threads.append(threading.current_thread())
+            return method(*args)
+        setattr(store, name, recording)
+
+    payment = PaymentRequest(customerId="c_loop", amount=150.0, currency="USD",
+                             payeeId="p_1", idempotencyKey="loop_1")
+    signals = RiskSignalService(window_seconds=60, buckets=6, profile_ttl=1, max_customers=100)
+    try:
+        with isolated_state(store, signals):
+            decision, _, trace = asyncio.run(decide(payment))
+    finally:
+        store.close()
+    assert decision == "block"
+    assert any(step["step"] == "tool:createCase" for step in trace)
+    assert len(threads) == 2
+    assert threading.current_thread() not in threads
+
+
+def test_sqlite_counts_idempotency_entries_without_scanning(monkeypatch, tmp_path):
+    monkeypatch.setattr(sqlite_store, "PURGE_EVERY", 4)
+    path = str(tmp_path / "paynow.db")
+    store = SQLiteStore(path, pool_size=2)
+    store.save_idempotency("k_1", b"{}")
+    store.save_idempotency("k_1", b"{}")  # replaced, not added
+    store.save_idempotency("k_2", b"{}", ttl_seconds=-1)
+    store.save_idempotency("k_3", b"{}")  # 4th save purges the expired k_2
+    assert store.stats()["idempotencyCache"]["entries"] == 2
+    store.close()
+
+    reopened = SQLiteStore(path, pool_size=2)
+    assert reopened.stats()["idempotencyCache"]["entries"] == 2
+    reopened.close()
+
+
+def test_exhausted_sqlite_pool_times_out(tmp_path):
+    pool = SQLiteConnectionPool(str(tmp_path / "pool.db"), size=1, busy_timeout_ms=100,
+                                synchronous="NORMAL", acquire_timeout=0.05)
+    with pool.connection():
+        with pytest.raises(LockTimeoutError, match="pool size 1"):
+            with pool.connection():
+                pass
+    pool.close()
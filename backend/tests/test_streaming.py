@@ -0,0 +1,94 @@
+import asyncio
+import json
+
+from fastapi.testclient import TestClient
+
+import config as settings
+import server
+from app.streaming import iter_lines, stream_decisions
+
+client = TestClient(server.app)
+
+
+def payment(i):
+    return {"customerId": f"st_c{i % 5}", "amount": 1.0, "currency": "USD",
+            "payeeId": "p_stream", "idempotencyKey": f"st_k{i}"}
+
+
+def test_stream_endpoint_returns_a_line_per_payment():
+    def body():
+        for i in range(20):
+            yield (json.dumps(payment(i)) + "\n").encode()
+        yield b"{broken\n"
+
+    r = client.post("/payments/decide:stream", content=body(),
+                    headers={"X-API-Key": settings.API_KEY, "Content-Type": "application/x-ndjson"})
+    assert r.status_code == 200
+    results = sorted((json.loads(line) for line in r.text.splitlines()), key=lambda x: x["index"])
+    assert [x["index"] for x in results] == list(range(21))
+    assert all(x["response"]["decision"] == "allow" for x in results[:20])
+    assert results[20]["status"] == 400
+
+
+def test_each_stream_line_spends_a_rate_limit_token():
+    lines = [dict(payment(0), customerId="st_rl", idempotencyKey=f"st_rl_k{i}")
+             for i in range(settings.RATE_LIMIT_PER_SECOND + 2)]
+    body = "".join(json.dumps(line) + "\n" for line in lines)
+    r = client.post("/payments/decide:stream", content=body,
+                    headers={"X-API-Key": settings.API_KEY, "Content-Type": "application/x-ndjson"})
+    statuses = sorted(json.loads(line)["status"] for line in r.text.splitlines())
+    assert statuses == [200] * settings.RATE_LIMIT_PER_SECOND + [429, 429]
+
+
+def test_iter_lines_handles_split_and_oversized_lines():
+    async def chunks():
+        for chunk in [b'{"a":', b'1}\n{"b"', b":2}\n", b"x" * 40, b"x" * 40 + b"\n", b'{"c":3}']:
+            yield chunk
+
+    async def collect():
+        return [line async for line in iter_lines(chunks(), max_line_bytes=32)]
+
+    lines = asyncio.run(collect())
+    assert lines[:2] == [b'{"a":1}', b'{"b":2}']
+    assert lines[2].status == 413
+    assert lines[3] == b'{"c":3}'
+
+
+def test_iter_lines_rejects_an_oversized_line_that_arrives_in_one_chunk():
+    async def chunks():
+        yield b'{"a":1}\n' + b"y" * 208 + b'\n{"b":2}\n'
+
+    async def collect():
+        return [line async for line in iter_lines(chunks(), max_line_bytes=64)]
+
+    lines = asyncio.run(collect())
+    assert lines[0] == b'{"a":1}'
+    assert lines[1].status == 413
+    assert lines[2] == b'{"b":2}'
+
+
+def test_slow_reader_stops_the_body_from_being_read():
+    read = []
+
+    async def chunks():
+        for i in range(10000):
+            read.append(i)
+            yield (json.dumps(payment(i)) + "\n").encode()
+
+    async def decide(item):
+        return b"{}"
+
+    class AllowAll:
+        def allow(self, key):
+            return True
+
+    async def run():
+        stream = stream_decisions(chunks(), decide, AllowAll(), max_concurrency=4,
+                                  queue_size=8, max_line_bytes=1024)
+        await stream.__anext__()
+        await asyncio.sleep(0.05)  # a client that stops reading
+        pulled = len(read)
+        await stream.aclose()
+        return pulled
+
+    assert asyncio.run(run()) <= 4 + 8 + 2
@@ -0,0 +1,115 @@
+import glob
+import os
+import threading
+
+from app.store import DurableMemoryStore
+from app.wal import WriteAheadLog
+
+
+def open_store(directory, policy="group"):
+    return DurableMemoryStore(str(directory), fsync_policy=policy, snapshot_interval=0)
+
+
+def test_debits_and_idempotency_survive_restart(tmp_path):
+    store = open_store(tmp_path)
+    assert store.reserve("c_123", 50.0)
+    assert store.reserve("c_wal", 30.0)
+    store.save_idempotency("k_1", b'{"decision":"allow"}')
+    store.close()
+
+    store = open_store(tmp_path)
+    assert store.get_balance("c_123") == 250.0
+    assert store.get_balance("c_wal") == 70.0
+    assert store.get_idempotency("k_1") == b'{"decision":"allow"}'
+    store.close()
+
+
+def test_torn_tail_is_truncated(tmp_path):
+    store = open_store(tmp_path, policy="always")
+    store.reserve("c_123", 10.0)
+    store.close()
+    segment = sorted(glob.glob(str(tmp_path / "wal-*.log")))[-1]
+    size = os.path.getsize(segment)
+    with open(segment, "ab") as f:
+        f.write(b"\x01\x02\x03partial")
+
+    store = open_store(tmp_path)
+    assert store.get_balance("c_123") == 290.0
+    assert os.path.getsize(segment) == size
+    store.close()
+
+
+def test_snapshot_replaces_covered_segments(tmp_path):
+    store = open_store(tmp_path)
+    store.reserve("c_123", 10.0)
+    store.snapshot()
+    store.reserve("c_123", 20.0)
+    store.close()
+    files = sorted(os.listdir(tmp_path))
+    snapshot_seq = [n[9:17] for n in files if n.startswith("snapshot-")]
+    assert len(snapshot_seq) == 1
+    # Only segments written after the snapshot remain
+    assert all(n[4:12] >= snapshot_seq[0] for n in files if n.startswith("wal-"))
+
+    store = open_store(tmp_path)
+    assert store.get_balance("c_123") == 270.0
+    store.close()
+
+
+def test_group_commit_shares_fsyncs(tmp_path):
+    wal = WriteAheadLog(str(tmp_path), fsync_policy="group", group_commit_ms=5.0)
+    wal.open()
+    threads = [threading.Thread(target=lambda i=i: wal.log_balance(f"c_{i}", 1.0))
+               for i in range(20)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wal.close()
+    assert wal.records == 20
+    assert wal.fsyncs < 20
+
+
+def test_stale_snapshot_temp_file_is_ignored_and_removed(tmp_path):
+    store = open_store(tmp_path)
+    store.reserve("c_123", 10.0)
+    store.snapshot()
+    store.close()
+    # A crash between writing the temp file and renaming it into place
+    stale = tmp_path / "snapshot-00000009.bin.tmp"
+    stale.write_bytes(b"partial")
+
+    store = open_store(tmp_path)
+    assert store.get_balance("c_123") == 290.0
+    assert not stale.exists()
+    store.close()
+
+
+def test_snapshot_waits_for_debits_that_are_logged_but_not_applied(tmp_path):
+    """A debit caught between its WAL record and the balance update is not lost"""
+    store = open_store(tmp_path)
+    logged = threading.Event()
+    resume = threading.Event()
+    log_balance = store.wal.log_balance
+
+    def slow_log_balance(customer_id, balance):
+        log_balance(customer_id, balance)
+        logged.set()
+        resume.wait(5)
+
+    store.wal.log_balance = slow_log_balance
+    debit = threading.Thread(target=store.reserve, args=("c_123", 40.0))
+    debit.start()
+    assert logged.wait(5)
+    snapshot = threading.Thread(target=store.snapshot)
+    snapshot.start()
+    snapshot.join(0.1)
+    assert snapshot.is_alive()  # held back until the debit is applied
+    resume.set()
+    debit.join()
+    snapshot.join()
+    store.close()
+
+    store = open_store(tmp_path)
+    assert store.get_balance("c_123") == 260.0
+    store.close()